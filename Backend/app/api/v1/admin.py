@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Dict, Any, Optional
+from datetime import datetime
+import asyncio
+import hmac
+from app.core.config import settings
+from app.core.profiling import cpu_profiler, memory_profiler, loop_monitor
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Chỉ mở khi có ADMIN_TOKEN và request gửi đúng header X-Admin-Token"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints disabled (ADMIN_TOKEN not configured)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.post("/admin/profile/cpu", response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = Query(10, gt=0, description="Thời gian lấy mẫu (giây)"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="Khoảng cách giữa 2 lần lấy mẫu"),
+    loop_only: bool = Query(False, description="Chỉ lấy mẫu thread chạy event loop"),
+    idle: bool = Query(False, description="Giữ cả mẫu của thread đang chờ (select, queue.get, ...)")
+):
+    """
+    Sampling CPU profile của process (worker) đang chạy
+
+    Trả về file collapsed stacks ("thread;func (file:line);... count"), mở bằng
+    speedscope.app, `flamegraph.pl profile.folded > profile.svg` hoặc inferno-flamegraph
+
+    VD: curl -X POST -H "X-Admin-Token: ..." "localhost:8000/api/v1/admin/profile/cpu?seconds=30" -o cpu.folded
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds tối đa {settings.PROFILE_MAX_SECONDS}")
+    try:
+        result = await cpu_profiler.profile(seconds, interval_ms / 1000, loop_only=loop_only, idle=idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    filename = f"cpu-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.folded"
+    return PlainTextResponse(
+        cpu_profiler.collapsed(result["stacks"]),
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Samples": str(result["samples"])
+        }
+    )
+
+
+@router.post("/admin/memory/start")
+async def start_memory_tracing(
+    frames: int = Query(10, ge=1, le=100, description="Số frame lưu cho mỗi allocation")
+) -> Dict[str, Any]:
+    """Bật tracemalloc (làm chậm process, nên tắt sau khi đo) và lấy baseline snapshot"""
+    await asyncio.to_thread(memory_profiler.start, frames)
+    return {"tracing": True, "frames": frames}
+
+
+@router.get("/admin/memory/top")
+async def memory_top(
+    limit: int = Query(20, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    compare: bool = Query(True, description="So với baseline lúc start (chỉ phần tăng thêm)")
+) -> Dict[str, Any]:
+    """Top allocation hiện tại theo dòng code / file / traceback"""
+    if not memory_profiler.tracing:
+        raise HTTPException(status_code=409, detail="tracemalloc chưa bật, gọi POST /admin/memory/start trước")
+    return await asyncio.to_thread(memory_profiler.top, limit, group_by, compare)
+
+
+@router.post("/admin/memory/stop")
+async def stop_memory_tracing() -> Dict[str, Any]:
+    memory_profiler.stop()
+    return {"tracing": False}
+
+
+@router.get("/admin/loop-lag")
+async def get_loop_lag(
+    events: int = Query(20, ge=0, le=100, description="Số lần bị chặn gần nhất (kèm stack)")
+) -> Dict[str, Any]:
+    """Các lần event loop bị chặn quá LOOP_LAG_THRESHOLD_MS, kèm stack của code đang chạy lúc đó"""
+    return loop_monitor.stats(events)
+
+
+@router.delete("/admin/loop-lag")
+async def clear_loop_lag() -> Dict[str, Any]:
+    loop_monitor.clear()
+    return {"cleared": True}
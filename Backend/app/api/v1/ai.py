@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from typing import Dict, Any
+from app.core.config import settings
+from app.services.environmental_ai_service import token_usage
+from app.services.assessment_cache_service import assessment_cache_service
+
+router = APIRouter()
+
+@router.get("/ai/usage")
+async def get_ai_usage() -> Dict[str, Any]:
+    """Thống kê token LLM đã dùng và hiệu quả cache đánh giá AI"""
+    return {
+        "prompt_mode": settings.AI_PROMPT_MODE,
+        "structured_output": settings.AI_STRUCTURED_OUTPUT,
+        "token_usage": token_usage.stats(),
+        "assessment_cache": assessment_cache_service.stats()
+    }
@@ -1,6 +1,15 @@
 from fastapi import APIRouter
 from app.services.cache_service import cache_service
 from app.services.database import db_service
+from app.services.assessment_cache_service import assessment_cache_service
+from app.services.tile_service import tile_service
+from app.services.history_service import history_service
+from app.services.rollup_service import rollup_service
+from app.services.shared_cache import shared_cache
+from app.core import http_recorder, log_config, offload
+from app.core.admission import (
+    environment_admission, environment_degraded_admission, environment_batch_admission
+)
 from typing import Dict, Any
 from datetime import datetime
 import logging
@@ -15,7 +24,21 @@ async def get_cache_status() -> Dict[str, Any]:
     return {
         "mongodb_connected": db_service.is_connected(),
         "mongo_url_configured": bool(db_service.client),
-        "cache_enabled": db_service.is_connected()
+        "cache_enabled": db_service.is_connected(),
+        "write_behind": cache_service.write_stats(),
+        "shared_cache": shared_cache.stats(),
+        "ai_assessment_cache": assessment_cache_service.stats(),
+        "tile_cache": tile_service.stats(),
+        "history_writer": history_service.stats(),
+        "rollups": rollup_service.stats(),
+        "http_recording": http_recorder.stats(),
+        "logging": log_config.stats(),
+        "cpu_offload": offload.stats(),
+        "admission": {
+            "environment": environment_admission.stats(),
+            "environment_degraded": environment_degraded_admission.stats(),
+            "environment_batch": environment_batch_admission.stats()
+        }
     }
 
 @router.post("/cache/clear-expired")
@@ -1,9 +1,27 @@
-from fastapi import APIRouter, Query
-from typing import Optional
-from app.models import EnvironmentResponse
+from fastapi import APIRouter, Query, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
+from typing import Optional, Tuple, Any, List, Dict
+from datetime import datetime
+import json
+import time
+from app.core.config import settings
+from app.core.http_cache import cached_json_response, make_etag
+from app.core.offload import json_loads
+from app.core.tracing import span
+from app.core.admission import (
+    AdmissionController, environment_admission, environment_degraded_admission, environment_batch_admission
+)
+from app.models import (
+    EnvironmentResponse, EnvironmentalQuality, AssessmentJobStatus,
+    BatchEnvironmentRequest, BatchEnvironmentItem, BatchEnvironmentResponse
+)
 from app.services.aggregator import EnvironmentAggregator
+from app.services.environmental_ai_service import EnvironmentalAIService
 from app.services.geocoding_service import GeocodingService
 from app.services.cache_service import cache_service
+from app.services.assessment_job_service import assessment_job_service
+from app.services.rule_assessment_service import rule_assessment_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,26 +30,17 @@ router = APIRouter()
 aggregator = EnvironmentAggregator()
 geocoding_service = GeocodingService()
 
-@router.get("/environment", response_model=EnvironmentResponse)
-async def get_environment(
-    lat: Optional[float] = Query(None, description="Vĩ độ"),
-    lon: Optional[float] = Query(None, description="Kinh độ"),
-    city: Optional[str] = Query(None, description="Tên thành phố"),
-    country: Optional[str] = Query(None, description="Mã quốc gia"),
-    include: Optional[str] = Query(
-        None,
-        description="Các loại dữ liệu cần lấy (phân cách bởi dấu phẩy)"
-    )
-):
-    """
-    Lấy dữ liệu môi trường tổng hợp
-    
-    Có thể sử dụng một trong hai cách:
-    1. Với tọa độ: /api/v1/environment?lat=21.0285&lon=105.8542
-    2. Với tên thành phố: /api/v1/environment?city=Hanoi&country=Vietnam
-    3. Kết hợp: /api/v1/environment?lat=21.0285&lon=105.8542&city=Hanoi
-    """
-    
+def _is_cacheable(include_list: Optional[List[str]], assessment: str) -> bool:
+    """Cache chỉ giữ response đầy đủ với đánh giá AI (mặc định); include / assessment=local không đọc, không ghi cache"""
+    return include_list is None and assessment == "ai"
+
+async def _resolve_location(
+    lat: Optional[float],
+    lon: Optional[float],
+    city: Optional[str],
+    country: Optional[str]
+) -> Tuple[float, float, Optional[str], Optional[str]]:
+    """Chuẩn hoá input vị trí (forward geocoding nếu chỉ có tên thành phố)"""
     # Xử lý input coordinates
     final_lat = lat
     final_lon = lon
@@ -40,8 +49,9 @@ async def get_environment(
     
     # Case 1: Có city nhưng không có coordinates -> Forward geocoding
     if city and (lat is None or lon is None):
-        print(f"Forward geocoding for city: {city}")
-        final_lat, final_lon = await geocoding_service.get_coordinates_from_city(city, country)
+        logger.debug(f"Forward geocoding for city: {city}")
+        with span("geocode", "Nominatim search"):
+            final_lat, final_lon = await geocoding_service.get_coordinates_from_city(city, country)
         final_city = city
         final_country = country
     
@@ -60,40 +70,376 @@ async def get_environment(
     
     # Case 4: Không có gì -> Error
     else:
-        from fastapi import HTTPException
         raise HTTPException(
             status_code=400, 
             detail="Cần cung cấp ít nhất tọa độ (lat, lon) hoặc tên thành phố (city)"
         )
     
+    return final_lat, final_lon, final_city, final_country
+
+@router.get("/environment", response_model=EnvironmentResponse)
+async def get_environment(
+    request: Request,
+    lat: Optional[float] = Query(None, description="Vĩ độ"),
+    lon: Optional[float] = Query(None, description="Kinh độ"),
+    city: Optional[str] = Query(None, description="Tên thành phố"),
+    country: Optional[str] = Query(None, description="Mã quốc gia"),
+    include: Optional[str] = Query(
+        None,
+        description="Các loại dữ liệu cần lấy (phân cách bởi dấu phẩy)"
+    ),
+    defer_ai: bool = Query(
+        False,
+        description="Trả dữ liệu ngay, đánh giá AI chạy nền (polling qua assessment_job.url)"
+    ),
+    assessment: str = Query(
+        "ai",
+        pattern="^(ai|local)$",
+        description="Cách đánh giá: ai (LLM) hoặc local (quy tắc WHO/EPA, không gọi mạng)"
+    )
+):
+    """
+    Lấy dữ liệu môi trường tổng hợp
+    
+    Có thể sử dụng một trong hai cách:
+    1. Với tọa độ: /api/v1/environment?lat=21.0285&lon=105.8542
+    2. Với tên thành phố: /api/v1/environment?city=Hanoi&country=Vietnam
+    3. Kết hợp: /api/v1/environment?lat=21.0285&lon=105.8542&city=Hanoi
+    
+    Thêm defer_ai=true để không phải chờ AI (vài giây): response có assessment_job,
+    kết quả lấy tại /api/v1/environment/assessment/{job_id}
+    
+    Response đầy đủ (không có include) có ETag + Cache-Control theo TTL còn lại của cache:
+    gửi lại If-None-Match để nhận 304 khi dữ liệu chưa đổi; nén gzip/br theo Accept-Encoding
+    
+    Khi server quá tải (ENVIRONMENT_MAX_CONCURRENCY / ENVIRONMENT_MAX_QUEUE): cache đã hết hạn
+    hoặc bản rút gọn (header X-Degraded), hoặc 503 + Retry-After
+    """
+    
+    final_lat, final_lon, final_city, final_country = await _resolve_location(lat, lon, city, country)
+    
     # Parse include list
     include_list = None
     if include:
         include_list = [item.strip() for item in include.split(",")]
     
-    print(f"Final coordinates: ({final_lat}, {final_lon}), city: {final_city}")
+    logger.debug(f"Final coordinates: ({final_lat}, {final_lon}), city: {final_city}")
+    
+    # Check cache first - only for full queries with AI assessment
+    if _is_cacheable(include_list, assessment):
+        logger.debug("Checking cache for full environment data")
+        with span("cache.read"):
+            cached_entry = await cache_service.get_cached_entry(
+                final_city, final_country, final_lat, final_lon
+            )
+        if cached_entry:
+            cached_entry = await _attach_finished_job(
+                cached_entry, final_city, final_country, final_lat, final_lon
+            )
+            # JSON đã serialize sẵn lúc ghi cache -> trả thẳng, không validate/encode lại
+            logger.debug("Returning cached data")
+            now = datetime.utcnow()
+            # Đánh giá AI chạy nền chưa xong -> nội dung sắp đổi, client nên revalidate
+            pending_job = (cached_entry.get("data") or {}).get("assessment_job")
+            return cached_json_response(
+                request,
+                cached_entry["payload"],
+                etag=cached_entry.get("etag"),
+                max_age=0 if pending_job else (cached_entry["expires_at"] - now).total_seconds(),
+                age=(now - cached_entry["created_at"]).total_seconds()
+            )
+    
+    # Lấy dữ liệu mới: giới hạn số request đồng thời (cache hit ở trên không bị giới hạn)
+    async with environment_admission.slot() as admitted:
+        if admitted:
+            return await _fetch_environment(
+                request, final_lat, final_lon, final_city, final_country, include_list, defer_ai, assessment
+            )
+    
+    return await _handle_overload(
+        request, final_lat, final_lon, final_city, final_country, include_list, assessment
+    )
+
+async def _attach_finished_job(
+    entry: Dict[str, Any],
+    city: Optional[str],
+    country: Optional[str],
+    lat: float,
+    lon: float
+) -> Dict[str, Any]:
+    """
+    Entry cache vẫn giữ tham chiếu job AI nền nhưng job đã xong (attach_assessment chạy
+    trước khi entry kịp ghi vào MongoDB) -> ghép kết quả vào response và ghi lại entry
+    """
+    job_ref = (entry.get("data") or {}).get("assessment_job")
+    if not isinstance(job_ref, dict) or not job_ref.get("job_id"):
+        return entry
+    status = await assessment_job_service.get_status(job_ref["job_id"])
+    if not status or status.status != "done" or not status.environmental_quality:
+        return entry
+    
+    assessment = status.environmental_quality.dict()
+    source = EnvironmentalAIService.assessment_source(status.environmental_quality)
+    data = cache_service.with_assessment(json_loads(entry["payload"]), assessment, source)
+    payload = cache_service.serialize(data)
+    await cache_service.attach_assessment(
+        city, country, lat, lon, job_id=job_ref["job_id"], assessment=assessment, source=source, retries=0
+    )
+    return {**entry, "payload": payload, "etag": make_etag(payload), "data": {"assessment_job": None}}
+
+async def _fetch_environment(
+    request: Request,
+    final_lat: float,
+    final_lon: float,
+    final_city: Optional[str],
+    final_country: Optional[str],
+    include_list: Optional[List[str]],
+    defer_ai: bool,
+    assessment: str
+):
+    """Gọi các nguồn + AI, ghi cache nếu là request đầy đủ với đánh giá AI"""
+    cacheable = _is_cacheable(include_list, assessment)
+    cache_key = {
+        "city": final_city, "country": final_country, "lat": final_lat, "lon": final_lon
+    } if cacheable else None
+    response = await aggregator.get_environment_data(
+        final_lat, final_lon, final_city, final_country, include_list,
+        defer_ai=defer_ai, assessment_mode=assessment, cache_key=cache_key
+    )
     
-    # Check cache first - only for queries without include parameter
-    if include_list is None:
-        logger.info("Checking cache for full environment data")
-        cached_data = await cache_service.get_cached_data(
-            final_city, final_country, final_lat, final_lon
+    # Save to cache only for full data with AI assessment
+    if cacheable:
+        # Job nền có thể đã xong trước khi ghi cache -> ghi luôn kết quả
+        if response.assessment_job:
+            job = assessment_job_service.get(response.assessment_job.job_id)
+            if job and job.status == "done":
+                response.environmental_quality = job.result
+                response.assessment_job = None
+                response.sources = list(set(response.sources + [EnvironmentalAIService.assessment_source(job.result)]))
+        
+        logger.debug("Saving full environment data to cache")
+        with span("cache.write"):
+            data = response.dict()
+            payload = cache_service.serialize(data)
+            await cache_service.enqueue_save(
+                final_city, final_country, final_lat, final_lon, 
+                data, payload=payload
+            )
+        # Cùng bytes (và ETag) với cache hit sau này
+        return cached_json_response(
+            request, payload,
+            max_age=0 if response.assessment_job else cache_service.DEFAULT_TTL
         )
-        if cached_data:
-            logger.info("Returning cached data")
-            return EnvironmentResponse(**cached_data)
     
-    # Get fresh data
+    return response
+
+async def _handle_overload(
+    request: Request,
+    lat: float,
+    lon: float,
+    city: Optional[str],
+    country: Optional[str],
+    include_list: Optional[List[str]],
+    assessment: str
+):
+    """
+    Quá tải (queue đầy / chờ quá lâu)
+    
+    - degrade: cache đã hết hạn (<= ENVIRONMENT_STALE_MAX_SECONDS), không có thì chỉ lấy
+      ENVIRONMENT_DEGRADED_SOURCES + đánh giá local (không LLM, không ghi cache)
+    - reject hoặc không degrade được: 503 + Retry-After
+    """
+    retry_after = environment_admission.retry_after()
+    logger.warning(f"Environment endpoint overloaded ({environment_admission.active} active, "
+                   f"{environment_admission.waiting} waiting), policy={settings.ENVIRONMENT_OVERLOAD_POLICY}")
+    
+    if settings.ENVIRONMENT_OVERLOAD_POLICY == "degrade":
+        if _is_cacheable(include_list, assessment):
+            with span("cache.read", "stale"):
+                stale_entry = await cache_service.get_stale_entry(
+                    city, country, lat, lon, settings.ENVIRONMENT_STALE_MAX_SECONDS
+                )
+            if stale_entry:
+                response = cached_json_response(
+                    request,
+                    stale_entry["payload"],
+                    etag=stale_entry.get("etag"),
+                    max_age=0,
+                    age=(datetime.utcnow() - stale_entry["created_at"]).total_seconds()
+                )
+                response.headers["Warning"] = '110 - "Response is Stale"'
+                response.headers["X-Degraded"] = "stale-cache"
+                return response
+        
+        sources = [
+            source for source in settings.ENVIRONMENT_DEGRADED_SOURCES
+            if include_list is None or source in include_list
+        ]
+        if sources:
+            async with environment_degraded_admission.slot() as admitted:
+                if admitted:
+                    if include_list is None or "environmental_quality" in include_list:
+                        sources.append("environmental_quality")
+                    data = await aggregator.get_environment_data(
+                        lat, lon, city, country, sources, assessment_mode="local"
+                    )
+                    return JSONResponse(
+                        content=jsonable_encoder(data),
+                        headers={"X-Degraded": "partial", "Cache-Control": "no-store"}
+                    )
+    
+    raise HTTPException(
+        status_code=503,
+        detail="Server đang quá tải, vui lòng thử lại sau",
+        headers={"Retry-After": str(retry_after)}
+    )
+
+def _overloaded(admission: AdmissionController) -> HTTPException:
+    """503 + Retry-After cho endpoint không có bản degrade"""
+    logger.warning(f"{admission.name} overloaded ({admission.active} active, {admission.waiting} waiting)")
+    return HTTPException(
+        status_code=503,
+        detail="Server đang quá tải, vui lòng thử lại sau",
+        headers={"Retry-After": str(admission.retry_after())}
+    )
+
+def _sse(event: str, data: Any) -> str:
+    """Format một Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@router.get("/environment/stream")
+async def stream_environment(
+    lat: Optional[float] = Query(None, description="Vĩ độ"),
+    lon: Optional[float] = Query(None, description="Kinh độ"),
+    city: Optional[str] = Query(None, description="Tên thành phố"),
+    country: Optional[str] = Query(None, description="Mã quốc gia")
+):
+    """
+    Dữ liệu môi trường + đánh giá AI dạng stream (Server-Sent Events)
+    
+    Thứ tự sự kiện:
+    - data: dữ liệu đo (gửi ngay khi có, chưa có environmental_quality)
+    - summary: từng đoạn tóm tắt mới khi model sinh token
+    - recommendation / concern: mỗi mục khi vừa hoàn chỉnh
+    - error: LLM lỗi (sau đó vẫn có assessment dự phòng)
+    - assessment: đánh giá hoàn chỉnh
+    - done
+    
+    Không có cache: dùng chung giới hạn với /environment, quá tải -> 503 + Retry-After
+    """
+    final_lat, final_lon, final_city, final_country = await _resolve_location(lat, lon, city, country)
+    
+    cached_data = await cache_service.get_cached_data(
+        final_city, final_country, final_lat, final_lon
+    )
+    if cached_data and cached_data.get("environmental_quality"):
+        async def cached_events():
+            yield _sse("data", cached_data)
+            cached_assessment = EnvironmentalQuality(**cached_data["environmental_quality"])
+            for event, data in EnvironmentalAIService.assessment_events(cached_assessment):
+                yield _sse(event, data)
+            yield _sse("done", {})
+        
+        return StreamingResponse(
+            cached_events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    # Phải biết có slot hay không trước khi bắt đầu stream (sau đó không đổi được status code);
+    # slot giữ tới khi stream kết thúc
+    if not await environment_admission.acquire():
+        raise _overloaded(environment_admission)
+    started = time.perf_counter()
+    
+    async def events():
+        try:
+            async for event in _stream_fresh(final_lat, final_lon, final_city, final_country):
+                yield event
+        finally:
+            environment_admission.release(time.perf_counter() - started)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _stream_fresh(
+    final_lat: float,
+    final_lon: float,
+    final_city: Optional[str],
+    final_country: Optional[str]
+):
+    """Sự kiện SSE khi không có cache: dữ liệu đo, rồi đánh giá AI theo từng token"""
     response = await aggregator.get_environment_data(
-        final_lat, final_lon, final_city, final_country, include_list
+        final_lat, final_lon, final_city, final_country,
+        include=EnvironmentAggregator.DATA_TYPES
     )
+    yield _sse("data", response.dict())
+    
+    location_dict = {**response.location.dict(), "observed_at": response.time}
+    env_dict = {
+        key: getattr(response, key).dict() if getattr(response, key) else None
+        for key in ["weather", "air", "water", "noise", "soil", "radiation"]
+    }
     
-    # Save to cache only if no include parameter (full data)
-    if include_list is None:
-        logger.info("Saving full environment data to cache")
-        await cache_service.save_data(
-            final_city, final_country, final_lat, final_lon, 
-            response.dict()
+    assessment = None
+    if aggregator.ai_service:
+        async for event, data in aggregator.ai_service.stream_analysis(location_dict, env_dict):
+            yield _sse(event, data)
+            if event == "assessment":
+                assessment = EnvironmentalQuality(**data)
+    else:
+        assessment = rule_assessment_service.assess(location_dict, env_dict)
+        for event, data in EnvironmentalAIService.assessment_events(assessment):
+            yield _sse(event, data)
+    if assessment:
+        response.sources = list(set(response.sources + [EnvironmentalAIService.assessment_source(assessment)]))
+    
+    response.environmental_quality = assessment
+    await cache_service.enqueue_save(
+        final_city, final_country, final_lat, final_lon,
+        response.dict()
+    )
+    yield _sse("done", {})
+
+@router.post("/environment/batch", response_model=BatchEnvironmentResponse)
+async def get_environment_batch(request: BatchEnvironmentRequest):
+    """
+    Lấy dữ liệu môi trường cho nhiều vị trí trong một request (bulk jobs)
+    
+    Đánh giá AI được gộp: nhiều vị trí trong một prompt, kết quả trả về theo id.
+    Giới hạn: BATCH_MAX_LOCATIONS vị trí mỗi request, BATCH_MAX_CONCURRENCY batch chạy cùng lúc
+    (quá tải -> 503 + Retry-After).
+    """
+    if not request.locations:
+        raise HTTPException(status_code=400, detail="Danh sách locations rỗng")
+    if len(request.locations) > settings.BATCH_MAX_LOCATIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Tối đa {settings.BATCH_MAX_LOCATIONS} vị trí mỗi request"
         )
+    ids = [location.id for location in request.locations]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Location id bị trùng")
+    
+    async with environment_batch_admission.slot() as admitted:
+        if not admitted:
+            raise _overloaded(environment_batch_admission)
+        results = await aggregator.get_environment_batch(request.locations, request.assessment)
+    return BatchEnvironmentResponse(
+        results=[BatchEnvironmentItem(id=location_id, data=results[location_id]) for location_id in ids]
+    )
+
+@router.get("/environment/assessment/{job_id}", response_model=AssessmentJobStatus)
+async def get_assessment(job_id: str):
+    """
+    Lấy kết quả đánh giá AI chạy nền (từ request với defer_ai=true)
     
-    return response
\ No newline at end of file
+    status: pending | running | done | failed
+    """
+    status = await assessment_job_service.get_status(job_id)
+    if not status:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy assessment job: {job_id}")
+    return status
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Query
+from typing import Optional
+from app.models import CitySuggestResponse
+from app.services.city_index import get_city_index
+
+router = APIRouter()
+
+@router.get("/geocode/suggest", response_model=CitySuggestResponse)
+async def suggest_city(
+    q: str = Query(..., min_length=1, description="Phần đầu tên thành phố"),
+    country: Optional[str] = Query(None, description="Lọc theo quốc gia (tên hoặc mã ISO)"),
+    limit: int = Query(10, ge=1, le=50, description="Số gợi ý tối đa")
+):
+    """
+    Gợi ý tên thành phố khi người dùng đang gõ (autocomplete)
+    
+    - Tra cứu trong prefix index trong bộ nhớ, không gọi Nominatim
+    - Xếp hạng theo dân số
+    - Mỗi gợi ý có sẵn lat/lon: gửi kèm khi gọi /environment
+      (VD: /api/v1/environment?lat=21.0285&lon=105.8542&city=Hanoi&country=Vietnam)
+      để bỏ qua bước forward geocoding
+    """
+    suggestions = get_city_index().suggest(q, limit=limit, country=country)
+    return CitySuggestResponse(query=q, suggestions=suggestions)
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.models import HeatForecast
+from app.services.heat_service import heat_service
+
+router = APIRouter()
+
+@router.get("/heat/forecast", response_model=HeatForecast)
+async def get_heat_forecast(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude"),
+    hours: int = Query(48, ge=1, le=120, description="Số giờ dự báo (tối đa 5 ngày)")
+):
+    """
+    Dự báo nóng ẩm theo giờ (dạng cột)
+    
+    - Nội suy dự báo 3 giờ của OpenWeather thành chuỗi từng giờ
+    - heat_index (NWS/Rothfusz), surface_temperature (theo bức xạ mặt trời và mây), heat_risk
+    - peak_heat_index / peak_time: thời điểm nóng nhất trong khoảng dự báo
+    """
+    forecast = await heat_service.get_heat_forecast(lat, lon, hours=hours)
+    if forecast is None:
+        raise HTTPException(status_code=503, detail="Không lấy được dự báo thời tiết")
+    return forecast
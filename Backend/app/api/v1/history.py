@@ -0,0 +1,81 @@
+from fastapi import APIRouter, HTTPException, Query
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from app.models import HistorySeries, HistoryRollup
+from app.services.history_service import history_service
+from app.services.rollup_service import rollup_service
+from app.services.database import db_service
+
+router = APIRouter()
+
+SOURCE_PATTERN = "^(weather|air|water|noise|soil|light|heat|radiation)$"
+
+
+def _to_utc(value: datetime) -> datetime:
+    """Chuẩn hoá về UTC naive (cùng dạng với datetime.utcnow() lưu trong MongoDB)"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@router.get("/history", response_model=HistorySeries)
+async def get_history(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude"),
+    source: str = Query(..., pattern=SOURCE_PATTERN, description="Nguồn dữ liệu, VD: air"),
+    start: Optional[datetime] = Query(None, description="Thời điểm bắt đầu (UTC), mặc định 7 ngày trước"),
+    end: Optional[datetime] = Query(None, description="Thời điểm kết thúc (UTC), mặc định hiện tại"),
+    limit: Optional[int] = Query(None, ge=1, description="Số điểm tối đa")
+):
+    """
+    Lịch sử reading đã ghi nhận tại ô lưới chứa vị trí (~1km)
+    
+    - Mỗi lần /environment lấy dữ liệu mới, reading của từng nguồn được lưu lại
+    - Trả về dạng cột: `times` và `values[field]` song song
+    
+    VD: /api/v1/history?lat=21.03&lon=105.85&source=air → AQI/PM2.5 trong 7 ngày qua
+    """
+    if not db_service.is_connected():
+        raise HTTPException(status_code=503, detail="MongoDB not connected, history disabled")
+
+    end = _to_utc(end) if end else datetime.utcnow()
+    start = _to_utc(start) if start else end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start phải trước end")
+
+    series = await history_service.query(lat, lon, source, start, end, limit=limit)
+    if series is None:
+        raise HTTPException(status_code=503, detail="Không đọc được lịch sử")
+    return series
+
+@router.get("/history/rollup", response_model=HistoryRollup)
+async def get_history_rollup(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude"),
+    source: str = Query(..., pattern=SOURCE_PATTERN, description="Nguồn dữ liệu, VD: air"),
+    metric: str = Query(..., description="Chỉ số, VD: aqi, pm25, temperature"),
+    start: Optional[datetime] = Query(None, description="Thời điểm bắt đầu (UTC), mặc định 30 ngày trước"),
+    end: Optional[datetime] = Query(None, description="Thời điểm kết thúc (UTC), mặc định hiện tại"),
+    resolution: Optional[str] = Query(None, pattern="^(hour|day|month)$", description="Bỏ trống để tự chọn theo độ dài khoảng")
+):
+    """
+    Thống kê tổng hợp sẵn (min, max, mean, p95, count) theo giờ / ngày / tháng
+    
+    - Được cập nhật nền từ lịch sử reading, query chỉ đọc các điểm đã tính sẵn
+    - Không truyền resolution: chọn mức mịn nhất có số điểm <= ROLLUP_MAX_POINTS
+      (VD: 3 ngày -> hour, 1 tháng -> day ~30 điểm, 2 năm -> month)
+    - resolution quá mịn cho khoảng thời gian (vượt ROLLUP_MAX_POINTS điểm) được nâng lên mức thô hơn,
+      kết quả tối đa ROLLUP_MAX_POINTS điểm
+    """
+    if not db_service.is_connected():
+        raise HTTPException(status_code=503, detail="MongoDB not connected, history disabled")
+
+    end = _to_utc(end) if end else datetime.utcnow()
+    start = _to_utc(start) if start else end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start phải trước end")
+
+    rollup = await rollup_service.query(lat, lon, source, metric, start, end, resolution=resolution)
+    if rollup is None:
+        raise HTTPException(status_code=503, detail="Không đọc được dữ liệu tổng hợp")
+    return rollup
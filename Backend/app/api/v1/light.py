@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Query
+from datetime import date, datetime
+from typing import Optional
+from app.models import LightSeries
+from app.services.light_service import light_service
+
+router = APIRouter()
+
+@router.get("/light/series", response_model=LightSeries)
+async def get_light_series(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude"),
+    date: Optional[date] = Query(None, description="Ngày bắt đầu (UTC, YYYY-MM-DD), mặc định hôm nay"),
+    span: str = Query("day", pattern="^(day|year)$", description="day: 1 ngày, year: 1 năm từ ngày bắt đầu"),
+    step_minutes: Optional[int] = Query(None, ge=1, le=1440, description="Bước thời gian (mặc định: day=15, year=60)")
+):
+    """
+    Profile ánh sáng/mặt trời theo thời gian (dạng cột)
+    
+    - sun_elevation, irradiance (W/m²), intensity (lux), uv_index theo từng mốc thời gian UTC
+    - sunrise/sunset (HH:MM UTC) và daylight_duration theo từng ngày
+    - Giá trị trời quang (clear-sky); tọa độ làm tròn về ô 0.1° để dùng lại kết quả
+    """
+    if step_minutes is None:
+        step_minutes = 15 if span == "day" else 60
+    if 1440 % step_minutes != 0:
+        raise HTTPException(status_code=400, detail="step_minutes phải là ước của 1440")
+
+    start = date or datetime.utcnow().date()
+    return light_service.get_light_series(lat, lon, start, span=span, step_minutes=step_minutes)
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Path
+from fastapi.responses import Response
+from app.services.tile_service import tile_service
+
+router = APIRouter()
+
+@router.get("/tiles/{layer}/{z}/{x}/{y}.{fmt}")
+async def get_tile(
+    layer: str,
+    fmt: str,
+    z: int = Path(..., ge=0, le=18),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0)
+):
+    """
+    Tile bản đồ XYZ (Web Mercator) cho layer môi trường
+    
+    - layer: aqi | heat | noise | radiation
+    - fmt: png (ảnh RGBA 256x256 theo thang màu) hoặc json (lưới giá trị 64x64, null = không có dữ liệu)
+    - Nội suy IDW từ các điểm đã đo/cached; tile được cache theo TTL của từng layer
+    
+    VD: /api/v1/tiles/aqi/10/813/450.png  (Hà Nội)
+    """
+    if layer not in tile_service.LAYERS:
+        raise HTTPException(status_code=404, detail=f"Layer không hỗ trợ: {layer}")
+    if fmt not in tile_service.FORMATS:
+        raise HTTPException(status_code=404, detail=f"Định dạng không hỗ trợ: {fmt}")
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=400, detail="Tọa độ tile nằm ngoài phạm vi zoom")
+
+    content, cache_hit = await tile_service.get_tile(layer, z, x, y, fmt)
+    return Response(
+        content=content,
+        media_type=tile_service.FORMATS[fmt],
+        headers={
+            "Cache-Control": f"public, max-age={tile_service.LAYERS[layer]['ttl']}",
+            "X-Tile-Cache": "HIT" if cache_hit else "MISS"
+        }
+    )
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.models import WeatherForecast
+from app.services.weather_service import WeatherService
+
+router = APIRouter()
+weather_service = WeatherService()
+
+@router.get("/weather/forecast", response_model=WeatherForecast)
+async def get_weather_forecast(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude"),
+    step: int = Query(3, description="Bước thời gian (giờ): 1 hoặc 3"),
+    hours: int = Query(120, ge=1, le=120, description="Số giờ dự báo (tối đa 5 ngày)")
+):
+    """
+    Dự báo thời tiết 5 ngày dạng cột (mỗi biến là một mảng song song theo times)
+    
+    - step=3: mốc 3 giờ gốc của OpenWeather; step=1: nội suy từng giờ
+    - Cache theo ô lưới ~11km (FORECAST_CELL_DEGREES), TTL FORECAST_CACHE_TTL
+    - Một lần gọi thay cho việc polling /environment nhiều lần để xem xu hướng
+    """
+    if step not in (1, 3):
+        raise HTTPException(status_code=400, detail="step phải là 1 hoặc 3")
+
+    forecast = await weather_service.get_forecast(lat, lon, step_hours=step, hours=hours)
+    if forecast is None:
+        raise HTTPException(status_code=503, detail="Không lấy được dự báo thời tiết")
+    return forecast
@@ -0,0 +1,119 @@
+"""
+Admission control cho endpoint nặng (VD /environment: ~10 upstream call + LLM mỗi request)
+
+- Tối đa max_concurrency request chạy cùng lúc, thêm tối đa max_queue request chờ (FIFO)
+- Chờ quá queue_timeout hoặc queue đã đầy -> không nhận (caller quyết định: 503 + Retry-After hoặc degrade)
+- Cache hit không đi qua đây (caller kiểm tra cache trước khi xin slot)
+
+    async with environment_admission.slot() as admitted:
+        if not admitted:
+            ...  # quá tải
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+from app.core.config import settings
+from app.core.tracing import span
+
+
+class AdmissionController:
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._stats: Dict[str, int] = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+        # Thời gian xử lý trung bình (EWMA, giây) -> ước lượng Retry-After
+        self._avg_seconds = 1.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    async def acquire(self) -> bool:
+        """True nếu được chạy; False nếu queue đầy hoặc chờ quá lâu"""
+        if not self.enabled:
+            return True
+        if not self._semaphore.locked():
+            # Còn slot và không ai đang chờ trước -> lấy ngay
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_queue:
+            self._stats["rejected_queue_full"] += 1
+            return False
+        else:
+            self._stats["queued"] += 1
+            self.waiting += 1
+            try:
+                with span("admission.wait", self.name):
+                    await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._stats["rejected_timeout"] += 1
+                return False
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        self._stats["admitted"] += 1
+        return True
+
+    def release(self, elapsed: float) -> None:
+        if not self.enabled:
+            return
+        self.active -= 1
+        self._avg_seconds = 0.9 * self._avg_seconds + 0.1 * elapsed
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[bool]:
+        admitted = await self.acquire()
+        started = time.perf_counter()
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release(time.perf_counter() - started)
+
+    def retry_after(self) -> int:
+        """Giây client nên chờ: thời gian để xử lý hết queue hiện tại (tối thiểu 1)"""
+        if not self.enabled:
+            return 1
+        batches = (self.active + self.waiting) / self.max_concurrency
+        return max(1, min(settings.ADMISSION_MAX_RETRY_AFTER, round(batches * self._avg_seconds)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "avg_seconds": round(self._avg_seconds, 3),
+            **self._stats,
+        }
+
+
+# Request /environment đầy đủ (không cache hit)
+environment_admission = AdmissionController(
+    "environment",
+    max_concurrency=settings.ENVIRONMENT_MAX_CONCURRENCY,
+    max_queue=settings.ENVIRONMENT_MAX_QUEUE,
+    queue_timeout=settings.ENVIRONMENT_QUEUE_TIMEOUT
+)
+
+# /environment/batch: mỗi request lấy tới BATCH_MAX_LOCATIONS vị trí -> giới hạn riêng, nhỏ hơn
+environment_batch_admission = AdmissionController(
+    "environment-batch",
+    max_concurrency=settings.BATCH_MAX_CONCURRENCY,
+    max_queue=settings.BATCH_MAX_QUEUE,
+    queue_timeout=settings.ENVIRONMENT_QUEUE_TIMEOUT
+)
+
+# Request bị từ chối nhưng được phục vụ bản rút gọn (chỉ nguồn nhanh, không LLM): không chờ
+environment_degraded_admission = AdmissionController(
+    "environment-degraded",
+    max_concurrency=settings.ENVIRONMENT_DEGRADED_MAX_CONCURRENCY,
+    max_queue=0,
+    queue_timeout=0
+)
@@ -16,6 +16,124 @@ class Settings(BaseSettings):
     
     # OpenAI for LangChain
     OPENAI_API_KEY: Optional[str] = None
+    OPENAI_BASE_URL: Optional[str] = None  # None = api.openai.com (đổi sang server tương thích / stub khi benchmark)
+    
+    # ===== UPSTREAM URLS =====
+    # Mặc định là API thật; benchmarks/ trỏ các URL này sang stub server cục bộ
+    OPENWEATHER_BASE_URL: str = "https://api.openweathermap.org/data/2.5"
+    AGROMONITORING_BASE_URL: str = "http://api.agromonitoring.com/agro/1.0"
+    WAQI_BASE_URL: str = "https://api.waqi.info"
+    WQP_BASE_URL: str = "https://www.waterqualitydata.us/data"
+    SENSOR_COMMUNITY_URL: str = "https://data.sensor.community"
+    OVERPASS_URL: str = "https://overpass-api.de/api/interpreter"
+    SOILGRIDS_BASE_URL: str = "https://rest.isric.org/soilgrids/v2.0"
+    SAFECAST_BASE_URL: str = "https://api.safecast.org"
+    NOMINATIM_BASE_URL: str = "https://nominatim.openstreetmap.org"
+    
+    # Ghi / phát lại HTTP ra upstream (tái hiện sự cố, load test offline với payload thật)
+    HTTP_RECORD_MODE: str = "off"  # off | record | replay
+    HTTP_RECORD_DIR: str = "recordings/default"
+    HTTP_REPLAY_LATENCY_SCALE: float = 1.0  # Nhân latency đã ghi (0 = trả ngay)
+    # Query params bỏ qua khi so khớp (đổi theo ngày chạy)
+    HTTP_REPLAY_IGNORE_PARAMS: list = ["captured_after", "startDateLo", "startDateHi"]
+    
+    # Đo thời gian từng bước của request (geocode, cache, từng nguồn, AI)
+    SERVER_TIMING_ENABLED: bool = True  # Header Server-Timing (xem trong DevTools > Network > Timing)
+    TRACE_FILE: Optional[str] = None  # VD: logs/traces.jsonl - mỗi request một dòng JSON
+    
+    # Logging (ghi ở thread nền qua queue, không chặn event loop)
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: dict = {"httpx": "WARNING", "httpcore": "WARNING"}  # Ghi đè level theo logger
+    LOG_FORMAT: str = "text"  # text | json
+    LOG_FILE: Optional[str] = None  # Ghi thêm ra file (ngoài stdout)
+    LOG_RATE_LIMIT: int = 20  # Số record tối đa / call site / cửa sổ (0 = không giới hạn)
+    LOG_RATE_WINDOW: float = 10.0  # Giây
+    LOG_RATE_MIN_LEVEL: str = "WARNING"  # Chỉ giới hạn record từ level này trở lên (access log INFO không bị giới hạn)
+    LOG_QUEUE_SIZE: int = 10000  # Queue đầy -> bỏ record
+    
+    # Admin endpoints (/api/v1/admin/*: CPU profile, tracemalloc, event loop lag)
+    # Không cấu hình -> tắt; gửi kèm header X-Admin-Token
+    ADMIN_TOKEN: Optional[str] = None
+    PROFILE_MAX_SECONDS: int = 60
+    LOOP_LAG_MONITOR_ENABLED: bool = True
+    LOOP_LAG_INTERVAL_MS: int = 50
+    LOOP_LAG_THRESHOLD_MS: int = 100  # Loop bị chặn lâu hơn -> ghi lại kèm stack
+    
+    # Decode / parse payload upstream lớn ngoài event loop (Sensor.Community, WQP, Safecast)
+    CPU_EXECUTOR: str = "thread"  # thread | process | inline
+    CPU_EXECUTOR_WORKERS: int = 2  # 0 = theo số CPU
+    OFFLOAD_MIN_BYTES: int = 65536  # Payload nhỏ hơn -> parse luôn trên loop
+    
+    # Admission control cho /environment (cache hit không bị giới hạn)
+    ENVIRONMENT_MAX_CONCURRENCY: int = 32  # Request lấy dữ liệu mới chạy cùng lúc (0 = không giới hạn)
+    ENVIRONMENT_MAX_QUEUE: int = 64  # Request chờ thêm; đầy -> quá tải
+    ENVIRONMENT_QUEUE_TIMEOUT: float = 10.0  # Chờ lâu hơn -> quá tải
+    # Khi quá tải: reject (503 + Retry-After) hoặc degrade (cache cũ, hoặc chỉ nguồn nhanh + đánh giá local)
+    ENVIRONMENT_OVERLOAD_POLICY: str = "degrade"
+    ENVIRONMENT_STALE_MAX_SECONDS: int = 86400  # Tuổi tối đa của cache đã hết hạn được phép trả
+    ENVIRONMENT_DEGRADED_SOURCES: list = ["weather", "air", "light", "heat"]
+    ENVIRONMENT_DEGRADED_MAX_CONCURRENCY: int = 16  # Hết slot bản rút gọn -> 503 (0 = không giới hạn)
+    # /environment/batch: limiter riêng (một batch tốn như nhiều request), không degrade -> 503
+    BATCH_MAX_CONCURRENCY: int = 2  # 0 = không giới hạn
+    BATCH_MAX_QUEUE: int = 4
+    ADMISSION_MAX_RETRY_AFTER: int = 60
+    
+    # Prompt: compact (JSON tối giản, ít token) hoặc verbose (prompt mô tả đầy đủ)
+    AI_PROMPT_MODE: str = "compact"
+    # Ràng buộc output theo JSON schema của EnvironmentalQuality (OpenAI structured outputs)
+    AI_STRUCTURED_OUTPUT: bool = True
+    
+    # Quá thời gian / vượt ngân sách -> dùng local rule engine
+    AI_TIMEOUT: float = 8.0  # seconds; stream: thời gian chờ tối đa cho mỗi chunk (token đầu và giữa các chunk)
+    AI_MAX_CALLS_PER_MINUTE: int = 0  # 0 = không giới hạn
+    
+    # Đánh giá AI theo batch (nhiều vị trí / một LLM call)
+    AI_BATCH_MAX_LOCATIONS: int = 20  # Số vị trí tối đa trong một prompt
+    AI_BATCH_MAX_PROMPT_CHARS: int = 12000  # Giới hạn độ dài dữ liệu trong một prompt
+    AI_BATCH_CONCURRENCY: int = 3  # Số batch LLM call chạy đồng thời
+    BATCH_MAX_LOCATIONS: int = 100  # Số vị trí tối đa mỗi request /environment/batch
+    BATCH_FETCH_CONCURRENCY: int = 5  # Số vị trí lấy dữ liệu đồng thời
+    
+    # Cache đánh giá AI theo fingerprint dữ liệu đầu vào
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_TTL: int = 6 * 3600  # seconds
+    AI_CACHE_MAX_ENTRIES: int = 2048
+    
+    # Đánh giá AI chạy nền (defer_ai)
+    AI_JOB_WORKERS: int = 4  # Số LLM call đồng thời tối đa
+    AI_JOB_QUEUE_SIZE: int = 200
+    AI_JOB_RESULT_TTL: int = 3600  # seconds giữ kết quả job để polling
+    
+    # Ghi cache MongoDB kiểu write-behind (hàng đợi + insert_many theo lô, ngoài request path)
+    CACHE_WRITE_BEHIND: bool = True
+    CACHE_WRITE_QUEUE_SIZE: int = 1000  # Hàng đợi đầy -> ghi trực tiếp (backpressure)
+    CACHE_WRITE_BATCH_SIZE: int = 100
+    CACHE_WRITE_FLUSH_INTERVAL: float = 0.5  # seconds chờ gom lô
+    
+    # Map tiles (/tiles/{layer}/{z}/{x}/{y}), TTL riêng theo layer trong TileService
+    TILE_CACHE_ENABLED: bool = True
+    TILE_CACHE_MAX_ENTRIES: int = 4096
+    TILE_MAX_STATIONS: int = 5000  # Số điểm quan trắc giữ trong bộ nhớ để nội suy
+    
+    # Dự báo thời tiết: cache theo ô lưới (OpenWeather cập nhật dự báo ~3 giờ/lần)
+    FORECAST_CELL_DEGREES: float = 0.1  # ~11km
+    FORECAST_CACHE_TTL: int = 1800  # seconds
+    FORECAST_CACHE_MAX_ENTRIES: int = 1024
+    
+    # Lịch sử đo (time-series collection "readings"), ghi theo lô ngoài request path
+    HISTORY_ENABLED: bool = True
+    HISTORY_CELL_DEGREES: float = 0.01  # ~1km
+    HISTORY_BATCH_SIZE: int = 500  # Số reading mỗi lần insert_many
+    HISTORY_FLUSH_INTERVAL: float = 5.0  # seconds
+    HISTORY_BUFFER_MAX: int = 20000  # Quá giới hạn (Mongo chậm/mất kết nối) -> bỏ reading cũ nhất
+    HISTORY_RETENTION_DAYS: int = 90
+    HISTORY_QUERY_MAX_POINTS: int = 5000
+    
+    # Rollup hour/day/month (min, max, mean, count, p95) tính nền từ readings
+    ROLLUP_ENABLED: bool = True
+    ROLLUP_INTERVAL: int = 300  # seconds giữa hai lần cập nhật
+    ROLLUP_BACKFILL_HOURS: int = 48  # Lần chạy đầu: tổng hợp lại dữ liệu bao lâu
+    ROLLUP_MAX_POINTS: int = 200  # Query tự chọn độ phân giải (hour -> day -> month) để số điểm <= giới hạn
     
     # ===== FREE APIs (no key needed) =====
     # Water Quality Portal (USGS + EPA) - FREE
@@ -34,6 +152,7 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     DEBUG: bool = False
+    WORKERS: int = 1  # >1: chạy nhiều process (0 = theo số CPU), nên bật SHARED_CACHE_URL
     
     # CORS
     CORS_ORIGINS: list = ["*"]
@@ -41,6 +160,14 @@ class Settings(BaseSettings):
     # Database
     MONGO_URL: Optional[str] = None
     
+    # Cache dùng chung giữa các worker (Redis hoặc server tương thích: KeyDB, Dragonfly, Valkey)
+    # Không cấu hình -> cache trong bộ nhớ của từng process
+    SHARED_CACHE_URL: Optional[str] = None  # VD: redis://localhost:6379/0
+    SHARED_CACHE_MAX_ENTRIES: int = 2048  # Giới hạn khi dùng cache trong bộ nhớ
+    
+    # City autocomplete index (JSON như app/data/cities.json hoặc GeoNames citiesXXXX.txt)
+    CITY_INDEX_PATH: Optional[str] = None
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
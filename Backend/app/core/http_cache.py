@@ -0,0 +1,121 @@
+"""
+HTTP caching helpers: ETag / If-None-Match (304), Cache-Control / Age và nén gzip / brotli
+
+Dùng cho các response đã serialize sẵn (bytes), VD: cache hit của /environment
+"""
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli là optional, không có thì chỉ dùng gzip
+    brotli = None
+
+# Body nhỏ hơn ngưỡng này nén không đáng
+MIN_COMPRESS_SIZE = 500
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# (etag, encoding) -> body đã nén; cùng một payload cache được nhiều client tải lại
+_compressed: "OrderedDict[tuple, bytes]" = OrderedDict()
+_COMPRESSED_MAX_ENTRIES = 512
+
+
+def make_etag(payload: bytes) -> str:
+    """Strong ETag từ nội dung payload"""
+    return '"' + hashlib.blake2b(payload, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match có chứa etag (hoặc *), kể cả biến thể theo encoding ("...-gzip")"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for value in header.split(","):
+        candidate = value.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        for encoding in ("-gzip", "-br"):
+            if candidate.endswith(encoding + '"'):
+                candidate = candidate[:-len(encoding) - 1] + '"'
+        if candidate == etag:
+            return True
+    return False
+
+
+def choose_encoding(request: Request) -> Optional[str]:
+    """br nếu client hỗ trợ và có thư viện brotli, sau đó gzip"""
+    accepted = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(payload: bytes, encoding: str, etag: Optional[str] = None) -> bytes:
+    """Nén payload; có etag thì nhớ kết quả để lần sau không nén lại"""
+    key = (etag, encoding) if etag else None
+    if key and key in _compressed:
+        _compressed.move_to_end(key)
+        return _compressed[key]
+
+    if encoding == "br":
+        body = brotli.compress(payload, quality=BROTLI_QUALITY)
+    else:
+        body = gzip.compress(payload, compresslevel=GZIP_LEVEL, mtime=0)
+
+    if key:
+        _compressed[key] = body
+        while len(_compressed) > _COMPRESSED_MAX_ENTRIES:
+            _compressed.popitem(last=False)
+    return body
+
+
+def cached_json_response(request: Request, payload: bytes, etag: Optional[str] = None,
+                         max_age: int = 0, age: int = 0) -> Response:
+    """
+    Response JSON từ payload đã serialize, kèm ETag / Cache-Control / Age
+
+    - If-None-Match khớp -> 304 không có body
+    - Nén theo Accept-Encoding khi payload đủ lớn
+    """
+    etag = etag or make_etag(payload)
+    headers: Dict[str, str] = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max(0, int(max_age))}",
+        "Age": str(max(0, int(age))),
+        "Vary": "Accept-Encoding",
+    }
+
+    encoding = choose_encoding(request) if len(payload) >= MIN_COMPRESS_SIZE else None
+    if encoding:
+        # Mỗi encoding là một representation khác nhau -> strong ETag riêng
+        headers["ETag"] = etag[:-1] + f'-{encoding}"'
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    body = payload
+    if encoding:
+        body = compress(payload, encoding, etag)
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,235 @@
+"""
+Ghi / phát lại HTTP ra upstream ở tầng httpx transport
+
+- record: mọi request của httpx.AsyncClient (mọi service trong app/services, kể cả OpenAI SDK)
+  đi qua upstream thật, response (body thô, status, headers) và thời gian được ghi vào archive
+- replay: không gọi mạng, trả response đã ghi với latency gốc nhân HTTP_REPLAY_LATENCY_SCALE
+
+Archive (HTTP_RECORD_DIR):
+    index.jsonl        một dòng / request: method, url, body hash, status, headers, elapsed_ms, body
+    bodies/<hash>.bin  body response thô (gzip/br giữ nguyên), dùng chung giữa các request trùng nội dung
+
+Khớp request khi replay: method + URL (query đã sắp xếp, bỏ HTTP_REPLAY_IGNORE_PARAMS) + hash body;
+không khớp thì lấy lần lượt các response cùng method + host + path (toạ độ mới vẫn có payload thật).
+Key API (appid, token, ...) được xoá khỏi URL trước khi ghi.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlencode
+import httpx
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Query params chứa API key -> không ghi vào archive, không dùng khi so khớp
+SECRET_PARAMS = {"appid", "token", "api_key", "apikey", "key"}
+# Header không cần giữ lại (đổi theo từng lần gọi hoặc nhạy cảm)
+DROPPED_HEADERS = {"set-cookie", "date", "connection", "keep-alive", "transfer-encoding"}
+
+
+def _request_key(request: httpx.Request, body: bytes, with_query: bool = True) -> str:
+    url = request.url
+    key = f"{request.method} {url.scheme}://{url.host}{url.path}"
+    if with_query:
+        ignored = SECRET_PARAMS | set(settings.HTTP_REPLAY_IGNORE_PARAMS)
+        params = sorted((k, v) for k, v in url.params.multi_items() if k not in ignored)
+        key += "?" + urlencode(params)
+        if body:
+            key += " #" + hashlib.blake2b(body, digest_size=12).hexdigest()
+    return key
+
+
+def _redacted_url(url: httpx.URL) -> str:
+    params = [(k, "***" if k in SECRET_PARAMS else v) for k, v in url.params.multi_items()]
+    return str(url.copy_with(query=urlencode(params).encode() if params else None))
+
+
+class HttpArchive:
+    """index.jsonl + bodies/ trong một thư mục"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self.bodies_dir = os.path.join(directory, "bodies")
+
+    def append(self, entry: Dict[str, Any], body: bytes) -> None:
+        os.makedirs(self.bodies_dir, exist_ok=True)
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        path = os.path.join(self.bodies_dir, f"{digest}.bin")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(body)
+        entry["body"] = digest
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def entries(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def body(self, digest: str) -> bytes:
+        with open(os.path.join(self.bodies_dir, f"{digest}.bin"), "rb") as f:
+            return f.read()
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Gọi upstream thật qua transport bên trong và ghi lại response"""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, archive: HttpArchive):
+        self.inner = inner
+        self.archive = archive
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        headers_ms = (time.perf_counter() - started) * 1000
+        try:
+            raw = b"".join([chunk async for chunk in response.stream])
+        finally:
+            await response.aclose()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in DROPPED_HEADERS]
+        entry = {
+            "key": _request_key(request, body),
+            "path_key": _request_key(request, body, with_query=False),
+            "method": request.method,
+            "url": _redacted_url(request.url),
+            "status": response.status_code,
+            "headers": headers,
+            "headers_ms": round(headers_ms, 2),
+            "elapsed_ms": round(elapsed_ms, 2),
+            "size": len(raw),
+            "recorded_at": time.time(),
+        }
+        try:
+            await asyncio.to_thread(self.archive.append, entry, raw)
+        except Exception as e:
+            logger.error(f"Error recording {request.method} {request.url.host}: {e}")
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=raw,
+            request=request,
+            extensions={"http_version": response.extensions.get("http_version", b"HTTP/1.1")}
+        )
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Trả response đã ghi, không gọi mạng; nhiều bản ghi cùng key được trả lần lượt"""
+
+    def __init__(self, archive: HttpArchive, latency_scale: float = 1.0):
+        self.archive = archive
+        self.latency_scale = latency_scale
+        self._by_key: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._by_path: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursors: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._bodies: Dict[str, bytes] = {}
+        self.hits = 0
+        self.fallbacks = 0
+        self.misses = 0
+        for entry in archive.entries():
+            self._by_key[entry["key"]].append(entry)
+            self._by_path[entry["path_key"]].append(entry)
+
+    def _next(self, kind: str, key: str, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        cursor = self._cursors[(kind, key)]
+        self._cursors[(kind, key)] = cursor + 1
+        return entries[cursor % len(entries)]
+
+    def _body(self, digest: str) -> bytes:
+        # Body multi-MB được đọc từ đĩa một lần rồi giữ trong bộ nhớ
+        if digest not in self._bodies:
+            self._bodies[digest] = self.archive.body(digest)
+        return self._bodies[digest]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        key = _request_key(request, body)
+        if key in self._by_key:
+            entry = self._next("key", key, self._by_key[key])
+            self.hits += 1
+        else:
+            path_key = _request_key(request, body, with_query=False)
+            if path_key not in self._by_path:
+                self.misses += 1
+                raise httpx.ConnectError(f"No recorded response for {request.method} {request.url.host}{request.url.path}",
+                                         request=request)
+            entry = self._next("path", path_key, self._by_path[path_key])
+            self.fallbacks += 1
+
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["elapsed_ms"] / 1000 * self.latency_scale)
+
+        return httpx.Response(
+            status_code=entry["status"],
+            headers=entry["headers"],
+            content=self._body(entry["body"]),
+            request=request
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "fallbacks": self.fallbacks, "misses": self.misses}
+
+
+_original_init = httpx.AsyncClient.__init__
+_installed: Dict[str, Any] = {}
+
+# Tham số của AsyncClient được chuyển cho transport thật khi ghi
+_TRANSPORT_OPTIONS = ("verify", "cert", "http1", "http2", "limits", "trust_env")
+
+
+def install() -> None:
+    """
+    Bật record / replay theo HTTP_RECORD_MODE cho mọi httpx.AsyncClient tạo sau lời gọi này
+
+    AsyncClient có transport / mounts riêng thì giữ nguyên (VD client test)
+    """
+    mode = settings.HTTP_RECORD_MODE
+    if mode == "off" or _installed:
+        return
+    if mode not in ("record", "replay"):
+        raise ValueError(f"HTTP_RECORD_MODE must be off, record or replay, got '{mode}'")
+
+    archive = HttpArchive(settings.HTTP_RECORD_DIR)
+    replay = ReplayTransport(archive, settings.HTTP_REPLAY_LATENCY_SCALE) if mode == "replay" else None
+
+    def patched_init(self, *args, **kwargs):
+        if kwargs.get("transport") is None and not kwargs.get("mounts"):
+            if replay is not None:
+                kwargs["transport"] = replay
+            else:
+                options = {name: kwargs[name] for name in _TRANSPORT_OPTIONS if name in kwargs}
+                kwargs["transport"] = RecordingTransport(httpx.AsyncHTTPTransport(**options), archive)
+        _original_init(self, *args, **kwargs)
+
+    httpx.AsyncClient.__init__ = patched_init
+    _installed.update(mode=mode, archive=archive, replay=replay)
+    logger.warning(f"HTTP {mode} mode enabled ({settings.HTTP_RECORD_DIR})")
+
+
+def uninstall() -> None:
+    httpx.AsyncClient.__init__ = _original_init
+    _installed.clear()
+
+
+def stats() -> Dict[str, Any]:
+    if not _installed:
+        return {"mode": "off"}
+    result = {"mode": _installed["mode"], "directory": _installed["archive"].directory}
+    if _installed["replay"] is not None:
+        result.update(_installed["replay"].stats())
+    return result
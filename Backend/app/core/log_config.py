@@ -0,0 +1,191 @@
+"""
+Logging không chặn event loop
+
+- Root logger chỉ có một QueueHandler: trên event loop chỉ ghép message rồi đẩy vào queue,
+  thread nền (QueueListener) format và ghi ra stdout / LOG_FILE
+- LOG_LEVEL cho root, LOG_LEVELS ghi đè theo logger (VD {"app.services.geocoding_service": "DEBUG"})
+- LOG_FORMAT: text | json (một dòng JSON / record, kèm trace_id của request nếu có)
+- Rate limit theo call site (logger + dòng code) cho record từ LOG_RATE_MIN_LEVEL trở lên (trừ uvicorn.access):
+  tối đa LOG_RATE_LIMIT record mỗi LOG_RATE_WINDOW giây, phần vượt bị bỏ và được đếm ở record kế tiếp
+  của cùng call site ("+N suppressed")
+- Queue đầy (stdout bị nghẽn) -> bỏ record thay vì chặn request
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.tracing import current_trace
+
+# Logger của uvicorn có handler ghi đồng bộ riêng -> chuyển sang queue
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+# Mọi dòng access log đến từ cùng một call site của uvicorn -> không bao giờ rate limit
+RATE_LIMIT_EXEMPT = ("uvicorn.access",)
+
+_listener: Optional[QueueListener] = None
+_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+class RateLimitFilter(logging.Filter):
+    """Giới hạn số record mỗi call site trong một cửa sổ thời gian (chỉ từ min_level trở lên)"""
+
+    def __init__(self, limit: int, window: float, min_level: int = logging.WARNING,
+                 exempt: Tuple[str, ...] = RATE_LIMIT_EXEMPT):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.min_level = min_level
+        self.exempt = exempt
+        # (logger, pathname, lineno) -> [bắt đầu cửa sổ, số record đã cho qua, số record bị bỏ]
+        self._sites: Dict[Tuple[str, str, int], List[float]] = {}
+        self.suppressed_total = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno < self.min_level or record.name in self.exempt:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        site = self._sites.get(key)
+        if site is None or now - site[0] >= self.window:
+            suppressed = int(site[2]) if site else 0
+            self._sites[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if site[1] < self.limit:
+            site[1] += 1
+            return True
+        site[2] += 1
+        self.suppressed_total += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler không bao giờ chặn: việc format đầy đủ để thread nền làm"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Chỉ ghép message (args có thể không pickle / đổi sau đó) và traceback, giữ nguyên record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        trace = current_trace()
+        record.trace_id = trace.trace_id if trace else None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" (+{suppressed} suppressed)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Một dòng JSON / record; field thêm qua extra={...} được giữ lại"""
+
+    RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "trace_id", "suppressed"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            data["trace_id"] = record.trace_id
+        if getattr(record, "suppressed", 0):
+            data["suppressed"] = record.suppressed
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in self.RESERVED and not key.startswith("_"):
+                data[key] = value
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging() -> None:
+    """Cấu hình logging cho process (gọi một lần khi import app, các lần sau bỏ qua)"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter()
+    outputs: List[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if settings.LOG_FILE:
+        directory = os.path.dirname(settings.LOG_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        outputs.append(logging.FileHandler(settings.LOG_FILE, encoding="utf-8"))
+    for output in outputs:
+        output.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(RateLimitFilter(
+        settings.LOG_RATE_LIMIT,
+        settings.LOG_RATE_WINDOW,
+        min_level=logging.getLevelName(settings.LOG_RATE_MIN_LEVEL.upper())
+    ))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(str(level).upper())
+
+    _listener = QueueListener(log_queue, *outputs, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Ghi nốt các record còn trong queue rồi dừng thread nền"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def stats() -> Dict[str, Any]:
+    if _handler is None:
+        return {"enabled": False}
+    rate_limit = next((f for f in _handler.filters if isinstance(f, RateLimitFilter)), None)
+    return {
+        "enabled": True,
+        "queued": _handler.queue.qsize(),
+        "dropped": _handler.dropped,
+        "suppressed": rate_limit.suppressed_total if rate_limit else 0,
+    }
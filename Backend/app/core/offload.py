@@ -0,0 +1,91 @@
+"""
+Chạy việc nặng CPU (decode + parse payload upstream lớn) ngoài event loop
+
+- run_cpu(func, *args, size=...): payload nhỏ hơn OFFLOAD_MIN_BYTES chạy luôn trên loop
+  (chuyển sang executor tốn hơn tự parse), còn lại chạy trong executor theo CPU_EXECUTOR:
+    thread  - ThreadPoolExecutor: không copy dữ liệu, loop vẫn được chia GIL trong lúc parse
+    process - ProcessPoolExecutor: parse song song thật, func / tham số / kết quả phải pickle được
+              -> truyền body bytes vào, trả kết quả nhỏ (model đã tổng hợp), không trả payload đã decode
+    inline  - như trước đây, chạy trên loop (debug / so sánh benchmark)
+- json_loads: orjson nếu có (nhanh hơn json chuẩn nhiều lần với body vài MB), không thì json
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, TypeVar, Union
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # orjson là optional, không có thì dùng json chuẩn
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_executor: Optional[Executor] = None
+_stats: Dict[str, int] = {"inline": 0, "offloaded": 0, "errors": 0}
+
+
+def json_loads(body: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode JSON từ bytes / str"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _get_executor() -> Optional[Executor]:
+    global _executor
+    if _executor is None and settings.CPU_EXECUTOR in ("thread", "process"):
+        workers = settings.CPU_EXECUTOR_WORKERS or os.cpu_count() or 1
+        if settings.CPU_EXECUTOR == "process":
+            # spawn: process mới import lại module, không fork process đang có thread (log, cache writer, ...)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cpu-offload")
+        logger.info(f"CPU offload executor: {settings.CPU_EXECUTOR} x {workers}")
+    return _executor
+
+
+async def run_cpu(func: Callable[..., T], *args: Any, size: Optional[int] = None) -> T:
+    """
+    Chạy func(*args) ngoài event loop
+
+    size: kích thước payload (bytes), nhỏ hơn OFFLOAD_MIN_BYTES thì chạy luôn trên loop
+    """
+    executor = _get_executor()
+    if executor is None or (size is not None and size < settings.OFFLOAD_MIN_BYTES):
+        _stats["inline"] += 1
+        return func(*args)
+    _stats["offloaded"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args))
+    except Exception:
+        _stats["errors"] += 1
+        raise
+
+
+async def decode_json(body: bytes) -> Any:
+    """json_loads body, body lớn thì decode ngoài loop (process: kết quả phải pickle về, nên tránh với body rất lớn)"""
+    return await run_cpu(json_loads, body, size=len(body))
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "executor": settings.CPU_EXECUTOR,
+        "json": "orjson" if orjson is not None else "json",
+        "min_bytes": settings.OFFLOAD_MIN_BYTES,
+        **_stats,
+    }
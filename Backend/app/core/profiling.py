@@ -0,0 +1,260 @@
+"""
+Profiling process đang chạy (dùng qua /api/v1/admin/*)
+
+- CPU: thread nền lấy mẫu stack của mọi thread (sys._current_frames) trong N giây,
+  trả về dạng collapsed ("a;b;c 12") cho flamegraph.pl / speedscope / inferno
+- Bộ nhớ: tracemalloc snapshot, top allocation theo dòng / file / traceback, so với baseline lúc start
+- Event loop lag: task trên loop ghi hạn thức dậy, watchdog thread phát hiện loop bị chặn
+  quá LOOP_LAG_THRESHOLD_MS và chụp stack đang chạy trên loop tại thời điểm đó
+
+Mỗi worker là một process riêng -> profile chỉ của worker nhận request.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import traceback
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Frame lá của thread đang chờ (không dùng CPU): bỏ qua khi idle=False
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapse(frame) -> List[str]:
+    """Stack từ ngoài vào trong"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class CpuProfiler:
+    """Sampling profiler: một profile tại một thời điểm"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+
+    def _sample(self, seconds: float, interval: float, thread_ids: Optional[set], idle: bool) -> Dict[str, Any]:
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (thread_ids and thread_id not in thread_ids):
+                    continue
+                if not idle and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                thread_name = names.get(thread_id) or str(thread_id)
+                stacks[";".join([thread_name] + _collapse(frame))] += 1
+            samples += 1
+            time.sleep(interval)
+        return {"stacks": stacks, "samples": samples}
+
+    async def profile(self, seconds: float, interval: float, loop_only: bool = False,
+                      idle: bool = False) -> Dict[str, Any]:
+        """Lấy mẫu trong thread riêng (loop vẫn chạy bình thường trong lúc đo)"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A CPU profile is already running")
+        self.running = True
+        try:
+            thread_ids = {threading.get_ident()} if loop_only else None
+            started = time.time()
+            result = await asyncio.to_thread(self._sample, seconds, interval, thread_ids, idle)
+            result.update(started_at=started, seconds=seconds, interval=interval)
+            return result
+        finally:
+            self.running = False
+            self._lock.release()
+
+    @staticmethod
+    def collapsed(stacks: Counter) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+class MemoryProfiler:
+    """tracemalloc: start (kèm baseline snapshot), top allocations, stop"""
+
+    def __init__(self):
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.started_at: Optional[float] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int) -> None:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        tracemalloc.start(frames)
+        self.started_at = time.time()
+        self.baseline = tracemalloc.take_snapshot()
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.baseline = None
+        self.started_at = None
+
+    def top(self, limit: int, group_by: str, compare: bool) -> Dict[str, Any]:
+        """Snapshot + thống kê (tốn CPU, nên gọi qua asyncio.to_thread)"""
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        if compare and self.baseline is not None:
+            stats = snapshot.compare_to(self.baseline, group_by)
+        else:
+            stats = snapshot.statistics(group_by)
+
+        items = []
+        for stat in stats[:limit]:
+            item = {
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count,
+                "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            }
+            if compare and self.baseline is not None:
+                item.update(size_diff_kb=round(stat.size_diff / 1024, 1), count_diff=stat.count_diff)
+            items.append(item)
+        return {
+            "started_at": self.started_at,
+            "traced_current_mb": round(current / 1024 / 1024, 2),
+            "traced_peak_mb": round(peak / 1024 / 1024, 2),
+            "group_by": group_by,
+            "compared_to_baseline": compare and self.baseline is not None,
+            "top": items,
+        }
+
+
+class LoopLagMonitor:
+    """
+    Phát hiện event loop bị chặn
+
+    - Task trên loop: sleep(interval) rồi thức dậy; lag = thời gian thức dậy trễ so với dự kiến
+    - Watchdog thread (kiểm tra mỗi watch_interval, mịn hơn interval): loop trễ hạn thức dậy gần tới
+      threshold -> loop đang bị chặn, chụp stack của thread chạy loop (stall ngắn nhất được ghi vẫn có stack)
+    """
+
+    def __init__(self, interval: float, threshold: float, max_events: int = 100):
+        self.interval = interval
+        self.threshold = threshold
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self.stalls = 0
+        self.max_lag_ms = 0.0
+        self.checks = 0
+        # Kiểm tra đủ dày để bắt được stall chỉ vừa quá threshold
+        self.watch_interval = max(0.001, min(interval, threshold) / 10)
+        self._expected_wake = time.perf_counter() + interval
+        self._loop_thread_id: Optional[int] = None
+        self._pending_stack: Optional[List[str]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._expected_wake = time.perf_counter() + self.interval
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            self._expected_wake = expected
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.checks += 1
+            lag = now - expected
+            if lag >= self.threshold:
+                self._record(lag)
+            else:
+                self._pending_stack = None
+
+    def _record(self, lag: float) -> None:
+        lag_ms = round(lag * 1000, 1)
+        self.stalls += 1
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        stack, self._pending_stack = self._pending_stack, None
+        self.events.append({
+            "at": time.time(),
+            "lag_ms": lag_ms,
+            "stack": stack or [],
+        })
+        where = stack[-1] if stack else "unknown"
+        logger.warning(f"Event loop blocked for {lag_ms} ms at {where}")
+
+    def _watch(self):
+        captured_for = None
+        # Chụp sớm hơn threshold một nhịp kiểm tra: stall vừa đủ threshold vẫn được chụp trước khi loop chạy tiếp
+        capture_after = max(0.0, self.threshold - self.watch_interval)
+        while not self._stop.wait(self.watch_interval):
+            expected = self._expected_wake
+            if time.perf_counter() - expected < capture_after or captured_for == expected:
+                continue
+            # Loop chưa thức dậy -> stack hiện tại của thread loop là code đang chặn
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._pending_stack = [
+                    f"{entry.filename}:{entry.lineno} in {entry.name}" for entry in traceback.extract_stack(frame)
+                ]
+            captured_for = expected
+
+    def stats(self, events: int = 20) -> Dict[str, Any]:
+        return {
+            "enabled": self._task is not None,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "checks": self.checks,
+            "stalls": self.stalls,
+            "max_lag_ms": self.max_lag_ms,
+            "recent": list(self.events)[-events:][::-1],
+        }
+
+    def clear(self) -> None:
+        self.events.clear()
+        self.stalls = 0
+        self.max_lag_ms = 0.0
+
+
+cpu_profiler = CpuProfiler()
+memory_profiler = MemoryProfiler()
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_LAG_INTERVAL_MS / 1000,
+    threshold=settings.LOOP_LAG_THRESHOLD_MS / 1000
+)
@@ -0,0 +1,162 @@
+"""
+Đo thời gian theo span cho từng request: header Server-Timing + trace event (JSON lines) tuỳ chọn
+
+    with span("weather", "OpenWeather"):
+        weather = await weather_service.get_weather(lat, lon)
+
+- Span gắn vào request hiện tại qua contextvar, ngoài request (task nền, script) thì không làm gì
+- Tên span là token (VD "noise.overpass"), desc là tên upstream hiển thị trong DevTools
+- TRACE_FILE: mỗi request một dòng JSON, ghi bởi thread nền (không I/O trên event loop)
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Server-Timing quá dài có thể bị proxy cắt -> giới hạn số span trong header
+MAX_HEADER_SPANS = 64
+
+
+class Trace:
+    """Các span của một request: (name, desc, start, duration) theo giây, start tính từ đầu request"""
+
+    __slots__ = ("trace_id", "started", "spans", "finished")
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, Optional[str], float, float]] = []
+        self.finished = False
+
+    def add(self, name: str, desc: Optional[str], start: float, duration: float) -> None:
+        if not self.finished:
+            self.spans.append((name, desc, start - self.started, duration))
+
+    def server_timing(self) -> str:
+        parts = []
+        for name, desc, _, duration in self.spans[:MAX_HEADER_SPANS]:
+            part = f"{name};dur={duration * 1000:.1f}"
+            if desc:
+                part += f';desc="{desc}"'
+            parts.append(part)
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "spans": [
+                {"name": name, "desc": desc, "start_ms": round(start * 1000, 2), "dur_ms": round(duration * 1000, 2)}
+                for name, desc, start, duration in self.spans
+            ],
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+class span:
+    """Context manager đo một đoạn code trong request hiện tại (dùng được trong cả hàm async)"""
+
+    __slots__ = ("name", "desc", "trace", "start")
+
+    def __init__(self, name: str, desc: Optional[str] = None):
+        self.name = name
+        self.desc = desc
+
+    def __enter__(self) -> "span":
+        self.trace = _current_trace.get()
+        if self.trace is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.trace is not None:
+            self.trace.add(self.name, self.desc, self.start, time.perf_counter() - self.start)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+class TraceFileWriter:
+    """Ghi trace event ra file bằng thread nền, queue đầy thì bỏ event (không chặn request)"""
+
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self.dropped = 0
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, event: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                event = self._queue.get()
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: tạo Trace cho mỗi request HTTP, thêm Server-Timing khi gửi response
+    (span kết thúc sau khi header đã gửi, VD stream, chỉ có trong trace file)
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.writer = TraceFileWriter(settings.TRACE_FILE) if settings.TRACE_FILE else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        token = _current_trace.set(trace)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.SERVER_TIMING_ENABLED:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing().encode("latin-1", "replace")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_trace.reset(token)
+            trace.finished = True
+            if self.writer:
+                event = trace.to_dict()
+                event.update(
+                    ts=time.time(),
+                    method=scope.get("method"),
+                    path=scope.get("path"),
+                    query=scope.get("query_string", b"").decode("latin-1"),
+                    status=status,
+                    total_ms=round((time.perf_counter() - trace.started) * 1000, 2),
+                )
+                self.writer.write(event)
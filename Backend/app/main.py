@@ -1,8 +1,26 @@
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.api.v1 import environment, cache
+from app.core import log_config
+
+# Logging qua queue + thread nền, trước khi import service (có service log ngay lúc import)
+log_config.setup_logging()
+
+from app.core import http_recorder
+from app.core.tracing import TracingMiddleware
+from app.core.profiling import loop_monitor
+from app.core import offload
+from app.api.v1 import environment, cache, geocode, ai, light, heat, tiles, weather, history, admin
 from app.services.database import db_service
+from app.services.cache_service import cache_service
+from app.services.assessment_job_service import assessment_job_service
+from app.services.history_service import history_service
+from app.services.rollup_service import rollup_service
+from app.services.shared_cache import shared_cache
+
+# Record / replay HTTP ra upstream (HTTP_RECORD_MODE), trước khi service nào tạo client
+http_recorder.install()
 
 # Khởi tạo app
 app = FastAPI(
@@ -18,8 +36,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Span thời gian cho từng request (Server-Timing, TRACE_FILE), thêm sau cùng -> bọc ngoài cùng
+app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(
     environment.router,
@@ -33,15 +55,76 @@ app.include_router(
     tags=["Cache"]
 )
 
+app.include_router(
+    geocode.router,
+    prefix=settings.API_V1_PREFIX,
+    tags=["Geocoding"]
+)
+
+app.include_router(
+    ai.router,
+    prefix=settings.API_V1_PREFIX,
+    tags=["AI"]
+)
+
+app.include_router(
+    light.router,
+    prefix=settings.API_V1_PREFIX,
+    tags=["Light"]
+)
+
+app.include_router(
+    heat.router,
+    prefix=settings.API_V1_PREFIX,
+    tags=["Heat"]
+)
+
+app.include_router(
+    tiles.router,
+    prefix=settings.API_V1_PREFIX,
+    tags=["Tiles"]
+)
+
+app.include_router(
+    weather.router,
+    prefix=settings.API_V1_PREFIX,
+    tags=["Weather"]
+)
+
+app.include_router(
+    history.router,
+    prefix=settings.API_V1_PREFIX,
+    tags=["History"]
+)
+
+app.include_router(
+    admin.router,
+    prefix=settings.API_V1_PREFIX,
+    tags=["Admin"]
+)
+
 # MongoDB connection events
 @app.on_event("startup")
 async def startup_event():
     """Connect to MongoDB on startup"""
     await db_service.connect_to_mongo()
+    cache_service.start_writer()
+    assessment_job_service.start()
+    await history_service.start()
+    await rollup_service.start()
+    if settings.LOOP_LAG_MONITOR_ENABLED:
+        loop_monitor.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Disconnect from MongoDB on shutdown"""
+    await loop_monitor.stop()
+    await assessment_job_service.stop()
+    await rollup_service.stop()
+    await history_service.stop()
+    await cache_service.stop_writer()
+    await shared_cache.close()
+    offload.shutdown()
     await db_service.close_mongo_connection()
 
 @app.get("/")
@@ -59,9 +142,12 @@ async def health():
 # Run app
 if __name__ == "__main__":
     import uvicorn
+    # WORKERS > 1: mỗi worker là một process riêng (reload chỉ dùng được với 1 worker)
+    workers = settings.WORKERS or os.cpu_count() or 1
     uvicorn.run(
         "app.main:app",
         host=settings.HOST,
         port=settings.PORT,
-        reload=settings.DEBUG
+        reload=settings.DEBUG and workers == 1,
+        workers=workers
     )
\ No newline at end of file
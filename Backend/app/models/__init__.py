@@ -1,25 +1,42 @@
 from .location import LocationData
-from .weather import WeatherData
+from .weather import WeatherData, WeatherForecast
 from .air import AirQualityData
 from .water import WaterQualityData
 from .noise import NoiseData
 from .soil import SoilData
-from .light import LightData
-from .heat import HeatData
+from .light import LightData, LightSeries
+from .heat import HeatData, HeatForecast
 from .radiation import RadiationData
 from .environmental_quality import EnvironmentalQuality
+from .assessment_job import AssessmentJobRef, AssessmentJobStatus
 from .response import EnvironmentResponse
+from .batch import BatchLocation, BatchEnvironmentRequest, BatchEnvironmentItem, BatchEnvironmentResponse
+from .geocode import CitySuggestion, CitySuggestResponse
+from .history import HistorySeries, HistoryRollup
 
 __all__ = [
     "LocationData",
     "WeatherData",
+    "WeatherForecast",
     "AirQualityData",
     "WaterQualityData",
     "NoiseData",
     "SoilData",
     "LightData",
+    "LightSeries",
     "HeatData",
+    "HeatForecast",
     "EnvironmentalQuality",
+    "AssessmentJobRef",
+    "AssessmentJobStatus",
     "RadiationData",
     "EnvironmentResponse",
+    "BatchLocation",
+    "BatchEnvironmentRequest",
+    "BatchEnvironmentItem",
+    "BatchEnvironmentResponse",
+    "CitySuggestion",
+    "CitySuggestResponse",
+    "HistorySeries",
+    "HistoryRollup",
 ]
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import Optional
+from .environmental_quality import EnvironmentalQuality
+
+class AssessmentJobRef(BaseModel):
+    """Tham chiếu tới job đánh giá AI đang chạy nền"""
+    job_id: str
+    status: str  # pending, running, done, failed
+    url: str  # Endpoint để polling kết quả
+
+class AssessmentJobStatus(BaseModel):
+    job_id: str
+    status: str
+    environmental_quality: Optional[EnvironmentalQuality] = None
+    error: Optional[str] = None
@@ -0,0 +1,21 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from .response import EnvironmentResponse
+
+class BatchLocation(BaseModel):
+    id: str = Field(..., description="Mã vị trí do client đặt, dùng để map kết quả")
+    lat: float
+    lon: float
+    city: Optional[str] = None
+    country: Optional[str] = None
+
+class BatchEnvironmentRequest(BaseModel):
+    locations: List[BatchLocation]
+    assessment: str = Field("ai", pattern="^(ai|local)$")
+
+class BatchEnvironmentItem(BaseModel):
+    id: str
+    data: EnvironmentResponse
+
+class BatchEnvironmentResponse(BaseModel):
+    results: List[BatchEnvironmentItem] = []
@@ -14,6 +14,8 @@ class CachedEnvironmentData(BaseModel):
     
     # Data
     data: Dict[str, Any]
+    payload: Optional[bytes] = None  # data pre-serialized as JSON, sent as-is on cache hits
+    etag: Optional[str] = None  # strong ETag of payload, changes whenever payload changes
     
     # Metadata
     created_at: datetime = Field(default_factory=datetime.utcnow)
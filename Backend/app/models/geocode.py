@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+class CitySuggestion(BaseModel):
+    name: str
+    country: Optional[str] = None
+    country_code: Optional[str] = None
+    lat: float
+    lon: float
+    population: Optional[int] = None
+    alt_names: List[str] = Field(default_factory=list, exclude=True)
+
+class CitySuggestResponse(BaseModel):
+    query: str
+    suggestions: List[CitySuggestion] = []
@@ -1,7 +1,21 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 
 class HeatData(BaseModel):
     temperature: Optional[float] = Field(None, description="°C")
     heat_index: Optional[float] = Field(None, description="°C")
-    surface_temperature: Optional[float] = Field(None, description="°C")
\ No newline at end of file
+    surface_temperature: Optional[float] = Field(None, description="°C")
+
+class HeatForecast(BaseModel):
+    """Dự báo nóng ẩm theo giờ dạng cột (mỗi biến là một mảng song song theo times)"""
+    lat: float
+    lon: float
+    times: List[str] = Field(..., description="UTC, ISO 8601")
+    temperature: List[float] = Field(..., description="°C")
+    humidity: List[float] = Field(..., description="%")
+    heat_index: List[float] = Field(..., description="°C")
+    surface_temperature: List[float] = Field(..., description="°C")
+    heat_risk: List[str] = Field(..., description="none | caution | extreme_caution | danger | extreme_danger (NWS)")
+    peak_heat_index: Optional[float] = Field(None, description="°C")
+    peak_time: Optional[str] = None
+    source: str = "OpenWeather Forecast"
@@ -0,0 +1,33 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+
+class HistorySeries(BaseModel):
+    """Chuỗi lịch sử đo của một nguồn tại một ô lưới, dạng cột (values[field] song song với times)"""
+    lat: float
+    lon: float
+    cell: str = Field(..., description="Ô lưới HISTORY_CELL_DEGREES chứa vị trí")
+    source: str = Field(..., description="weather | air | water | noise | soil | light | heat | radiation")
+    start: str
+    end: str
+    count: int
+    times: List[str] = Field(..., description="UTC, ISO 8601")
+    values: Dict[str, List[Optional[float]]]
+
+
+class HistoryRollup(BaseModel):
+    """Thống kê tổng hợp sẵn (hour/day/month) của một chỉ số, dạng cột song song theo times"""
+    lat: float
+    lon: float
+    cell: str
+    source: str
+    metric: str = Field(..., description="Tên trường, VD: aqi, pm25, temperature")
+    resolution: str = Field(..., description="hour | day | month")
+    start: str
+    end: str
+    times: List[str] = Field(..., description="Đầu mỗi khoảng (UTC, ISO 8601)")
+    min: List[Optional[float]]
+    max: List[Optional[float]]
+    mean: List[Optional[float]]
+    p95: List[Optional[float]]
+    count: List[int]
@@ -1,9 +1,26 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 
 class LightData(BaseModel):
     intensity: Optional[float] = Field(None, description="lux")
     uv_index: Optional[float] = None
     sunrise: Optional[str] = None
     sunset: Optional[str] = None
-    daylight_duration: Optional[float] = Field(None, description="hours")
\ No newline at end of file
+    daylight_duration: Optional[float] = Field(None, description="hours")
+
+class LightSeries(BaseModel):
+    """Chuỗi ánh sáng/mặt trời dạng cột (mỗi biến là một mảng song song theo thời gian)"""
+    lat: float
+    lon: float
+    span: str  # day | year
+    start: str = Field(..., description="Mốc thời gian đầu tiên (UTC, ISO 8601)")
+    step_minutes: int
+    utc_offset_hours: int = Field(..., description="Múi giờ ước tính theo kinh độ")
+    sun_elevation: List[float] = Field(..., description="degrees")
+    irradiance: List[float] = Field(..., description="W/m², trời quang")
+    intensity: List[float] = Field(..., description="lux, trời quang")
+    uv_index: List[float]
+    days: List[str] = Field(..., description="Ngày (UTC) của sunrise/sunset/daylight_duration")
+    sunrise: List[Optional[str]] = Field(..., description="HH:MM UTC, null nếu ngày/đêm địa cực")
+    sunset: List[Optional[str]]
+    daylight_duration: List[float] = Field(..., description="hours")
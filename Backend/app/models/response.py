@@ -10,6 +10,7 @@ from .light import LightData
 from .heat import HeatData
 from .radiation import RadiationData
 from .environmental_quality import EnvironmentalQuality
+from .assessment_job import AssessmentJobRef
 
 class EnvironmentResponse(BaseModel):
     location: LocationData
@@ -23,4 +24,5 @@ class EnvironmentResponse(BaseModel):
     heat: Optional[HeatData] = None
     radiation: Optional[RadiationData] = None
     environmental_quality: Optional[EnvironmentalQuality] = None
+    assessment_job: Optional[AssessmentJobRef] = None  # Khi đánh giá AI chạy nền (defer_ai)
     sources: List[str] = []
\ No newline at end of file
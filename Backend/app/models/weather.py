@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 
 class WeatherData(BaseModel):
     temperature: Optional[float] = Field(None, description="°C")
@@ -11,4 +11,22 @@ class WeatherData(BaseModel):
     clouds: Optional[float] = Field(None, description="%")
     visibility: Optional[float] = Field(None, description="m")
     description: Optional[str] = None
-    uv_index: Optional[float] = None
\ No newline at end of file
+    uv_index: Optional[float] = None
+
+class WeatherForecast(BaseModel):
+    """Dự báo thời tiết dạng cột: mỗi biến là một mảng song song theo times"""
+    lat: float
+    lon: float
+    step_hours: int = Field(..., description="1 (nội suy) hoặc 3 (gốc OpenWeather)")
+    times: List[str] = Field(..., description="UTC, ISO 8601")
+    temperature: List[Optional[float]] = Field(..., description="°C")
+    feels_like: List[Optional[float]] = Field(..., description="°C")
+    humidity: List[Optional[float]] = Field(..., description="%")
+    pressure: List[Optional[float]] = Field(..., description="hPa")
+    wind_speed: List[Optional[float]] = Field(..., description="m/s")
+    wind_direction: List[Optional[float]] = Field(..., description="degrees")
+    clouds: List[Optional[float]] = Field(..., description="%")
+    precipitation_probability: List[Optional[float]] = Field(..., description="0-1")
+    rain: List[Optional[float]] = Field(..., description="mm trong mỗi bước thời gian")
+    description: List[Optional[str]]
+    source: str = "OpenWeather Forecast"
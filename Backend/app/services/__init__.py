@@ -1,14 +1,28 @@
-from .weather_service import WeatherService
-from .air_service import AirQualityService
-from .water_service import WaterQualityService
-from .noise_service import NoiseService
-from .soil_service import SoilService
-from .light_service import LightService
-from .heat_service import HeatService
-from .radiation_service import RadiationService
-from .geocoding_service import geocoding_service
-from .environmental_ai_service import EnvironmentalAIService
-from .aggregator import EnvironmentAggregator
+import importlib
+
+# Import lười: `import app.services.x` không kéo theo toàn bộ services (và các thư viện nặng của chúng)
+_EXPORTS = {
+    "WeatherService": ".weather_service",
+    "AirQualityService": ".air_service",
+    "WaterQualityService": ".water_service",
+    "NoiseService": ".noise_service",
+    "SoilService": ".soil_service",
+    "LightService": ".light_service",
+    "HeatService": ".heat_service",
+    "RadiationService": ".radiation_service",
+    "geocoding_service": ".geocoding_service",
+    "EnvironmentalAIService": ".environmental_ai_service",
+    "EnvironmentAggregator": ".aggregator",
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     "WeatherService",
@@ -22,4 +36,4 @@ __all__ = [
     "geocoding_service",
     "EnvironmentalAIService",
     "EnvironmentAggregator",
-]
\ No newline at end of file
+]
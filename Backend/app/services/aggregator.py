@@ -1,6 +1,10 @@
-from typing import Optional, List
+import logging
+import asyncio
+from typing import Optional, List, Dict, Any
 from datetime import datetime
-from app.models import EnvironmentResponse, LocationData
+from app.core.config import settings
+from app.core.tracing import span
+from app.models import EnvironmentResponse, LocationData, AssessmentJobRef, BatchLocation
 from app.services.weather_service import WeatherService
 from app.services.air_service import AirQualityService
 from app.services.water_service import WaterQualityService
@@ -10,10 +14,19 @@ from app.services.light_service import LightService
 from app.services.heat_service import HeatService
 from app.services.radiation_service import RadiationService
 from app.services.geocoding_service import geocoding_service
-from app.services.environmental_ai_service import EnvironmentalAIService
+from app.services.environmental_ai_service import environmental_ai_service, EnvironmentalAIService
+from app.services.assessment_job_service import assessment_job_service
+from app.services.rule_assessment_service import rule_assessment_service
+from app.services.tile_service import tile_service
+from app.services.history_service import history_service
+
+logger = logging.getLogger(__name__)
 
 class EnvironmentAggregator:
     """Class chính để gom dữ liệu từ tất cả services"""
+    
+    # Các loại dữ liệu đo (không gồm environmental_quality)
+    DATA_TYPES = ["weather", "air", "water", "noise", "soil", "light", "heat", "radiation"]
 
     def __init__(self):
         self.weather_service = WeatherService()
@@ -25,12 +38,8 @@ class EnvironmentAggregator:
         self.heat_service = HeatService()
         self.radiation_service = RadiationService()
         
-        # AI Service for environmental quality assessment
-        try:
-            self.ai_service = EnvironmentalAIService()
-        except ValueError as e:
-            print(f"Warning: AI Service không khởi tạo được: {e}")
-            self.ai_service = None
+        # AI Service for environmental quality assessment (None khi thiếu OPENAI_API_KEY)
+        self.ai_service = environmental_ai_service
     
     async def get_environment_data(
         self,
@@ -38,7 +47,10 @@ class EnvironmentAggregator:
         lon: float,
         city: Optional[str] = None,
         country: Optional[str] = None,
-        include: Optional[List[str]] = None
+        include: Optional[List[str]] = None,
+        defer_ai: bool = False,
+        assessment_mode: str = "ai",
+        cache_key: Optional[Dict[str, Any]] = None
     ) -> EnvironmentResponse:
         """
         Lấy dữ liệu môi trường tổng hợp
@@ -51,6 +63,9 @@ class EnvironmentAggregator:
             include: List các loại data cần lấy (optional)
                     VD: ["weather", "air", "water"]
                     Nếu None thì lấy tất cả
+            defer_ai: Không chờ AI - đánh giá chạy nền, response có assessment_job để polling
+            assessment_mode: "ai" (LLM, tự fallback sang local khi lỗi/chậm) hoặc "local" (rule engine)
+            cache_key: city/country/lat/lon của entry cache để job nền ghi kết quả vào
         
         Returns:
             EnvironmentResponse với đầy đủ dữ liệu
@@ -59,7 +74,8 @@ class EnvironmentAggregator:
         
         # Lấy thông tin location từ geocoding nếu city/country không có
         if not city or not country:
-            location_info = await geocoding_service.get_location_info(lat, lon)
+            with span("geocode", "Nominatim reverse"):
+                location_info = await geocoding_service.get_location_info(lat, lon)
             city = city or location_info.get('city')
             country = country or location_info.get('country')
         
@@ -68,56 +84,64 @@ class EnvironmentAggregator:
         # Weather - Gọi đầu tiên vì các service khác có thể cần data này
         weather_data = None
         if include is None or "weather" in include:
-            weather_data = await self.weather_service.get_weather(lat, lon)
+            with span("weather", "OpenWeather"):
+                weather_data = await self.weather_service.get_weather(lat, lon)
             if weather_data:
                 sources.append("OpenWeather")
         
         # Air Quality
         air_data = None
         if include is None or "air" in include:
-            air_data = await self.air_service.get_air_quality(lat, lon)
+            with span("air", "WAQI"):
+                air_data = await self.air_service.get_air_quality(lat, lon)
             if air_data:
                 sources.append("WAQI")
         
         # Water Quality
         water_data = None
         if include is None or "water" in include:
-            water_data = await self.water_service.get_water_quality(lat, lon)
+            with span("water", "WQP"):
+                water_data = await self.water_service.get_water_quality(lat, lon)
             if water_data:
                 sources.append("Water Quality Monitoring")
         
         # Noise
         noise_data = None
         if include is None or "noise" in include:
-            noise_data = await self.noise_service.get_noise(lat, lon)
+            with span("noise", "Sensor.Community + Overpass"):
+                noise_data = await self.noise_service.get_noise(lat, lon)
             if noise_data:
                 sources.append("Noise Monitoring")
         
         # Soil
         soil_data = None
         if include is None or "soil" in include:
-            soil_data = await self.soil_service.get_soil(lat, lon)
+            with span("soil", "Agromonitoring + SoilGrids"):
+                soil_data = await self.soil_service.get_soil(lat, lon)
             if soil_data:
                 sources.append("Soil Monitoring")
         
         # Light
         light_data = None
         if include is None or "light" in include:
-            light_data = await self.light_service.get_light(lat, lon)
+            with span("light", "Solar calculation"):
+                light_data = await self.light_service.get_light(lat, lon)
             if light_data:
                 sources.append("Solar Calculation")
         
         # Heat (cần weather_data)
         heat_data = None
         if include is None or "heat" in include:
-            heat_data = await self.heat_service.get_heat(lat, lon, weather_data)
+            with span("heat", "Heat index"):
+                heat_data = await self.heat_service.get_heat(lat, lon, weather_data)
             if heat_data:
                 sources.append("Heat Index Calculation")
         
         # Radiation
         radiation_data = None
         if include is None or "radiation" in include:
-            radiation_data = await self.radiation_service.get_radiation(lat, lon)
+            with span("radiation", "Safecast"):
+                radiation_data = await self.radiation_service.get_radiation(lat, lon)
             if radiation_data:
                 sources.append("Radiation Monitoring")
         
@@ -136,34 +160,117 @@ class EnvironmentAggregator:
             sources=list(set(sources)) 
         )
         
+        # Ghi nhận điểm đo cho map tiles
+        tile_service.record(lat, lon, response.dict(include={"air", "heat", "noise", "radiation"}))
+        
+        # Lưu lịch sử reading (chỉ vào buffer, ghi Mongo ở task nền)
+        for data_type in self.DATA_TYPES:
+            history_service.record(lat, lon, data_type, getattr(response, data_type))
+        
         # AI Analysis for Environmental Quality
-        if self.ai_service and (include is None or "environmental_quality" in include):
-            try:
-                location_dict = {
-                    "lat": lat,
-                    "lon": lon, 
-                    "city": city,
-                    "country": country
-                }
-                
-                env_dict = {
-                    "weather": weather_data.dict() if weather_data else None,
-                    "air": air_data.dict() if air_data else None,
-                    "water": water_data.dict() if water_data else None,
-                    "noise": noise_data.dict() if noise_data else None,
-                    "soil": soil_data.dict() if soil_data else None,
-                    "radiation": radiation_data.dict() if radiation_data else None
-                }
-                
-                # Gọi AI để phân tích
-                ai_assessment = await self.ai_service.analyze_environment(location_dict, env_dict)
-                response.environmental_quality = ai_assessment
-                
-                sources.append("OpenAI GPT-4")
-                
-            except Exception as e:
-                print(f"AI analysis failed: {e}")
-                # Không add AI assessment nếu lỗi
+        if include is None or "environmental_quality" in include:
+            location_dict = {
+                "lat": lat,
+                "lon": lon, 
+                "city": city,
+                "country": country,
+                "observed_at": response.time
+            }
+            
+            env_dict = {
+                "weather": weather_data.dict() if weather_data else None,
+                "air": air_data.dict() if air_data else None,
+                "water": water_data.dict() if water_data else None,
+                "noise": noise_data.dict() if noise_data else None,
+                "soil": soil_data.dict() if soil_data else None,
+                "radiation": radiation_data.dict() if radiation_data else None
+            }
+            
+            if assessment_mode == "local" or not self.ai_service:
+                # Local rule engine: không gọi mạng, vài micro giây
+                with span("ai", "Rule engine"):
+                    response.environmental_quality = rule_assessment_service.assess(location_dict, env_dict)
+                sources.append(rule_assessment_service.SOURCE)
+            else:
+                try:
+                    ai_service = self.ai_service
+                    job = None
+                    if defer_ai:
+                        try:
+                            job = await assessment_job_service.submit(
+                                lambda: ai_service.analyze_environment(location_dict, env_dict),
+                                cache_key=cache_key
+                            )
+                        except asyncio.QueueFull:
+                            logger.warning("AI job queue full, running analysis inline")
+                    
+                    if job:
+                        response.assessment_job = AssessmentJobRef(
+                            job_id=job.job_id,
+                            status=job.status,
+                            url=f"{settings.API_V1_PREFIX}/environment/assessment/{job.job_id}"
+                        )
+                    else:
+                        # Gọi AI để phân tích
+                        with span("ai", "OpenAI"):
+                            ai_assessment = await ai_service.analyze_environment(location_dict, env_dict)
+                        response.environmental_quality = ai_assessment
+                        # AI lỗi / timeout -> analyze_environment trả đánh giá của rule engine
+                        sources.append(EnvironmentalAIService.assessment_source(ai_assessment))
+                    
+                except Exception as e:
+                    logger.error(f"AI analysis failed: {e}")
+                    # Không add AI assessment nếu lỗi
         
         response.sources = list(set(sources))
-        return response
\ No newline at end of file
+        return response
+    
+    async def get_environment_batch(
+        self,
+        locations: List[BatchLocation],
+        assessment_mode: str = "ai"
+    ) -> Dict[str, EnvironmentResponse]:
+        """
+        Lấy dữ liệu cho nhiều vị trí, đánh giá AI gộp theo batch
+        (một LLM call cho nhiều vị trí thay vì mỗi vị trí một call)
+        
+        Returns:
+            Dict location id -> EnvironmentResponse
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.BATCH_FETCH_CONCURRENCY))
+        
+        async def fetch(location: BatchLocation) -> EnvironmentResponse:
+            async with semaphore:
+                return await self.get_environment_data(
+                    location.lat, location.lon, location.city, location.country,
+                    include=self.DATA_TYPES
+                )
+        
+        responses = await asyncio.gather(*(fetch(location) for location in locations))
+        results = {location.id: response for location, response in zip(locations, responses)}
+        
+        items = []
+        for location_id, response in results.items():
+            env_dict = {
+                key: getattr(response, key).dict() if getattr(response, key) else None
+                for key in ["weather", "air", "water", "noise", "soil", "radiation"]
+            }
+            items.append((location_id, {**response.location.dict(), "observed_at": response.time}, env_dict))
+        
+        if assessment_mode == "local" or not self.ai_service:
+            assessments = {
+                location_id: rule_assessment_service.assess(location_dict, env_dict)
+                for location_id, location_dict, env_dict in items
+            }
+        else:
+            with span("ai", "OpenAI batch"):
+                assessments = await self.ai_service.analyze_batch(items)
+        
+        for location_id, response in results.items():
+            assessment = assessments.get(location_id)
+            response.environmental_quality = assessment
+            if assessment:
+                # Vị trí AI không trả về / lỗi được chấm bằng rule engine
+                response.sources = list(set(response.sources + [EnvironmentalAIService.assessment_source(assessment)]))
+        
+        return results
@@ -1,12 +1,15 @@
+import logging
 import httpx
 from typing import Optional
 from app.models import AirQualityData
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 class AirQualityService:
     def __init__(self):
         self.api_key = settings.WAQI_API_KEY
-        self.base_url = "https://api.waqi.info"
+        self.base_url = settings.WAQI_BASE_URL
     
     async def get_air_quality(self, lat: float, lon: float) -> Optional[AirQualityData]:
         """Lấy chất lượng không khí từ WAQI API"""
@@ -37,7 +40,7 @@ class AirQualityService:
                         quality_level=self._get_quality_level(aqi)
                     )
         except Exception as e:
-            print(f"Air Quality API error: {e}")
+            logger.warning(f"Air Quality API error: {e}")
         
         return None
     
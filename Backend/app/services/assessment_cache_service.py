@@ -0,0 +1,93 @@
+from typing import Optional, Dict, Any
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from app.services.database import db_service
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AssessmentCacheService:
+    """
+    Cache đánh giá AI theo fingerprint của dữ liệu đầu vào (đã lượng tử hoá)
+
+    - L1: LRU trong bộ nhớ process
+    - L2: MongoDB (nếu có kết nối), dùng chung giữa các lần restart
+    """
+    COLLECTION_NAME = "ai_assessments"
+
+    def __init__(self):
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Lấy đánh giá đã cache theo fingerprint"""
+        if not settings.AI_CACHE_ENABLED:
+            return None
+
+        entry = self._memory.get(fingerprint)
+        if entry:
+            assessment, expires_at = entry
+            if expires_at > datetime.utcnow():
+                self._memory.move_to_end(fingerprint)
+                self.hits += 1
+                return assessment
+            del self._memory[fingerprint]
+
+        if db_service.is_connected():
+            try:
+                collection = db_service.get_database()[self.COLLECTION_NAME]
+                result = await collection.find_one({
+                    "_id": fingerprint,
+                    "expires_at": {"$gt": datetime.utcnow()}
+                })
+                if result:
+                    self._remember(fingerprint, result["assessment"], result["expires_at"])
+                    self.hits += 1
+                    return result["assessment"]
+            except Exception as e:
+                logger.error(f"Error reading AI assessment cache: {e}")
+
+        self.misses += 1
+        return None
+
+    async def save(self, fingerprint: str, assessment: Dict[str, Any]) -> None:
+        """Lưu đánh giá theo fingerprint"""
+        if not settings.AI_CACHE_ENABLED:
+            return
+
+        expires_at = datetime.utcnow() + timedelta(seconds=settings.AI_CACHE_TTL)
+        self._remember(fingerprint, assessment, expires_at)
+
+        if db_service.is_connected():
+            try:
+                collection = db_service.get_database()[self.COLLECTION_NAME]
+                await collection.replace_one(
+                    {"_id": fingerprint},
+                    {
+                        "_id": fingerprint,
+                        "assessment": assessment,
+                        "created_at": datetime.utcnow(),
+                        "expires_at": expires_at
+                    },
+                    upsert=True
+                )
+            except Exception as e:
+                logger.error(f"Error saving AI assessment cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def _remember(self, fingerprint: str, assessment: Dict[str, Any], expires_at: datetime) -> None:
+        self._memory[fingerprint] = (assessment, expires_at)
+        self._memory.move_to_end(fingerprint)
+        while len(self._memory) > settings.AI_CACHE_MAX_ENTRIES:
+            self._memory.popitem(last=False)
+
+# Global instance
+assessment_cache_service = AssessmentCacheService()
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.core.config import settings
+from app.core.offload import json_loads
+from app.models import AssessmentJobStatus, EnvironmentalQuality
+from app.services.cache_service import cache_service
+from app.services.environmental_ai_service import EnvironmentalAIService
+from app.services.shared_cache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+
+class AssessmentJob:
+    def __init__(self, analyze: Callable[[], Awaitable[EnvironmentalQuality]],
+                 cache_key: Optional[Dict[str, Any]] = None):
+        self.job_id = uuid.uuid4().hex
+        self.analyze = analyze
+        self.cache_key = cache_key  # city/country/lat/lon của entry cache cần cập nhật
+        self.status = "pending"
+        self.result: Optional[EnvironmentalQuality] = None
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+
+    def to_status(self) -> AssessmentJobStatus:
+        return AssessmentJobStatus(
+            job_id=self.job_id,
+            status=self.status,
+            environmental_quality=self.result,
+            error=self.error
+        )
+
+
+class AssessmentJobService:
+    """
+    Hàng đợi chạy đánh giá AI ở nền
+
+    - Số worker cố định (AI_JOB_WORKERS) -> giới hạn số LLM call đồng thời
+    - Trạng thái / kết quả job ghi vào shared cache (key theo job_id, TTL AI_JOB_RESULT_TTL) để
+      worker nào nhận request polling cũng đọc được; nhiều worker cần SHARED_CACHE_URL (redis),
+      backend memory chỉ thấy job của chính process
+    - Khi xong, ghi đánh giá ngược vào document cache tương ứng
+    """
+
+    KEY_PREFIX = "assessment_job:"
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: Dict[str, AssessmentJob] = {}
+
+    def start(self):
+        """Khởi động worker pool (gọi lúc startup, hoặc tự động ở lần submit đầu)"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.AI_JOB_QUEUE_SIZE)
+        self._workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(max(1, settings.AI_JOB_WORKERS))
+        ]
+        logger.info(f"Started {len(self._workers)} AI assessment workers")
+
+    async def stop(self):
+        """Dừng worker pool khi shutdown"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    async def submit(self, analyze: Callable[[], Awaitable[EnvironmentalQuality]],
+               cache_key: Optional[Dict[str, Any]] = None) -> AssessmentJob:
+        """
+        Đưa job vào hàng đợi
+
+        Raises:
+            asyncio.QueueFull: hàng đợi đầy, caller nên chạy đánh giá trực tiếp
+        """
+        self.start()
+        self._evict_finished()
+        job = AssessmentJob(analyze, cache_key)
+        self._queue.put_nowait(job)
+        self._jobs[job.job_id] = job
+        await self._publish(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[AssessmentJob]:
+        """Job của process này (chỉ còn giữ tới khi hết TTL)"""
+        return self._jobs.get(job_id)
+
+    async def get_status(self, job_id: str) -> Optional[AssessmentJobStatus]:
+        """Trạng thái job, kể cả job do worker khác chạy (đọc từ shared cache)"""
+        job = self._jobs.get(job_id)
+        if job:
+            return job.to_status()
+        raw = await shared_cache.get(self.KEY_PREFIX + job_id)
+        if raw is None:
+            return None
+        return AssessmentJobStatus(**json_loads(raw))
+
+    async def _publish(self, job: AssessmentJob):
+        await shared_cache.set(
+            self.KEY_PREFIX + job.job_id,
+            job.to_status().json().encode(),
+            settings.AI_JOB_RESULT_TTL
+        )
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                job.status = "running"
+                await self._publish(job)
+                job.result = await job.analyze()
+                job.status = "done"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"AI assessment job {job.job_id} failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.monotonic()
+                job.analyze = None
+                self._queue.task_done()
+            if job.status in ("done", "failed"):
+                await self._publish(job)
+            # Sau khi publish: attach có thể phải chờ entry cache được ghi xong (retry)
+            if job.status == "done" and job.cache_key:
+                try:
+                    await cache_service.attach_assessment(
+                        job_id=job.job_id,
+                        assessment=job.result.dict(),
+                        source=EnvironmentalAIService.assessment_source(job.result),
+                        **job.cache_key
+                    )
+                except Exception as e:
+                    logger.error(f"Error attaching AI assessment job {job.job_id}: {e}")
+
+    def _evict_finished(self):
+        cutoff = time.monotonic() - settings.AI_JOB_RESULT_TTL
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# Global instance
+assessment_job_service = AssessmentJobService()
@@ -1,15 +1,31 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
+from app.core.config import settings
+from app.core.http_cache import make_etag
 from app.services.database import db_service
+from app.services.shared_cache import shared_cache
 from app.models.cache import CachedEnvironmentData
+import asyncio
 import logging
 import hashlib
+import json
+import time
 
 logger = logging.getLogger(__name__)
 
 class CacheService:
     COLLECTION_NAME = "environment_data"
     DEFAULT_TTL = 3600  # 1 hour in seconds
+    COORDINATE_TOLERANCE = 0.01  # ~1km tolerance
+
+    # Write-behind: queued documents not yet inserted stay readable through _pending
+    _write_queue: Optional[asyncio.Queue] = None
+    _writer_task: Optional[asyncio.Task] = None
+    _pending: Dict[str, Dict[str, Any]] = {}
+    _write_stats: Dict[str, int] = {"queued": 0, "written": 0, "batches": 0, "direct": 0, "failed": 0}
+
+    # attach_assessment retries while the entry for a job may still be on its way to Mongo
+    ATTACH_RETRIES = 3
 
     @classmethod
     def _generate_cache_key(cls, city: Optional[str], country: Optional[str], 
@@ -28,40 +44,153 @@ class CacheService:
         key_string = "_".join(key_parts)
         return hashlib.md5(key_string.encode()).hexdigest()
 
+    @classmethod
+    def _build_query(cls, city: Optional[str], country: Optional[str],
+                     lat: Optional[float], lon: Optional[float],
+                     stale_seconds: int = 0) -> Optional[Dict[str, Any]]:
+        """Build Mongo query for non-expired entries (or expired less than stale_seconds ago)"""
+        # Find by coordinates or city
+        query = {}
+        if lat is not None and lon is not None:
+            # Match by coordinates with tolerance
+            tolerance = cls.COORDINATE_TOLERANCE
+            query = {
+                "lat": {"$gte": lat - tolerance, "$lte": lat + tolerance},
+                "lon": {"$gte": lon - tolerance, "$lte": lon + tolerance}
+            }
+        elif city:
+            query = {"city": city.lower()}
+            if country:
+                query["country"] = country.lower()
+        else:
+            return None
+
+        # Add expiration check
+        query["expires_at"] = {"$gt": datetime.utcnow() - timedelta(seconds=stale_seconds)}
+        return query
+
+    @staticmethod
+    def serialize(data: Dict[str, Any]) -> bytes:
+        """Serialize response data to the JSON bytes stored with the cache entry"""
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+    @classmethod
+    async def get_cached_entry(cls, city: Optional[str], country: Optional[str],
+                               lat: Optional[float], lon: Optional[float]) -> Optional[Dict[str, Any]]:
+        """
+        Get the newest non-expired entry without decoding its data
+
+        Returns a dict with _id, payload (JSON bytes), etag, created_at, expires_at
+        and data.assessment_job (set while a deferred AI assessment is pending).
+        The shared cache is used even when MongoDB is not connected.
+        """
+        pending = cls._find_pending(city, country, lat, lon)
+        if pending:
+            logger.debug("Cache hit (pending write)")
+            return pending
+
+        shared_key = cls._shared_key(city, country, lat, lon)
+        shared = await cls._get_shared(shared_key)
+        if shared:
+            logger.debug("Cache hit (shared cache)")
+            return shared
+
+        if not db_service.is_connected():
+            logger.debug("MongoDB not connected, shared cache only")
+            return None
+
+        try:
+            collection = db_service.get_database()[cls.COLLECTION_NAME]
+
+            query = cls._build_query(city, country, lat, lon)
+            if query is None:
+                return None
+
+            result = await collection.find_one(
+                query,
+                {"payload": 1, "etag": 1, "created_at": 1, "expires_at": 1, "data.assessment_job": 1},
+                sort=[("created_at", -1)]
+            )
+            if not result:
+                logger.debug(f"Cache miss for query: {query}")
+                return None
+
+            logger.debug(f"Cache hit for query: {query}")
+            if not result.get("payload"):
+                # Entry written before payloads were stored
+                full = await collection.find_one({"_id": result["_id"]}, {"data": 1})
+                if not full:
+                    return None
+                result["payload"] = cls.serialize(full["data"])
+            if not result.get("etag"):
+                result["etag"] = make_etag(result["payload"])
+            await cls._share(shared_key, result)
+            return result
+
+        except Exception as e:
+            logger.error(f"Error retrieving cached data: {e}")
+            return None
+
+    @classmethod
+    async def get_stale_entry(cls, city: Optional[str], country: Optional[str],
+                              lat: Optional[float], lon: Optional[float],
+                              max_stale_seconds: int) -> Optional[Dict[str, Any]]:
+        """
+        Get the newest entry even if it expired up to max_stale_seconds ago
+        (served when the API is overloaded; never copied to the shared cache)
+        """
+        if not db_service.is_connected():
+            return None
+
+        query = cls._build_query(city, country, lat, lon, stale_seconds=max_stale_seconds)
+        if query is None:
+            return None
+
+        try:
+            collection = db_service.get_database()[cls.COLLECTION_NAME]
+            result = await collection.find_one(
+                query,
+                {"payload": 1, "etag": 1, "created_at": 1, "expires_at": 1},
+                sort=[("created_at", -1)]
+            )
+            if not result or not result.get("payload"):
+                return None
+            if not result.get("etag"):
+                result["etag"] = make_etag(result["payload"])
+            return result
+        except Exception as e:
+            logger.error(f"Error retrieving stale cached data: {e}")
+            return None
+
     @classmethod
     async def get_cached_data(cls, city: Optional[str], country: Optional[str],
                              lat: Optional[float], lon: Optional[float]) -> Optional[Dict[str, Any]]:
         """Get cached data if exists and not expired"""
+        pending = cls._find_pending(city, country, lat, lon)
+        if pending:
+            logger.debug("Cache hit (pending write)")
+            return pending["data"]
+
+        shared = await cls._get_shared(cls._shared_key(city, country, lat, lon))
+        if shared:
+            logger.debug("Cache hit (shared cache)")
+            return json.loads(shared["payload"])
+
         if not db_service.is_connected():
-            logger.debug("MongoDB not connected, cache disabled")
+            logger.debug("MongoDB not connected, shared cache only")
             return None
 
         try:
             collection = db_service.get_database()[cls.COLLECTION_NAME]
             
-            # Find by coordinates or city
-            query = {}
-            if lat is not None and lon is not None:
-                # Match by coordinates with tolerance
-                tolerance = 0.01  # ~1km tolerance
-                query = {
-                    "lat": {"$gte": lat - tolerance, "$lte": lat + tolerance},
-                    "lon": {"$gte": lon - tolerance, "$lte": lon + tolerance}
-                }
-            elif city:
-                query = {"city": city.lower()}
-                if country:
-                    query["country"] = country.lower()
-            else:
+            query = cls._build_query(city, country, lat, lon)
+            if query is None:
                 return None
 
-            # Add expiration check
-            query["expires_at"] = {"$gt": datetime.utcnow()}
-
             result = await collection.find_one(query, sort=[("created_at", -1)])
             
             if result:
-                logger.info(f"Cache hit for query: {query}")
+                logger.debug(f"Cache hit for query: {query}")
                 return result["data"]
             else:
                 logger.debug(f"Cache miss for query: {query}")
@@ -74,35 +203,323 @@ class CacheService:
     @classmethod
     async def save_data(cls, city: Optional[str], country: Optional[str],
                        lat: Optional[float], lon: Optional[float], 
-                       data: Dict[str, Any], ttl_seconds: int = None) -> bool:
-        """Save data to cache"""
+                       data: Dict[str, Any], ttl_seconds: int = None,
+                       payload: Optional[bytes] = None) -> bool:
+        """Save data to cache (shared cache only when MongoDB is not connected)"""
+        cache_doc = cls._build_document(city, country, lat, lon, data, ttl_seconds, payload)
         if not db_service.is_connected():
-            logger.debug("MongoDB not connected, cache disabled")
-            return False
+            logger.debug("MongoDB not connected, saving to shared cache only")
+            await cls._share(cls._shared_key(city, country, lat, lon), cache_doc)
+            return True
 
         try:
             collection = db_service.get_database()[cls.COLLECTION_NAME]
-            
-            ttl = ttl_seconds or cls.DEFAULT_TTL
-            expires_at = datetime.utcnow() + timedelta(seconds=ttl)
-
-            cache_doc = CachedEnvironmentData(
-                city=city.lower() if city else None,
-                country=country.lower() if country else None,
-                lat=lat,
-                lon=lon,
-                data=data,
-                expires_at=expires_at
-            )
-
-            await collection.insert_one(cache_doc.dict(by_alias=True))
-            logger.info(f"Cached data for city={city}, lat={lat}, lon={lon}")
+            await collection.insert_one(cache_doc)
+            await cls._share(cls._shared_key(city, country, lat, lon), cache_doc)
+            logger.debug(f"Cached data for city={city}, lat={lat}, lon={lon}")
             return True
 
         except Exception as e:
             logger.error(f"Error saving cached data: {e}")
             return False
 
+    @classmethod
+    async def enqueue_save(cls, city: Optional[str], country: Optional[str],
+                           lat: Optional[float], lon: Optional[float],
+                           data: Dict[str, Any], ttl_seconds: int = None,
+                           payload: Optional[bytes] = None) -> bool:
+        """
+        Save data to cache without waiting for MongoDB (write-behind)
+
+        The document is readable via get_cached_data right away and is inserted
+        by the background writer in batches. Falls back to a direct insert when
+        the writer is not running or the queue is full (backpressure).
+        """
+        if cls._writer_task is None or not db_service.is_connected():
+            return await cls.save_data(city, country, lat, lon, data, ttl_seconds, payload)
+
+        cache_doc = cls._build_document(city, country, lat, lon, data, ttl_seconds, payload)
+        try:
+            cls._write_queue.put_nowait(cache_doc)
+        except asyncio.QueueFull:
+            logger.warning("Cache write queue full, writing directly")
+            cls._write_stats["direct"] += 1
+            return await cls._insert_batch([cache_doc])
+
+        cls._pending[cache_doc["_id"]] = cache_doc
+        cls._write_stats["queued"] += 1
+        await cls._share(cls._shared_key(city, country, lat, lon), cache_doc)
+        return True
+
+    @classmethod
+    def start_writer(cls):
+        """Start the background cache writer (call on startup after connecting to MongoDB)"""
+        if cls._writer_task or not settings.CACHE_WRITE_BEHIND or not db_service.is_connected():
+            return
+        cls._write_queue = asyncio.Queue(maxsize=settings.CACHE_WRITE_QUEUE_SIZE)
+        cls._writer_task = asyncio.create_task(cls._writer_loop())
+        logger.info("Cache write-behind writer started")
+
+    @classmethod
+    async def stop_writer(cls):
+        """Stop the writer and drain everything still queued"""
+        if cls._writer_task is None:
+            return
+        cls._writer_task.cancel()
+        await asyncio.gather(cls._writer_task, return_exceptions=True)
+        cls._writer_task = None
+
+        remaining = []
+        while not cls._write_queue.empty():
+            remaining.append(cls._write_queue.get_nowait())
+        for start in range(0, len(remaining), settings.CACHE_WRITE_BATCH_SIZE):
+            await cls._insert_batch(remaining[start:start + settings.CACHE_WRITE_BATCH_SIZE])
+        logger.info(f"Cache writer drained {len(remaining)} pending entries")
+        cls._write_queue = None
+
+    @classmethod
+    def write_stats(cls) -> Dict[str, Any]:
+        return {
+            "enabled": cls._writer_task is not None,
+            "queue_size": cls._write_queue.qsize() if cls._write_queue else 0,
+            **cls._write_stats
+        }
+
+    @classmethod
+    async def _writer_loop(cls):
+        queue = cls._write_queue
+        while True:
+            batch = []
+            try:
+                batch.append(await queue.get())
+                deadline = time.monotonic() + settings.CACHE_WRITE_FLUSH_INTERVAL
+                while len(batch) < settings.CACHE_WRITE_BATCH_SIZE:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Shutdown while collecting a batch: write what was already taken
+                if batch:
+                    await cls._insert_batch(batch)
+                raise
+            await asyncio.shield(cls._insert_batch(batch))
+
+    @classmethod
+    async def _insert_batch(cls, docs: List[Dict[str, Any]]) -> bool:
+        # Insert the latest version of each queued document (attach_assessment may have replaced it),
+        # copied so later updates to _pending never touch what is being sent
+        batch = [dict(cls._pending.get(doc["_id"], doc)) for doc in docs]
+        try:
+            collection = db_service.get_database()[cls.COLLECTION_NAME]
+            await collection.insert_many(batch, ordered=False)
+            cls._write_stats["written"] += len(docs)
+            cls._write_stats["batches"] += 1
+            logger.debug(f"Cache writer inserted {len(docs)} entries")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving {len(docs)} cached entries: {e}")
+            cls._write_stats["failed"] += len(docs)
+            return False
+        finally:
+            for doc in docs:
+                cls._pending.pop(doc["_id"], None)
+
+    @classmethod
+    def _build_document(cls, city: Optional[str], country: Optional[str],
+                        lat: Optional[float], lon: Optional[float],
+                        data: Dict[str, Any], ttl_seconds: Optional[int],
+                        payload: Optional[bytes] = None) -> Dict[str, Any]:
+        ttl = ttl_seconds or cls.DEFAULT_TTL
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+
+        cache_doc = CachedEnvironmentData(
+            city=city.lower() if city else None,
+            country=country.lower() if country else None,
+            lat=lat,
+            lon=lon,
+            data=data,
+            payload=payload or cls.serialize(data),
+            expires_at=expires_at
+        )
+        cache_doc.etag = make_etag(cache_doc.payload)
+        return cache_doc.dict(by_alias=True)
+
+    @classmethod
+    def _shared_key(cls, city: Optional[str], country: Optional[str],
+                    lat: Optional[float], lon: Optional[float]) -> Optional[str]:
+        """Shared-cache key: coordinates snapped to ~1km (like the Mongo tolerance), else city"""
+        if lat is not None and lon is not None:
+            return "env:" + cls._generate_cache_key(None, None, round(lat, 2), round(lon, 2))
+        if city:
+            return "env:" + cls._generate_cache_key(city, country, None, None)
+        return None
+
+    @classmethod
+    async def _get_shared(cls, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Non-expired entry from the shared cache (works without MongoDB)"""
+        if not key:
+            return None
+        value = await shared_cache.get(key)
+        if not value:
+            return None
+        entry = cls._decode_shared(value)
+        return entry if entry["expires_at"] > datetime.utcnow() else None
+
+    @classmethod
+    async def _attach_shared(cls, key: Optional[str], job_id: str, assessment: Dict[str, Any],
+                             source: Optional[str] = None) -> bool:
+        """Rewrite the shared-cache copy for this job with the assessment; drop a copy that cannot be rewritten"""
+        entry = await cls._get_shared(key)
+        if not entry:
+            return False
+        if (entry["data"].get("assessment_job") or {}).get("job_id") != job_id:
+            # Older header format (no job id) or another entry: let the next read repopulate it
+            if entry["data"].get("assessment_job") is True:
+                await shared_cache.delete(key)
+            return False
+        updated = cls._with_assessment({**entry, "data": json.loads(entry["payload"])}, assessment, source)
+        await cls._share(key, updated)
+        return True
+
+    @classmethod
+    async def _share(cls, key: Optional[str], entry: Dict[str, Any]):
+        """Copy an entry's payload and metadata into the shared cache for its remaining TTL"""
+        if not key:
+            return
+        ttl = (entry["expires_at"] - datetime.utcnow()).total_seconds()
+        header = json.dumps({
+            "_id": entry["_id"],
+            "etag": entry.get("etag"),
+            "created_at": entry["created_at"].timestamp(),
+            "expires_at": entry["expires_at"].timestamp(),
+            "assessment_job": (entry.get("data") or {}).get("assessment_job"),
+        }).encode()
+        await shared_cache.set(key, header + b"\n" + entry["payload"], ttl)
+
+    @staticmethod
+    def _decode_shared(value: bytes) -> Dict[str, Any]:
+        header, _, payload = value.partition(b"\n")
+        meta = json.loads(header)
+        return {
+            "_id": meta["_id"],
+            "payload": payload,
+            "etag": meta.get("etag"),
+            "created_at": datetime.utcfromtimestamp(meta["created_at"]),
+            "expires_at": datetime.utcfromtimestamp(meta["expires_at"]),
+            "data": {"assessment_job": meta.get("assessment_job")},
+        }
+
+    @classmethod
+    def _find_pending(cls, city: Optional[str], country: Optional[str],
+                      lat: Optional[float], lon: Optional[float]) -> Optional[Dict[str, Any]]:
+        """Same matching rules as _build_query, applied to documents not yet written"""
+        if not cls._pending:
+            return None
+        now = datetime.utcnow()
+        best = None
+        for doc in cls._pending.values():
+            if doc["expires_at"] <= now:
+                continue
+            if lat is not None and lon is not None:
+                if doc["lat"] is None or doc["lon"] is None:
+                    continue
+                if abs(doc["lat"] - lat) > cls.COORDINATE_TOLERANCE or abs(doc["lon"] - lon) > cls.COORDINATE_TOLERANCE:
+                    continue
+            elif city:
+                if doc["city"] != city.lower() or (country and doc["country"] != country.lower()):
+                    continue
+            else:
+                return None
+            if best is None or doc["created_at"] > best["created_at"]:
+                best = doc
+        return best
+
+    @classmethod
+    async def attach_assessment(cls, city: Optional[str], country: Optional[str],
+                                lat: Optional[float], lon: Optional[float],
+                                job_id: str, assessment: Dict[str, Any],
+                                source: Optional[str] = None, retries: Optional[int] = None) -> bool:
+        """
+        Write a finished background AI assessment back into cached entries for its job
+
+        The job can finish before its entry reaches Mongo (direct insert in flight, or a
+        batch already being sent), so when nothing matched the Mongo update is retried
+        every CACHE_WRITE_FLUSH_INTERVAL, up to ATTACH_RETRIES times.
+        """
+        updated_shared = await cls._attach_shared(cls._shared_key(city, country, lat, lon), job_id, assessment, source)
+        if not db_service.is_connected():
+            return updated_shared
+
+        # Entries still waiting in the write-behind queue: replace, never mutate in place
+        # (a batch copied before this point is caught by the Mongo retries below)
+        updated_pending = 0
+        for doc_id, doc in list(cls._pending.items()):
+            if (doc["data"].get("assessment_job") or {}).get("job_id") == job_id:
+                cls._pending[doc_id] = cls._with_assessment(doc, assessment, source)
+                updated_pending += 1
+
+        query = cls._build_query(city, country, lat, lon)
+        if query is None:
+            return False
+        query["data.assessment_job.job_id"] = job_id
+
+        retries = cls.ATTACH_RETRIES if retries is None else retries
+        for attempt in range(retries + 1):
+            if attempt:
+                await asyncio.sleep(settings.CACHE_WRITE_FLUSH_INTERVAL)
+            modified = await cls._attach_stored(query, assessment, source)
+            if modified is None:
+                return updated_pending > 0
+            if modified:
+                logger.debug(f"Attached AI assessment {job_id} to {modified} cache entries")
+                return True
+        logger.debug(f"No stored cache entry for AI assessment {job_id} ({updated_pending} pending updated)")
+        return updated_pending > 0
+
+    @classmethod
+    async def _attach_stored(cls, query: Dict[str, Any], assessment: Dict[str, Any],
+                             source: Optional[str]) -> Optional[int]:
+        """Update stored entries matching query; returns the number modified, None on error"""
+        try:
+            collection = db_service.get_database()[cls.COLLECTION_NAME]
+            # Re-serialize each entry so the stored payload matches the updated data
+            modified = 0
+            async for doc in collection.find(query, {"data": 1}):
+                updated = cls._with_assessment(doc, assessment, source)
+                result = await collection.update_one({"_id": doc["_id"]}, {"$set": {
+                    "data.environmental_quality": assessment,
+                    "data.assessment_job": None,
+                    "data.sources": updated["data"].get("sources"),
+                    "payload": updated["payload"],
+                    "etag": updated["etag"]
+                }})
+                modified += result.modified_count
+            return modified
+        except Exception as e:
+            logger.error(f"Error attaching AI assessment to cache: {e}")
+            return None
+
+    @staticmethod
+    def with_assessment(data: Dict[str, Any], assessment: Dict[str, Any],
+                        source: Optional[str] = None) -> Dict[str, Any]:
+        """Copy of response data with the assessment filled in, its source listed and the job reference cleared"""
+        updated = {**data, "environmental_quality": assessment, "assessment_job": None}
+        if source and source not in (data.get("sources") or []):
+            updated["sources"] = list(data.get("sources") or []) + [source]
+        return updated
+
+    @classmethod
+    def _with_assessment(cls, doc: Dict[str, Any], assessment: Dict[str, Any],
+                         source: Optional[str] = None) -> Dict[str, Any]:
+        """Copy of a cache document with the assessment filled in and the job reference cleared"""
+        data = cls.with_assessment(doc["data"], assessment, source)
+        payload = cls.serialize(data)
+        return {**doc, "data": data, "payload": payload, "etag": make_etag(payload)}
+
     @classmethod
     async def clear_expired_cache(cls):
         """Remove expired cache entries"""
@@ -0,0 +1,161 @@
+import bisect
+import json
+import logging
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+from app.core.config import settings
+from app.models.geocode import CitySuggestion
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CITY_FILE = Path(__file__).resolve().parent.parent / "data" / "cities.json"
+
+
+def normalize_name(name: str) -> str:
+    """Chuẩn hoá tên: lowercase, bỏ dấu (kể cả 'đ'), gộp khoảng trắng"""
+    text = name.strip().lower().replace("đ", "d")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.split())
+
+
+class CityIndex:
+    """
+    Prefix index trong bộ nhớ cho autocomplete tên thành phố
+
+    - Mảng key đã sort (tên chuẩn hoá) + bisect để tìm khoảng prefix
+    - Kết quả xếp theo dân số giảm dần
+    - Không gọi API bên ngoài
+    """
+
+    # Prefix ngắn (1-2 ký tự) khớp rất nhiều entries -> memo kết quả
+    MEMO_PREFIX_LENGTH = 2
+    # country/limit do client gửi lên -> giới hạn số key, bỏ key ít dùng nhất (LRU)
+    MEMO_MAX_ENTRIES = 1024
+
+    def __init__(self, cities: List[CitySuggestion]):
+        self.cities = cities
+        entries: List[Tuple[str, int]] = []
+        for i, city in enumerate(cities):
+            names = {normalize_name(city.name)}
+            names.update(normalize_name(alt) for alt in city.alt_names)
+            entries.extend((name, i) for name in names if name)
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._ids = [i for _, i in entries]
+        self._memo: "OrderedDict[Tuple[str, Optional[str], int], List[CitySuggestion]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+    def suggest(self, query: str, limit: int = 10, country: Optional[str] = None) -> List[CitySuggestion]:
+        """Trả về các thành phố có tên bắt đầu bằng query, ưu tiên dân số lớn"""
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+        country_key = normalize_name(country) if country else None
+
+        memo_key = (prefix, country_key, limit)
+        if len(prefix) <= self.MEMO_PREFIX_LENGTH and memo_key in self._memo:
+            self._memo.move_to_end(memo_key)
+            return self._memo[memo_key]
+
+        lo = bisect.bisect_left(self._keys, prefix)
+        hi = bisect.bisect_right(self._keys, prefix + "\uffff", lo)
+
+        matched = {self._ids[pos] for pos in range(lo, hi)}
+        candidates = [self.cities[i] for i in matched]
+        if country_key:
+            candidates = [c for c in candidates if self._matches_country(c, country_key)]
+        candidates.sort(key=lambda c: c.population or 0, reverse=True)
+        result = candidates[:limit]
+
+        if len(prefix) <= self.MEMO_PREFIX_LENGTH:
+            self._memo[memo_key] = result
+            if len(self._memo) > self.MEMO_MAX_ENTRIES:
+                self._memo.popitem(last=False)
+        return result
+
+    def lookup(self, name: str, country: Optional[str] = None) -> Optional[CitySuggestion]:
+        """Tìm thành phố khớp chính xác tên (dùng để bỏ qua forward geocoding)"""
+        key = normalize_name(name)
+        if not key:
+            return None
+        country_key = normalize_name(country) if country else None
+
+        lo = bisect.bisect_left(self._keys, key)
+        best = None
+        for pos in range(lo, len(self._keys)):
+            if self._keys[pos] != key:
+                break
+            city = self.cities[self._ids[pos]]
+            if country_key and not self._matches_country(city, country_key):
+                continue
+            if best is None or (city.population or 0) > (best.population or 0):
+                best = city
+        return best
+
+    def _matches_country(self, city: CitySuggestion, country_key: str) -> bool:
+        return country_key in (
+            normalize_name(city.country or ""),
+            normalize_name(city.country_code or ""),
+        )
+
+    @classmethod
+    def from_json(cls, path: Path) -> "CityIndex":
+        """Load danh sách thành phố dạng JSON (format của app/data/cities.json)"""
+        with open(path, encoding="utf-8") as f:
+            rows = json.load(f)
+        return cls([CitySuggestion(**row) for row in rows])
+
+    @classmethod
+    def from_geonames(cls, path: Path, min_population: int = 0) -> "CityIndex":
+        """
+        Load file GeoNames dạng TSV (cities500/1000/5000/15000.txt)
+        Cột: name=1, asciiname=2, alternatenames=3, lat=4, lon=5, country_code=8, population=14
+        """
+        cities = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) < 15:
+                    continue
+                try:
+                    population = int(cols[14] or 0)
+                    if population < min_population:
+                        continue
+                    alt_names = [cols[2]] if cols[2] and cols[2] != cols[1] else []
+                    cities.append(CitySuggestion(
+                        name=cols[1],
+                        country=cols[8],
+                        country_code=cols[8],
+                        lat=float(cols[4]),
+                        lon=float(cols[5]),
+                        population=population,
+                        alt_names=alt_names,
+                    ))
+                except ValueError:
+                    continue
+        return cls(cities)
+
+
+_city_index: Optional[CityIndex] = None
+
+
+def get_city_index() -> CityIndex:
+    """Load index một lần (lazy), dùng lại cho mọi request"""
+    global _city_index
+    if _city_index is None:
+        path = Path(settings.CITY_INDEX_PATH) if settings.CITY_INDEX_PATH else DEFAULT_CITY_FILE
+        try:
+            if path.suffix == ".json":
+                _city_index = CityIndex.from_json(path)
+            else:
+                _city_index = CityIndex.from_geonames(path)
+            logger.info(f"City index loaded: {len(_city_index)} cities from {path}")
+        except Exception as e:
+            logger.error(f"Failed to load city index from {path}: {e}")
+            _city_index = CityIndex([])
+    return _city_index
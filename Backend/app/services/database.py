@@ -1,13 +1,17 @@
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from app.core.config import settings
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 import logging
 
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+# motor / pymongo mất ~100ms để import -> chỉ import khi có MONGO_URL và kết nối lần đầu
+
 logger = logging.getLogger(__name__)
 
 class DatabaseService:
-    client: Optional[AsyncIOMotorClient] = None
-    database: Optional[AsyncIOMotorDatabase] = None
+    client: Optional["AsyncIOMotorClient"] = None
+    database: Optional["AsyncIOMotorDatabase"] = None
 
     @classmethod
     async def connect_to_mongo(cls):
@@ -17,6 +21,7 @@ class DatabaseService:
             return
             
         try:
+            from motor.motor_asyncio import AsyncIOMotorClient
             cls.client = AsyncIOMotorClient(settings.MONGO_URL)
             cls.database = cls.client.get_database("environment_cache")
             
@@ -37,7 +42,7 @@ class DatabaseService:
             logger.info("Disconnected from MongoDB")
 
     @classmethod
-    def get_database(cls) -> Optional[AsyncIOMotorDatabase]:
+    def get_database(cls) -> Optional["AsyncIOMotorDatabase"]:
         """Get database instance"""
         return cls.database
 
@@ -1,37 +1,243 @@
+import logging
 import os
+import re
 import json
-from typing import Dict, Any
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage
+import time
+import asyncio
+import hashlib
+from collections import deque
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator, TYPE_CHECKING
 from pydantic import SecretStr
 from app.core.config import settings
 from app.models.environmental_quality import EnvironmentalQuality
+from app.services.assessment_cache_service import assessment_cache_service
+from app.services.rule_assessment_service import rule_assessment_service
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+# langchain_openai / langchain_core / openai / tiktoken mất ~2s để import
+# -> chỉ import khi thật sự gọi LLM lần đầu, không import lúc khởi động app
+
+class TokenUsage:
+    """Thống kê token LLM đã dùng (chung cho mọi instance của service)"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+    
+    def record(self, message: Any) -> Optional[Dict[str, int]]:
+        """Ghi nhận usage từ AIMessage/AIMessageChunk (nếu model trả về)"""
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            prompt_tokens = usage.get("input_tokens", 0)
+            completion_tokens = usage.get("output_tokens", 0)
+        else:
+            metadata = getattr(message, "response_metadata", None) or {}
+            usage = metadata.get("token_usage")
+            if not usage:
+                return None
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+        
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.calls, 1) if self.calls else 0,
+            "avg_completion_tokens": round(self.completion_tokens / self.calls, 1) if self.calls else 0
+        }
+
+token_usage = TokenUsage()
+
+class AssessmentStreamParser:
+    """
+    Parse JSON đánh giá trong lúc token đang stream về
+    Mỗi lần feed trả về các sự kiện mới: phần summary mới, từng recommendation/concern vừa hoàn chỉnh
+    Chỉ quét phần buffer chưa đọc (lưu offset theo từng field), không quét lại từ đầu mỗi chunk
+    """
+    
+    ARRAY_FIELDS = {"recommendations": "recommendation", "concerns": "concern"}
+    
+    def __init__(self):
+        self.buffer = ""
+        # field -> vị trí bắt đầu tìm key (regex) | vị trí đang đọc giá trị | đã đọc xong giá trị
+        self._search_from = {field: 0 for field in ("summary", *self.ARRAY_FIELDS)}
+        self._pos: Dict[str, int] = {}
+        self._done: set = set()
+    
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        self.buffer += text
+        events: List[Tuple[str, Any]] = []
+        
+        summary = self._read_string_field("summary")
+        if summary:
+            events.append(("summary", summary))
+        
+        for field, event in self.ARRAY_FIELDS.items():
+            for item in self._read_array_field(field):
+                events.append((event, item))
+        
+        return events
+    
+    def _find_value(self, field: str, opener: str) -> Optional[int]:
+        """Vị trí ngay sau `"field": <opener>`; None nếu key chưa stream tới"""
+        if field in self._pos:
+            return self._pos[field]
+        pattern = re.compile(rf'"{field}"\s*:\s*{re.escape(opener)}')
+        match = pattern.search(self.buffer, self._search_from[field])
+        if not match:
+            # Key có thể đang bị cắt ở cuối buffer (`"summ`, `"summary" :`):
+            # lần sau chỉ cần tìm lại từ đoạn đuôi dài tối đa `"field"` + khoảng trắng/dấu :
+            tail = len(self.buffer)
+            while tail > self._search_from[field] and self.buffer[tail - 1] in " \t\r\n:":
+                tail -= 1
+            self._search_from[field] = max(self._search_from[field], tail - len(field) - 2)
+            return None
+        self._pos[field] = match.end()
+        return match.end()
+    
+    def _read_string_field(self, field: str) -> str:
+        """Phần chuỗi mới đọc được kể từ lần feed trước"""
+        if field in self._done:
+            return ""
+        pos = self._find_value(field, '"')
+        if pos is None:
+            return ""
+        text, end, stop = self._scan_string(pos)
+        self._pos[field] = stop
+        if end is not None:
+            self._done.add(field)
+        return text
+    
+    def _read_array_field(self, field: str) -> List[str]:
+        """Các phần tử chuỗi mới hoàn chỉnh kể từ lần feed trước"""
+        if field in self._done:
+            return []
+        pos = self._find_value(field, "[")
+        if pos is None:
+            return []
+        items = []
+        while pos < len(self.buffer):
+            ch = self.buffer[pos]
+            if ch in " \t\r\n,":
+                pos += 1
+            elif ch == '"':
+                text, end, _ = self._scan_string(pos + 1)
+                if end is None:
+                    break
+                items.append(text)
+                pos = end
+            else:
+                self._done.add(field)
+                break
+        self._pos[field] = pos
+        return items
+    
+    def _scan_string(self, pos: int) -> Tuple[str, Optional[int], int]:
+        """
+        Đọc chuỗi JSON bắt đầu từ pos (sau dấu " hoặc chỗ đã đọc dở)
+        Trả về (text, vị trí sau dấu " đóng | None nếu chưa xong, vị trí dừng - không cắt giữa escape)
+        """
+        i = pos
+        end = None
+        while i < len(self.buffer):
+            ch = self.buffer[i]
+            if ch == "\\":
+                escape_len = 6 if self.buffer[i + 1:i + 2] == "u" else 2
+                if i + escape_len > len(self.buffer):
+                    break
+                i += escape_len
+            elif ch == '"':
+                end = i + 1
+                break
+            else:
+                i += 1
+        raw = self.buffer[pos:i]
+        try:
+            return json.loads(f'"{raw}"', strict=False), end, i
+        except ValueError:
+            return raw, end, i
 
 class EnvironmentalAIService:
     """Service sử dụng OpenAI thông qua LangChain để phân tích chất lượng môi trường"""
     
+    SOURCE = "OpenAI GPT-4"
+    
+    # Độ rộng bucket khi lượng tử hoá dữ liệu đầu vào cho fingerprint
+    # Các giá trị trong cùng bucket được coi là "gần như giống nhau" -> dùng lại đánh giá
+    FINGERPRINT_BUCKETS = {
+        "temperature": 2.0,       # °C
+        "humidity": 10.0,         # %
+        "aqi": 25.0,
+        "pm25": 5.0,              # μg/m³
+        "ph": 0.5,
+        "dissolved_oxygen": 1.0,  # mg/L
+        "level_db": 5.0,          # dB
+        "moisture": 10.0,         # %
+        "radiation": 0.05,        # μSv/h
+    }
+    
+    ASSESSMENT_GUIDELINES = """Lưu ý:
+- Dựa trên WHO và EPA standards
+- AQI >100 là không tốt, >200 là nguy hiểm
+- PM2.5 >35 μg/m³ là vượt chuẩn WHO
+- pH nước nên trong khoảng 6.5-8.5
+- Tiếng ồn >55dB ngày, >40dB đêm là có hại
+- Đưa ra khuyến nghị thực tế và hữu ích"""
+    
+    # Prompt ngắn gọn (AI_PROMPT_MODE=compact): dữ liệu gửi dạng JSON tối giản
+    COMPACT_SYSTEM_PROMPT = (
+        "Chuyên gia môi trường. Đánh giá chất lượng môi trường theo WHO/EPA từ dữ liệu JSON: "
+        "loc=[city,country,lat,lon], w=[°C,độ ẩm %,mô tả], a=[AQI,PM2.5 μg/m³], wq=[pH,DO mg/L], "
+        "n=dB, s=[pH đất,độ ẩm đất %], r=μSv/h. "
+        "Ngưỡng: AQI>100 xấu, >200 nguy hiểm; PM2.5>35 vượt chuẩn; pH nước 6.5-8.5; ồn >55dB ngày, >40dB đêm. "
+        "Trả lời tiếng Việt, ngắn gọn: tối đa 3 khuyến nghị, 3 lo ngại, ai_reasoning tối đa 2 câu. Chỉ trả JSON."
+    )
+    
+    # JSON schema khớp EnvironmentalQuality (structured output của OpenAI)
+    ASSESSMENT_JSON_SCHEMA = {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {
+            "overall_rating": {"type": "string", "enum": ["excellent", "good", "moderate", "poor", "hazardous"]},
+            "score": {"type": "number"},
+            "health_risk": {"type": "string", "enum": ["low", "moderate", "high", "severe"]},
+            "summary": {"type": "string"},
+            "recommendations": {"type": "array", "items": {"type": "string"}},
+            "concerns": {"type": "array", "items": {"type": "string"}},
+            "ai_reasoning": {"type": "string"}
+        },
+        "required": [
+            "overall_rating", "score", "health_risk", "summary",
+            "recommendations", "concerns", "ai_reasoning"
+        ]
+    }
+    
     def __init__(self):
-        # Load .env file
-        load_dotenv()
-        
-        # Lấy OpenAI key từ environment
-        openai_key = os.getenv("OPENAI_API_KEY")
+        # OpenAI key từ environment / .env (settings đã đọc .env)
+        openai_key = settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY")
         if not openai_key:
             raise ValueError("Cần OPENAI_API_KEY trong environment variables (.env file)")
         
-        print(f"✓ OpenAI key loaded: {openai_key[:10]}...{openai_key[-4:]}")
+        logger.debug(f"OpenAI key loaded: ...{openai_key[-4:]}")
+        self._openai_key = openai_key
+        
+        # ChatOpenAI được tạo ở lần gọi LLM đầu tiên (xem property llm)
+        self._llm = None
         
-        # Tạo ChatOpenAI instance
-        self.llm = ChatOpenAI(
-            model='gpt-4o-mini',
-            temperature=0,
-            api_key=SecretStr(openai_key)
-        )
-        print("✓ ChatOpenAI initialized successfully")
+        # Thời điểm các LLM call trong 60s gần nhất (giới hạn AI_MAX_CALLS_PER_MINUTE)
+        self._recent_calls = deque()
     
     async def analyze_environment(self, location_data: Dict[str, Any], env_data: Dict[str, Any]) -> EnvironmentalQuality:
         """
@@ -39,8 +245,8 @@ class EnvironmentalAIService:
         """
         
         try:
-            print(f"🔍 Input data - Location: {location_data}")
-            print(f"🔍 Input data - Environment keys: {list(env_data.keys()) if env_data else 'None'}")
+            logger.debug(f"Input data - Location: {location_data}")
+            logger.debug(f"Input data - Environment keys: {list(env_data.keys()) if env_data else 'None'}")
             
             # Validate input data
             if not location_data:
@@ -48,82 +254,469 @@ class EnvironmentalAIService:
             if not env_data:
                 env_data = {}
             
+            # Dùng lại đánh giá cho điều kiện môi trường (gần như) giống nhau
+            fingerprint = self._create_fingerprint(location_data, env_data)
+            cached = await assessment_cache_service.get(fingerprint)
+            if cached:
+                logger.debug(f"AI assessment cache hit: {fingerprint[:12]}")
+                return EnvironmentalQuality(**cached)
+            
+            # Vượt ngân sách LLM -> dùng local engine
+            if not self._consume_budget():
+                logger.warning("AI budget exceeded, using rule-based assessment")
+                return self._create_fallback_assessment("LLM budget exceeded", location_data, env_data)
+            
             # Tạo prompt để AI phân tích
-            prompt = self._create_analysis_prompt(location_data, env_data)
+            messages = self._create_messages(location_data, env_data)
+            prompt_length = sum(len(str(m.content)) for m in messages)
             
             # Validate prompt
-            if not prompt or prompt.strip() == "":
+            if prompt_length == 0:
                 raise ValueError("Generated prompt is empty")
             
-            print("Sending request to OpenAI...")
-            print(f"Prompt length: {len(prompt)} characters")
-            print(f"Prompt preview: {prompt[:200]}...")
+            logger.debug("Sending request to OpenAI...")
+            logger.debug(f"Prompt length: {prompt_length} characters ({settings.AI_PROMPT_MODE} mode)")
             
             # Gọi OpenAI với validation
-            message = HumanMessage(content=prompt)
-            response = await self.llm.ainvoke([message])
+            response = await asyncio.wait_for(
+                self._assessment_llm().ainvoke(messages),
+                timeout=settings.AI_TIMEOUT
+            )
             
-            print("✓ Response received from OpenAI")
+            usage = token_usage.record(response)
+            logger.debug(f"Response received from OpenAI, token usage: {usage}")
             
             # Parse kết quả
             content = str(response.content) if hasattr(response, 'content') else str(response)
-            result = self._parse_ai_response(content)
+            result = self._try_parse_ai_response(content)
+            if result is None:
+                return EnvironmentalQuality(**self._parse_ai_response(content))
             
-            return EnvironmentalQuality(**result)
+            assessment = EnvironmentalQuality(**result)
+            await assessment_cache_service.save(fingerprint, assessment.dict())
+            return assessment
             
+        except asyncio.TimeoutError:
+            logger.warning(f"AI Analysis timeout after {settings.AI_TIMEOUT}s")
+            return self._create_fallback_assessment(f"LLM timeout after {settings.AI_TIMEOUT}s", location_data, env_data)
         except Exception as e:
-            print(f"AI Analysis Error: {str(e)}")
-            print(f"Error type: {type(e)}")
+            logger.error(f"AI Analysis Error ({type(e).__name__}): {str(e)}")
             # Fallback nếu AI lỗi
-            return self._create_fallback_assessment(str(e))
+            return self._create_fallback_assessment(str(e), location_data, env_data)
+    
+    async def stream_analysis(
+        self,
+        location_data: Dict[str, Any],
+        env_data: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Phân tích bằng AI, stream kết quả theo token
+        
+        Yields (event, data):
+            ("summary", phần text mới), ("recommendation", str), ("concern", str),
+            ("error", str) nếu LLM lỗi, cuối cùng ("assessment", dict EnvironmentalQuality)
+        """
+        location_data = location_data or {}
+        env_data = env_data or {}
+        
+        fingerprint = self._create_fingerprint(location_data, env_data)
+        cached = await assessment_cache_service.get(fingerprint)
+        if cached:
+            for event in self.assessment_events(EnvironmentalQuality(**cached)):
+                yield event
+            return
+        
+        if not self._consume_budget():
+            fallback = self._create_fallback_assessment("LLM budget exceeded", location_data, env_data)
+            for event in self.assessment_events(fallback):
+                yield event
+            return
+        
+        messages = self._create_messages(location_data, env_data)
+        parser = AssessmentStreamParser()
+        error = None
+        try:
+            stream = self._assessment_llm().astream(messages)
+        except Exception as e:
+            stream, error = None, str(e)
+        try:
+            while stream is not None:
+                # Timeout chỉ áp cho lúc chờ chunk tiếp theo (token đầu, rồi khoảng lặng giữa các chunk),
+                # không tính thời gian client đọc các event đã yield
+                try:
+                    chunk = await asyncio.wait_for(anext(stream), timeout=settings.AI_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    error = f"LLM timeout: no chunk within {settings.AI_TIMEOUT}s"
+                    break
+                except Exception as e:
+                    error = str(e)
+                    break
+                token_usage.record(chunk)
+                for event in parser.feed(str(chunk.content)):
+                    yield event
+        finally:
+            if stream is not None:
+                await stream.aclose()
+        
+        if error:
+            logger.error(f"AI Streaming Error: {error}")
+            yield ("error", error)
+            fallback = self._create_fallback_assessment(error, location_data, env_data)
+            yield ("assessment", fallback.dict())
+            return
+        
+        result = self._try_parse_ai_response(parser.buffer)
+        if result is None:
+            yield ("assessment", EnvironmentalQuality(**self._parse_ai_response(parser.buffer)).dict())
+            return
+        
+        assessment = EnvironmentalQuality(**result)
+        await assessment_cache_service.save(fingerprint, assessment.dict())
+        yield ("assessment", assessment.dict())
+    
+    @classmethod
+    def assessment_source(cls, assessment: EnvironmentalQuality) -> str:
+        """Nguồn thật của đánh giá: LLM, hay rule engine khi AI lỗi / timeout / hết ngân sách"""
+        if rule_assessment_service.is_rule_based(assessment):
+            return rule_assessment_service.SOURCE
+        return cls.SOURCE
+    
+    @staticmethod
+    def assessment_events(assessment: EnvironmentalQuality) -> List[Tuple[str, Any]]:
+        """Chuỗi sự kiện stream tương ứng với một đánh giá đã có sẵn"""
+        events: List[Tuple[str, Any]] = [("summary", assessment.summary)]
+        events += [("recommendation", item) for item in assessment.recommendations]
+        events += [("concern", item) for item in assessment.concerns]
+        events.append(("assessment", assessment.dict()))
+        return events
+    
+    async def analyze_batch(
+        self,
+        items: List[Tuple[str, Dict[str, Any], Dict[str, Any]]]
+    ) -> Dict[str, EnvironmentalQuality]:
+        """
+        Phân tích nhiều vị trí, gộp vào ít LLM call nhất có thể
+        
+        Args:
+            items: List (location_id, location_data, env_data)
+        
+        Returns:
+            Dict location_id -> EnvironmentalQuality
+            (vị trí nào AI không trả về / lỗi thì dùng local rule engine)
+        """
+        results: Dict[str, EnvironmentalQuality] = {}
+        pending: List[Tuple[str, Dict[str, Any], Dict[str, Any], str]] = []
+        
+        # Dùng lại đánh giá đã cache theo fingerprint
+        for location_id, location_data, env_data in items:
+            location_data = location_data or {}
+            env_data = env_data or {}
+            fingerprint = self._create_fingerprint(location_data, env_data)
+            cached = await assessment_cache_service.get(fingerprint)
+            if cached:
+                results[location_id] = EnvironmentalQuality(**cached)
+            else:
+                pending.append((location_id, location_data, env_data, fingerprint))
+        
+        # Chia batch theo số vị trí và độ dài prompt
+        chunks: List[List[Tuple[str, Dict[str, Any], Dict[str, Any], str]]] = []
+        chunk, chunk_chars = [], 0
+        for item in pending:
+            location_str, data_text = self._summarize_environment(item[1], item[2])
+            item_chars = len(location_str) + len(data_text)
+            if chunk and (len(chunk) >= settings.AI_BATCH_MAX_LOCATIONS
+                          or chunk_chars + item_chars > settings.AI_BATCH_MAX_PROMPT_CHARS):
+                chunks.append(chunk)
+                chunk, chunk_chars = [], 0
+            chunk.append(item)
+            chunk_chars += item_chars
+        if chunk:
+            chunks.append(chunk)
+        
+        semaphore = asyncio.Semaphore(max(1, settings.AI_BATCH_CONCURRENCY))
+        
+        async def run_chunk(chunk):
+            async with semaphore:
+                return await self._analyze_chunk(chunk)
+        
+        for chunk_results in await asyncio.gather(*(run_chunk(c) for c in chunks)):
+            results.update(chunk_results)
+        return results
+    
+    async def _analyze_chunk(
+        self,
+        chunk: List[Tuple[str, Dict[str, Any], Dict[str, Any], str]]
+    ) -> Dict[str, EnvironmentalQuality]:
+        """Một LLM call cho cả batch, map kết quả theo id"""
+        parsed: Dict[str, Dict[str, Any]] = {}
+        error = "Location missing from batch response"
+        try:
+            if not self._consume_budget():
+                raise RuntimeError("LLM budget exceeded")
+            
+            from langchain_core.messages import HumanMessage
+            prompt = self._create_batch_prompt(chunk)
+            logger.debug(f"Sending batch of {len(chunk)} locations to OpenAI, prompt length: {len(prompt)}")
+            response = await asyncio.wait_for(
+                self.llm.ainvoke([HumanMessage(content=prompt)]),
+                timeout=settings.AI_TIMEOUT * 3
+            )
+            token_usage.record(response)
+            content = str(response.content) if hasattr(response, 'content') else str(response)
+            parsed = self._parse_batch_response(content)
+        except asyncio.TimeoutError:
+            error = "LLM batch timeout"
+        except Exception as e:
+            logger.error(f"AI Batch Analysis Error: {str(e)}")
+            error = str(e)
+        
+        results = {}
+        for location_id, location_data, env_data, fingerprint in chunk:
+            result = parsed.get(str(location_id))
+            if result:
+                try:
+                    assessment = EnvironmentalQuality(**result)
+                    await assessment_cache_service.save(fingerprint, assessment.dict())
+                    results[location_id] = assessment
+                    continue
+                except Exception as e:
+                    logger.warning(f"Invalid batch result for {location_id}: {e}")
+            results[location_id] = self._create_fallback_assessment(error, location_data, env_data)
+        return results
+    
+    def _create_batch_prompt(self, chunk: List[Tuple[str, Dict[str, Any], Dict[str, Any], str]]) -> str:
+        """Prompt cho nhiều vị trí: hướng dẫn chung một lần, dữ liệu từng vị trí theo id"""
+        sections = []
+        for location_id, location_data, env_data, _ in chunk:
+            location_str, data_text = self._summarize_environment(location_data, env_data)
+            sections.append(f"[id: {location_id}]\n{location_str}\n{data_text}")
+        locations_text = "\n\n".join(sections)
+        
+        prompt = f"""
+Bạn là chuyên gia môi trường. Hãy phân tích dữ liệu môi trường của từng vị trí sau và đưa ra đánh giá chất lượng môi trường cho mỗi vị trí:
+
+{locations_text}
+
+Trả về DUY NHẤT một JSON array, mỗi phần tử ứng với một vị trí (giữ nguyên id):
+[
+    {{
+        "id": "id của vị trí",
+        "overall_rating": "excellent|good|moderate|poor|hazardous",
+        "score": [số từ 0-100],
+        "health_risk": "low|moderate|high|severe",
+        "summary": "Tóm tắt ngắn gọn về chất lượng môi trường",
+        "recommendations": ["danh sách khuyến nghị"],
+        "concerns": ["danh sách những lo ngại"],
+        "ai_reasoning": "Giải thích ngắn gọn về cách đánh giá"
+    }}
+]
+
+{self.ASSESSMENT_GUIDELINES}
+"""
+        return prompt.strip()
+    
+    def _parse_batch_response(self, ai_response: str) -> Dict[str, Dict[str, Any]]:
+        """Parse JSON array từ AI thành dict id -> kết quả"""
+        clean_response = ai_response.strip()
+        if clean_response.startswith("```json"):
+            clean_response = clean_response[7:]
+        if clean_response.endswith("```"):
+            clean_response = clean_response[:-3]
+        
+        data = json.loads(clean_response.strip())
+        if isinstance(data, dict):
+            data = data.get("results") or data.get("locations") or []
+        
+        results = {}
+        for item in data:
+            if isinstance(item, dict) and "id" in item:
+                location_id = str(item.pop("id"))
+                item.setdefault("summary", "Đánh giá môi trường bằng AI")
+                item.setdefault("recommendations", [])
+                item.setdefault("concerns", [])
+                item.setdefault("ai_reasoning", "Phân tích dựa trên dữ liệu môi trường")
+                results[location_id] = item
+        return results
+    
+    @property
+    def llm(self):
+        """ChatOpenAI, import langchain_openai và khởi tạo ở lần dùng đầu tiên"""
+        if self._llm is None:
+            from langchain_openai import ChatOpenAI
+            self._llm = ChatOpenAI(
+                model='gpt-4o-mini',
+                temperature=0,
+                api_key=SecretStr(self._openai_key),
+                base_url=settings.OPENAI_BASE_URL
+            )
+            logger.debug("ChatOpenAI initialized successfully")
+        return self._llm
+    
+    @llm.setter
+    def llm(self, value):
+        self._llm = value
+    
+    def _assessment_llm(self):
+        """LLM cho một đánh giá: ràng buộc output theo JSON schema nếu bật AI_STRUCTURED_OUTPUT"""
+        if not settings.AI_STRUCTURED_OUTPUT:
+            return self.llm
+        return self.llm.bind(response_format={
+            "type": "json_schema",
+            "json_schema": {
+                "name": "environmental_quality",
+                "strict": True,
+                "schema": self.ASSESSMENT_JSON_SCHEMA
+            }
+        })
+    
+    def _create_messages(self, location_data: Dict[str, Any], env_data: Dict[str, Any]) -> List["BaseMessage"]:
+        """Messages gửi cho LLM theo AI_PROMPT_MODE (compact | verbose)"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+        if settings.AI_PROMPT_MODE == "compact":
+            return [
+                SystemMessage(content=self.COMPACT_SYSTEM_PROMPT),
+                HumanMessage(content=self._create_compact_payload(location_data, env_data))
+            ]
+        return [HumanMessage(content=self._create_analysis_prompt(location_data, env_data))]
+    
+    def _create_compact_payload(self, location_data: Dict[str, Any], env_data: Dict[str, Any]) -> str:
+        """Dữ liệu đo dạng JSON tối giản (key ngắn, bỏ trường rỗng)"""
+        def section(key: str) -> Dict[str, Any]:
+            return (env_data or {}).get(key) or {}
+        
+        def values(*items: Any) -> Optional[List[Any]]:
+            return list(items) if any(item is not None for item in items) else None
+        
+        weather, air, water = section('weather'), section('air'), section('water')
+        noise, soil, radiation = section('noise'), section('soil'), section('radiation')
+        
+        payload = {
+            "loc": [location_data.get('city'), location_data.get('country'),
+                    round(location_data.get('lat') or 0, 3), round(location_data.get('lon') or 0, 3)],
+            "w": values(weather.get('temperature'), weather.get('humidity'), weather.get('description')),
+            "a": values(air.get('aqi'), air.get('pm25')),
+            "wq": values(water.get('ph'), water.get('dissolved_oxygen')),
+            "n": noise.get('level', noise.get('level_db')),
+            "s": values(soil.get('ph'), soil.get('moisture')),
+            "r": radiation.get('level'),
+        }
+        payload = {key: value for key, value in payload.items() if value is not None}
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    
+    def _consume_budget(self) -> bool:
+        """Ghi nhận một LLM call, trả về False nếu vượt AI_MAX_CALLS_PER_MINUTE (0 = không giới hạn)"""
+        limit = settings.AI_MAX_CALLS_PER_MINUTE
+        if limit <= 0:
+            return True
+        now = time.monotonic()
+        while self._recent_calls and now - self._recent_calls[0] > 60:
+            self._recent_calls.popleft()
+        if len(self._recent_calls) >= limit:
+            return False
+        self._recent_calls.append(now)
+        return True
+    
+    def _create_fingerprint(self, location_data: Dict[str, Any], env_data: Dict[str, Any]) -> str:
+        """
+        Fingerprint của đúng những dữ liệu mà _create_analysis_prompt đưa vào prompt,
+        sau khi lượng tử hoá theo FINGERPRINT_BUCKETS
+        """
+        def bucket(value: Any, name: str) -> Optional[float]:
+            if not isinstance(value, (int, float)):
+                return None
+            width = self.FINGERPRINT_BUCKETS[name]
+            return round(round(value / width) * width, 3)
+        
+        def section(key: str) -> Dict[str, Any]:
+            return (env_data or {}).get(key) or {}
+        
+        city = location_data.get('city')
+        country = location_data.get('country')
+        if city:
+            location_key = [str(city).lower(), str(country or '').lower()]
+        else:
+            # Không có tên -> gom theo ô lưới ~10km
+            location_key = [round(location_data.get('lat') or 0, 1), round(location_data.get('lon') or 0, 1)]
+        
+        weather, air, water = section('weather'), section('air'), section('water')
+        noise, soil, radiation = section('noise'), section('soil'), section('radiation')
+        
+        payload = {
+            "location": location_key,
+            "weather": [bucket(weather.get('temperature'), "temperature"),
+                        bucket(weather.get('humidity'), "humidity"),
+                        weather.get('description')] if weather else None,
+            "air": [bucket(air.get('aqi'), "aqi"),
+                    bucket(air.get('pm25'), "pm25"),
+                    air.get('quality_level')] if air else None,
+            "water": [bucket(water.get('ph'), "ph"),
+                      bucket(water.get('dissolved_oxygen'), "dissolved_oxygen"),
+                      water.get('quality_level')] if water else None,
+            "noise": [bucket(noise.get('level', noise.get('level_db')), "level_db"),
+                      noise.get('quality_level')] if noise else None,
+            "soil": [bucket(soil.get('ph'), "ph"),
+                     bucket(soil.get('moisture'), "moisture")] if soil else None,
+            "radiation": [bucket(radiation.get('level'), "radiation"),
+                          radiation.get('quality_level')] if radiation else None,
+        }
+        
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode()).hexdigest()
+    
+    def _summarize_environment(self, location_data: Dict[str, Any], env_data: Dict[str, Any]) -> Tuple[str, str]:
+        """Tóm tắt vị trí và dữ liệu môi trường thành text để đưa vào prompt"""
+        # Format location info
+        city = location_data.get('city', 'Unknown') if location_data else 'Unknown'
+        country = location_data.get('country', 'Unknown') if location_data else 'Unknown'
+        lat = location_data.get('lat', 0) if location_data else 0
+        lon = location_data.get('lon', 0) if location_data else 0
+        
+        location_str = f"Vị trí: {city}, {country} ({lat}, {lon})"
+        
+        # Format environmental data
+        data_summary = []
+        
+        # Weather data
+        if env_data and 'weather' in env_data and env_data['weather']:
+            weather = env_data['weather']
+            data_summary.append(f"Thời tiết: {weather.get('temperature', 'N/A')}°C, độ ẩm {weather.get('humidity', 'N/A')}%, {weather.get('description', 'N/A')}")
+        
+        # Air quality data
+        if env_data and 'air' in env_data and env_data['air']:
+            air = env_data['air']
+            data_summary.append(f"Chất lượng không khí: AQI {air.get('aqi', 'N/A')}, PM2.5: {air.get('pm25', 'N/A')} μg/m³, Mức độ: {air.get('quality_level', 'N/A')}")
+        
+        # Water quality data
+        if env_data and 'water' in env_data and env_data['water']:
+            water = env_data['water']
+            data_summary.append(f"Chất lượng nước: pH {water.get('ph', 'N/A')}, DO {water.get('dissolved_oxygen', 'N/A')} mg/L, Mức độ: {water.get('quality_level', 'N/A')}")
+        
+        # Noise data
+        if env_data and 'noise' in env_data and env_data['noise']:
+            noise = env_data['noise']
+            noise_level = noise.get('level', noise.get('level_db', 'N/A'))
+            data_summary.append(f"Tiếng ồn: {noise_level} dB, Mức độ: {noise.get('quality_level', 'N/A')}")
+        
+        # Soil data
+        if env_data and 'soil' in env_data and env_data['soil']:
+            soil = env_data['soil']
+            data_summary.append(f"Đất: pH {soil.get('ph', 'N/A')}, độ ẩm {soil.get('moisture', 'N/A')}%")
+        
+        # Radiation data
+        if env_data and 'radiation' in env_data and env_data['radiation']:
+            radiation = env_data['radiation']
+            data_summary.append(f"Bức xạ: {radiation.get('level', 'N/A')} μSv/h, Mức độ: {radiation.get('quality_level', 'N/A')}")
+        
+        data_text = "\n".join(data_summary) if data_summary else "Không có dữ liệu môi trường chi tiết"
+        return location_str, data_text
     
     def _create_analysis_prompt(self, location_data: Dict[str, Any], env_data: Dict[str, Any]) -> str:
         """Tạo prompt chi tiết cho AI"""
         
         try:
-            # Format location info
-            city = location_data.get('city', 'Unknown') if location_data else 'Unknown'
-            country = location_data.get('country', 'Unknown') if location_data else 'Unknown'
-            lat = location_data.get('lat', 0) if location_data else 0
-            lon = location_data.get('lon', 0) if location_data else 0
-            
-            location_str = f"Vị trí: {city}, {country} ({lat}, {lon})"
-            
-            # Format environmental data
-            data_summary = []
-            
-            # Weather data
-            if env_data and 'weather' in env_data and env_data['weather']:
-                weather = env_data['weather']
-                data_summary.append(f"Thời tiết: {weather.get('temperature', 'N/A')}°C, độ ẩm {weather.get('humidity', 'N/A')}%, {weather.get('description', 'N/A')}")
-            
-            # Air quality data
-            if env_data and 'air' in env_data and env_data['air']:
-                air = env_data['air']
-                data_summary.append(f"Chất lượng không khí: AQI {air.get('aqi', 'N/A')}, PM2.5: {air.get('pm25', 'N/A')} μg/m³, Mức độ: {air.get('quality_level', 'N/A')}")
-            
-            # Water quality data
-            if env_data and 'water' in env_data and env_data['water']:
-                water = env_data['water']
-                data_summary.append(f"Chất lượng nước: pH {water.get('ph', 'N/A')}, DO {water.get('dissolved_oxygen', 'N/A')} mg/L, Mức độ: {water.get('quality_level', 'N/A')}")
-            
-            # Noise data
-            if env_data and 'noise' in env_data and env_data['noise']:
-                noise = env_data['noise']
-                noise_level = noise.get('level', noise.get('level_db', 'N/A'))
-                data_summary.append(f"Tiếng ồn: {noise_level} dB, Mức độ: {noise.get('quality_level', 'N/A')}")
-            
-            # Soil data
-            if env_data and 'soil' in env_data and env_data['soil']:
-                soil = env_data['soil']
-                data_summary.append(f"Đất: pH {soil.get('ph', 'N/A')}, độ ẩm {soil.get('moisture', 'N/A')}%")
-            
-            # Radiation data
-            if env_data and 'radiation' in env_data and env_data['radiation']:
-                radiation = env_data['radiation']
-                data_summary.append(f"Bức xạ: {radiation.get('level', 'N/A')} μSv/h, Mức độ: {radiation.get('quality_level', 'N/A')}")
-            
-            data_text = "\n".join(data_summary) if data_summary else "Không có dữ liệu môi trường chi tiết"
+            location_str, data_text = self._summarize_environment(location_data, env_data)
             
             # Tạo prompt hoàn chỉnh
             prompt = f"""
@@ -145,21 +738,15 @@ Hãy phân tích và trả về kết quả dưới dạng JSON với format sau
     "ai_reasoning": "Giải thích chi tiết về cách đánh giá"
 }}
 
-Lưu ý:
-- Dựa trên WHO và EPA standards
-- AQI >100 là không tốt, >200 là nguy hiểm
-- PM2.5 >35 μg/m³ là vượt chuẩn WHO
-- pH nước nên trong khoảng 6.5-8.5
-- Tiếng ồn >55dB ngày, >40dB đêm là có hại
-- Đưa ra khuyến nghị thực tế và hữu ích
+{self.ASSESSMENT_GUIDELINES}
 """
             
             result = prompt.strip()
-            print(f"✓ Prompt created successfully, length: {len(result)}")
+            logger.debug(f"Prompt created successfully, length: {len(result)}")
             return result
             
         except Exception as e:
-            print(f"Error creating prompt: {str(e)}")
+            logger.error(f"Error creating prompt: {str(e)}")
             # Trả về prompt fallback
             return f"""
 Phân tích chất lượng môi trường cho vị trí {location_data.get('city', 'Unknown') if location_data else 'Unknown'}.
@@ -176,33 +763,44 @@ Hãy trả về JSON format:
 }}
 """
     
+    def _try_parse_ai_response(self, ai_response: str) -> Optional[Dict[str, Any]]:
+        """Parse response từ AI, trả về None nếu không phải JSON hợp lệ"""
+        try:
+            return self._parse_ai_json(ai_response)
+        except Exception:
+            return None
+    
+    def _parse_ai_json(self, ai_response: str) -> Dict[str, Any]:
+        """Parse JSON từ AI response (raise nếu lỗi)"""
+        # Loại bỏ markdown nếu có
+        clean_response = ai_response.strip()
+        if clean_response.startswith("```json"):
+            clean_response = clean_response[7:]
+        if clean_response.endswith("```"):
+            clean_response = clean_response[:-3]
+        
+        # Parse JSON
+        result = json.loads(clean_response.strip())
+        
+        # Validate và set default values
+        result.setdefault("overall_rating", "moderate")
+        result.setdefault("score", 50.0)
+        result.setdefault("health_risk", "moderate")
+        result.setdefault("summary", "Đánh giá môi trường bằng AI")
+        result.setdefault("recommendations", [])
+        result.setdefault("concerns", [])
+        result.setdefault("ai_reasoning", "Phân tích dựa trên dữ liệu môi trường")
+        
+        return result
+    
     def _parse_ai_response(self, ai_response: str) -> Dict[str, Any]:
         """Parse response từ AI thành dict"""
         try:
-            # Loại bỏ markdown nếu có
-            clean_response = ai_response.strip()
-            if clean_response.startswith("```json"):
-                clean_response = clean_response[7:]
-            if clean_response.endswith("```"):
-                clean_response = clean_response[:-3]
-            
-            # Parse JSON
-            result = json.loads(clean_response.strip())
-            
-            # Validate và set default values
-            result.setdefault("overall_rating", "moderate")
-            result.setdefault("score", 50.0)
-            result.setdefault("health_risk", "moderate")
-            result.setdefault("summary", "Đánh giá môi trường bằng AI")
-            result.setdefault("recommendations", [])
-            result.setdefault("concerns", [])
-            result.setdefault("ai_reasoning", "Phân tích dựa trên dữ liệu môi trường")
-            
-            return result
+            return self._parse_ai_json(ai_response)
             
         except Exception as e:
-            print(f"Parse error: {str(e)}")
-            print(f"AI Response: {ai_response[:500]}...")
+            logger.error(f"Parse error: {str(e)}")
+            logger.debug(f"AI Response: {ai_response[:500]}...")
             # Nếu parse lỗi, trả về default
             return {
                 "overall_rating": "moderate",
@@ -214,17 +812,16 @@ Hãy trả về JSON format:
                 "ai_reasoning": f"AI response parsing error: {ai_response[:200]}..."
             }
     
-    def _create_fallback_assessment(self, error: str) -> EnvironmentalQuality:
-        """Tạo đánh giá dự phòng khi AI lỗi"""
-        return EnvironmentalQuality(
-            overall_rating="moderate",
-            score=50.0,
-            health_risk="moderate",
-            summary="Không thể kết nối AI để phân tích",
-            recommendations=["Thử lại sau", "Kiểm tra kết nối internet"],
-            concerns=["Lỗi hệ thống AI"],
-            ai_reasoning=f"Service error: {error}"
-        )
-
-# Singleton instance
-environmental_ai_service = EnvironmentalAIService()
\ No newline at end of file
+    def _create_fallback_assessment(self, error: str, location_data: Optional[Dict[str, Any]] = None,
+                                    env_data: Optional[Dict[str, Any]] = None) -> EnvironmentalQuality:
+        """Tạo đánh giá dự phòng khi AI lỗi/chậm/vượt ngân sách - dùng local rule engine"""
+        assessment = rule_assessment_service.assess(location_data or {}, env_data or {})
+        assessment.ai_reasoning = f"{assessment.ai_reasoning}. Service error: {error}"
+        return assessment
+
+# Singleton instance (None khi thiếu OPENAI_API_KEY)
+try:
+    environmental_ai_service: Optional[EnvironmentalAIService] = EnvironmentalAIService()
+except ValueError as e:
+    logger.warning(f"AI Service không khởi tạo được: {e}")
+    environmental_ai_service = None
\ No newline at end of file
@@ -1,20 +1,24 @@
-import aiohttp
+import logging
+import httpx
 from typing import Optional, Dict, Any, Tuple
-import asyncio
+from app.services.city_index import get_city_index
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
 
 class GeocodingService:
     """Service để geocoding và reverse geocoding"""
     
     def __init__(self):
-        self.nominatim_reverse_url = "https://nominatim.openstreetmap.org/reverse"
-        self.nominatim_search_url = "https://nominatim.openstreetmap.org/search"
+        self.nominatim_reverse_url = f"{settings.NOMINATIM_BASE_URL}/reverse"
+        self.nominatim_search_url = f"{settings.NOMINATIM_BASE_URL}/search"
     
     async def get_location_info(self, lat: float, lon: float) -> Dict[str, Any]:
         """Reverse geocoding: Lấy thông tin city/country từ lat/lon"""
         
         try:
             # Sử dụng Nominatim (free)
-            async with aiohttp.ClientSession() as session:
+            async with httpx.AsyncClient(timeout=10.0) as client:
                 params = {
                     'lat': lat,
                     'lon': lon,
@@ -27,22 +31,21 @@ class GeocodingService:
                     'User-Agent': 'EnvironmentOpenSource/1.0'
                 }
                 
-                print(f"📡 Calling Nominatim reverse API for ({lat}, {lon})...")
+                logger.debug(f"Calling Nominatim reverse API for ({lat}, {lon})...")
                 
-                async with session.get(
+                response = await client.get(
                     self.nominatim_reverse_url, 
                     params=params,
-                    headers=headers,
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        print(f"Geocoding success: {data.get('display_name', 'No display name')}")
-                        result = self._parse_nominatim_response(data)
-                        print(f"Parsed location: {result}")
-                        return result
-                    else:
-                        return self._get_fallback_location(lat, lon)
+                    headers=headers
+                )
+                if response.status_code == 200:
+                    data = response.json()
+                    logger.debug(f"Geocoding success: {data.get('display_name', 'No display name')}")
+                    result = self._parse_nominatim_response(data)
+                    logger.debug(f"Parsed location: {result}")
+                    return result
+                else:
+                    return self._get_fallback_location(lat, lon)
                         
         except Exception as e:
             return self._get_fallback_location(lat, lon)
@@ -50,13 +53,18 @@ class GeocodingService:
     async def get_coordinates_from_city(self, city_name: str, country: Optional[str] = None) -> Tuple[float, float]:
         """Forward geocoding: Convert city name thành lat/lon coordinates"""
         
+        # Thử prefix index trong bộ nhớ trước - khớp chính xác thì không cần gọi Nominatim
+        known_city = get_city_index().lookup(city_name, country)
+        if known_city:
+            return known_city.lat, known_city.lon
+        
         try:
             # Tạo query string
             query = city_name
             if country:
                 query += f", {country}"
             
-            async with aiohttp.ClientSession() as session:
+            async with httpx.AsyncClient(timeout=10.0) as client:
                 params = {
                     'q': query,
                     'format': 'json',
@@ -69,31 +77,30 @@ class GeocodingService:
                     'User-Agent': 'EnvironmentOpenSource/1.0'
                 }
                 
-                print(f"🔍 Searching coordinates for: {query}")
+                logger.debug(f"Searching coordinates for: {query}")
                 
-                async with session.get(
+                response = await client.get(
                     self.nominatim_search_url,
                     params=params, 
-                    headers=headers,
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data and len(data) > 0:
-                            result = data[0]
-                            lat = float(result['lat'])
-                            lon = float(result['lon'])
-                            print(f"Found coordinates: {lat}, {lon} for {query}")
-                            return lat, lon
-                        else:
-                            print(f"No results found for {query}")
-                            return self._get_fallback_coordinates(city_name)
+                    headers=headers
+                )
+                if response.status_code == 200:
+                    data = response.json()
+                    if data and len(data) > 0:
+                        result = data[0]
+                        lat = float(result['lat'])
+                        lon = float(result['lon'])
+                        logger.debug(f"Found coordinates: {lat}, {lon} for {query}")
+                        return lat, lon
                     else:
-                        print(f"API error: {response.status}")
+                        logger.info(f"No results found for {query}")
                         return self._get_fallback_coordinates(city_name)
+                else:
+                    logger.warning(f"API error: {response.status_code}")
+                    return self._get_fallback_coordinates(city_name)
                         
         except Exception as e:
-            print(f"Forward geocoding error: {str(e)}")
+            logger.warning(f"Forward geocoding error: {str(e)}")
             return self._get_fallback_coordinates(city_name)
     
     def _get_fallback_coordinates(self, city_name: str) -> Tuple[float, float]:
@@ -131,7 +138,7 @@ class GeocodingService:
                 return coords
         
         # Default coordinates (Hanoi)
-        print(f"⚠️ Using default coordinates for unknown city: {city_name}")
+        logger.warning(f"Using default coordinates for unknown city: {city_name}")
         return (21.0285, 105.8542)
     
     def _parse_nominatim_response(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -0,0 +1,66 @@
+"""
+Heat index và nhiệt độ bề mặt, vector hoá bằng NumPy
+
+Mọi hàm nhận mảng (hoặc scalar) và broadcast theo quy tắc NumPy, ví dụ:
+    temperature (P, T) và humidity (P, T) -> heat index (P, T) trong một lần tính
+Nhiệt độ đơn vị °C, độ ẩm tương đối %.
+"""
+import numpy as np
+
+# Ngưỡng cảnh báo của NWS (°C) và nhãn tương ứng
+HEAT_RISK_THRESHOLDS = np.array([26.7, 32.2, 39.4, 51.1])
+HEAT_RISK_LEVELS = ["none", "caution", "extreme_caution", "danger", "extreme_danger"]
+
+
+def heat_index(temp_c, humidity) -> np.ndarray:
+    """
+    Heat index (°C) theo thuật toán NWS
+
+    - Công thức Steadman đơn giản; nếu kết quả >= 80°F thì dùng hồi quy Rothfusz
+    - Hiệu chỉnh Rothfusz: trừ khi RH < 13% và 80-112°F, cộng khi RH > 85% và 80-87°F
+    """
+    temp_f = np.asarray(temp_c, dtype=np.float64) * 9.0 / 5.0 + 32.0
+    rh = np.clip(np.asarray(humidity, dtype=np.float64), 0.0, 100.0)
+
+    simple = 0.5 * (temp_f + 61.0 + (temp_f - 68.0) * 1.2 + rh * 0.094)
+
+    hi = (
+        -42.379 + 2.04901523 * temp_f + 10.14333127 * rh
+        - 0.22475541 * temp_f * rh
+        - 0.00683783 * temp_f * temp_f
+        - 0.05481717 * rh * rh
+        + 0.00122874 * temp_f * temp_f * rh
+        + 0.00085282 * temp_f * rh * rh
+        - 0.00000199 * temp_f * temp_f * rh * rh
+    )
+
+    dry = (rh < 13.0) & (temp_f >= 80.0) & (temp_f <= 112.0)
+    dry_term = ((13.0 - rh) / 4.0) * np.sqrt(np.clip((17.0 - np.abs(temp_f - 95.0)) / 17.0, 0.0, None))
+    hi = hi - np.where(dry, dry_term, 0.0)
+
+    humid = (rh > 85.0) & (temp_f >= 80.0) & (temp_f <= 87.0)
+    hi = hi + np.where(humid, ((rh - 85.0) / 10.0) * ((87.0 - temp_f) / 5.0), 0.0)
+
+    hi_f = np.where((simple + temp_f) / 2.0 >= 80.0, hi, simple)
+    return (hi_f - 32.0) * 5.0 / 9.0
+
+
+def surface_temperature(air_temp_c, irradiance, clouds=None) -> np.ndarray:
+    """
+    Ước tính nhiệt độ bề mặt (°C) từ nhiệt độ không khí và bức xạ mặt trời
+
+    - Ban ngày nắng gắt (~1000 W/m²) bề mặt nóng hơn không khí ~12°C, giảm theo mây (%)
+    - Ban đêm bề mặt mát hơn không khí ~2°C (bức xạ nhiệt)
+    """
+    air_temp_c = np.asarray(air_temp_c, dtype=np.float64)
+    irradiance = np.asarray(irradiance, dtype=np.float64)
+    cloud_factor = 1.0
+    if clouds is not None:
+        cloud_factor = 1.0 - 0.75 * np.clip(np.asarray(clouds, dtype=np.float64), 0.0, 100.0) / 100.0
+
+    return air_temp_c + np.where(irradiance > 0.0, 12.0 * irradiance / 1000.0 * cloud_factor, -2.0)
+
+
+def heat_risk_level(heat_index_c) -> np.ndarray:
+    """Chỉ số mức cảnh báo (0 = none ... 4 = extreme_danger), xem HEAT_RISK_LEVELS"""
+    return np.digitize(np.asarray(heat_index_c, dtype=np.float64), HEAT_RISK_THRESHOLDS)
@@ -1,14 +1,25 @@
-from typing import Optional
-from app.models import HeatData, WeatherData
+import logging
+from typing import Dict, Optional
+from datetime import datetime
+import numpy as np
+from app.models import HeatData, HeatForecast, WeatherData
+from app.services import heat_index as heat_kernel
+from app.services import solar
+from app.services.weather_service import WeatherService
+
+logger = logging.getLogger(__name__)
 
 class HeatService:
+    # OpenWeather /forecast chỉ có 5 ngày
+    MAX_FORECAST_HOURS = 120
+
     def __init__(self):
-        pass
-    
+        self.weather_service = WeatherService()
+
     async def get_heat(
-        self, 
-        lat: float, 
-        lon: float, 
+        self,
+        lat: float,
+        lon: float,
         weather_data: Optional[WeatherData]
     ) -> Optional[HeatData]:
         """
@@ -18,71 +29,119 @@ class HeatService:
         try:
             if not weather_data or weather_data.temperature is None:
                 return None
-            
+
             temp = weather_data.temperature
             humidity = weather_data.humidity or 50
-            
+
             # Tính Heat Index (cảm giác nóng)
             heat_index = self._calculate_heat_index(temp, humidity)
-            
+
             # Ước tính nhiệt độ bề mặt (surface temperature)
             # Thường cao hơn không khí 5-15°C vào ban ngày
-            surface_temp = self._estimate_surface_temperature(temp, lat, lon)
-            
+            surface_temp = self._estimate_surface_temperature(temp, lat, lon, weather_data.clouds)
+
             return HeatData(
                 temperature=temp,
                 heat_index=heat_index,
                 surface_temperature=surface_temp
             )
-            
+
+        except Exception as e:
+            logger.warning(f"Heat Service error: {e}")
+            return None
+
+    async def get_heat_forecast(self, lat: float, lon: float, hours: int = 48) -> Optional[HeatForecast]:
+        """
+        Dự báo heat index theo giờ cho `hours` giờ tới
+        Dự báo 3 giờ của OpenWeather được nội suy tuyến tính thành chuỗi từng giờ
+        """
+        forecast = await self.weather_service.get_forecast_arrays(lat, lon)
+        if not forecast:
+            return None
+
+        try:
+            forecast_seconds = forecast["times"].astype(np.float64)
+            start = np.datetime64(datetime.utcnow().replace(minute=0, second=0, microsecond=0), "s")
+            times = start + np.arange(min(hours, self.MAX_FORECAST_HOURS)) * np.timedelta64(3600, "s")
+            times = times[times <= forecast["times"][-1]]
+            if times.size == 0:
+                return None
+
+            hourly_seconds = times.astype(np.float64)
+            # Slot thiếu giá trị (NaN) bị bỏ trước khi nội suy, nếu không NaN lan ra mọi giờ
+            # (JSONResponse không encode được NaN)
+            temperature = self._interp_valid(hourly_seconds, forecast_seconds, forecast["temperature"])
+            if temperature is None:
+                return None
+            humidity = self._interp_valid(hourly_seconds, forecast_seconds, forecast["humidity"])
+            if humidity is None:
+                humidity = np.full_like(temperature, 50.0)  # Như get_heat khi thiếu độ ẩm
+            clouds = self._interp_valid(hourly_seconds, forecast_seconds, forecast["clouds"])
+
+            stress = self.compute_heat_stress(times, lat, lon, temperature, humidity, clouds)
+            if not np.isfinite(stress["heat_index"]).any():
+                return None
+            peak = int(np.nanargmax(stress["heat_index"]))
+
+            return HeatForecast(
+                lat=lat,
+                lon=lon,
+                times=[f"{t}Z" for t in times],
+                temperature=np.round(temperature, 1).tolist(),
+                humidity=np.round(humidity, 0).tolist(),
+                heat_index=np.round(stress["heat_index"], 1).tolist(),
+                surface_temperature=np.round(stress["surface_temperature"], 1).tolist(),
+                heat_risk=[heat_kernel.HEAT_RISK_LEVELS[i] for i in stress["heat_risk"]],
+                peak_heat_index=round(float(stress["heat_index"][peak]), 1),
+                peak_time=f"{times[peak]}Z"
+            )
+
         except Exception as e:
-            print(f"Heat Service error: {e}")
+            logger.warning(f"Heat forecast error: {e}")
+            return None
+
+    @staticmethod
+    def _interp_valid(x: np.ndarray, xp: np.ndarray, fp: np.ndarray) -> Optional[np.ndarray]:
+        """np.interp chỉ trên các điểm có giá trị; None nếu cả chuỗi thiếu"""
+        valid = np.isfinite(fp)
+        if not valid.any():
             return None
-    
+        return np.interp(x, xp[valid], fp[valid])
+
+    @staticmethod
+    def compute_heat_stress(times, lat, lon, temperature, humidity, clouds=None) -> Dict[str, np.ndarray]:
+        """
+        Heat index, nhiệt độ bề mặt và mức cảnh báo cho cả mảng trong một lần tính
+
+        Nhiều vị trí: lat/lon dạng (P, 1), times (T,), temperature/humidity (P, T)
+        -> mọi kết quả dạng (P, T)
+        """
+        irradiance = solar.clear_sky_irradiance(solar.solar_cos_zenith(times, lat, lon))
+        heat_index = heat_kernel.heat_index(temperature, humidity)
+        return {
+            "heat_index": heat_index,
+            "surface_temperature": heat_kernel.surface_temperature(temperature, irradiance, clouds),
+            "heat_risk": heat_kernel.heat_risk_level(heat_index),
+        }
+
     def _calculate_heat_index(self, temp_c: float, humidity: float) -> float:
         """
         Tính Heat Index (Chỉ số nóng ẩm)
-        Công thức Steadman's
+        Thuật toán NWS (Steadman + hồi quy Rothfusz có hiệu chỉnh), xem app/services/heat_index.py
         """
-        # Chỉ tính khi nhiệt độ >= 27°C
-        if temp_c < 27:
-            return temp_c
-        
-        # Chuyển sang Fahrenheit để tính
-        temp_f = temp_c * 9/5 + 32
-        
-        # Công thức Heat Index (Rothfusz regression)
-        hi = -42.379 + 2.04901523 * temp_f + 10.14333127 * humidity
-        hi -= 0.22475541 * temp_f * humidity
-        hi -= 0.00683783 * temp_f * temp_f
-        hi -= 0.05481717 * humidity * humidity
-        hi += 0.00122874 * temp_f * temp_f * humidity
-        hi += 0.00085282 * temp_f * humidity * humidity
-        hi -= 0.00000199 * temp_f * temp_f * humidity * humidity
-        
-        # Chuyển về Celsius
-        hi_c = (hi - 32) * 5/9
-        
-        return round(hi_c, 1)
-    
-    def _estimate_surface_temperature(self, air_temp: float, lat: float, lon: float) -> float:
+        return round(float(heat_kernel.heat_index(temp_c, humidity)), 1)
+
+    def _estimate_surface_temperature(self, air_temp: float, lat: float, lon: float,
+                                      clouds: Optional[float] = None) -> float:
         """
         Ước tính nhiệt độ bề mặt
-        Dựa trên nhiệt độ không khí và thời gian trong ngày
+        Dựa trên nhiệt độ không khí và bức xạ mặt trời tại thời điểm hiện tại
         """
-        from datetime import datetime
-        
-        hour = datetime.now().hour
-        
-        # Ban ngày (10AM-4PM): bề mặt nóng hơn nhiều
-        if 10 <= hour <= 16:
-            delta = 8 + (14 - hour) * 0.5  # Cao nhất vào 12-2PM
-        # Sáng sớm/chiều tối
-        elif 7 <= hour < 10 or 16 < hour <= 19:
-            delta = 3
-        # Đêm: bề mặt mát hơn không khí
-        else:
-            delta = -2
-        
-        surface_temp = air_temp + delta
-        return round(surface_temp, 1)
+        now = np.datetime64(datetime.utcnow(), "s")
+        irradiance = solar.clear_sky_irradiance(solar.solar_cos_zenith(now, lat, lon))
+        surface_temp = heat_kernel.surface_temperature(air_temp, irradiance, clouds)
+        return round(float(surface_temp), 1)
+
+
+# Singleton instance
+heat_service = HeatService()
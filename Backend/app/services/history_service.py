@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from app.core.config import settings
+from app.models import HistorySeries
+from app.services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryService:
+    """
+    Lưu lịch sử reading của từng nguồn (WeatherData, AirQualityData, ...) theo ô lưới
+
+    - record() chỉ thêm document vào buffer trong bộ nhớ (không await, không I/O trên request path)
+    - Task nền gom buffer và ghi bằng insert_many mỗi HISTORY_FLUSH_INTERVAL giây
+      hoặc ngay khi đủ HISTORY_BATCH_SIZE
+    - Collection time-series của MongoDB (metaField = cell + source), tự xoá sau HISTORY_RETENTION_DAYS
+    """
+    COLLECTION_NAME = "readings"
+
+    def __init__(self):
+        self._buffer: deque = deque(maxlen=settings.HISTORY_BUFFER_MAX)
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+
+    async def start(self):
+        """Tạo collection (nếu chưa có) và khởi động task ghi nền; gọi sau khi kết nối MongoDB"""
+        if self._task or not settings.HISTORY_ENABLED or not db_service.is_connected():
+            return
+        await self._ensure_collection()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info("History writer started")
+
+    async def stop(self):
+        """Dừng task nền và ghi nốt phần còn lại trong buffer"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def record(self, lat: float, lon: float, source: str, reading: Optional[BaseModel]) -> None:
+        """Đưa một reading vào buffer (chỉ giữ các trường số)"""
+        if reading is None or not self._task:
+            return
+        values = {
+            key: float(value) for key, value in reading.dict().items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+        if not values:
+            return
+
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append({
+            "ts": datetime.utcnow(),
+            "meta": {"cell": self.cell_key(lat, lon), "source": source},
+            "lat": lat,
+            "lon": lon,
+            "values": values
+        })
+        if len(self._buffer) >= settings.HISTORY_BATCH_SIZE:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        """Ghi toàn bộ buffer theo lô insert_many, trả về số document đã ghi"""
+        if not db_service.is_connected():
+            return 0
+
+        collection = db_service.get_database()[self.COLLECTION_NAME]
+        written = 0
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(settings.HISTORY_BATCH_SIZE, len(self._buffer)))]
+            try:
+                await collection.insert_many(batch, ordered=False)
+                written += len(batch)
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} history readings: {e}")
+                # Trả lại buffer để thử lại ở lần flush sau; buffer đã đầy lại thì bỏ reading cũ nhất
+                # (extendleft trên deque có maxlen sẽ đẩy phần mới nhất ra ở đầu phải)
+                room = self._buffer.maxlen - len(self._buffer)
+                keep = batch[len(batch) - room:] if room > 0 else []
+                self.dropped += len(batch) - len(keep)
+                self._buffer.extendleft(reversed(keep))
+                break
+        self.written += written
+        return written
+
+    async def query(self, lat: float, lon: float, source: str,
+                    start: datetime, end: datetime,
+                    limit: Optional[int] = None) -> Optional[HistorySeries]:
+        """Lịch sử của một nguồn tại ô lưới chứa (lat, lon) trong [start, end), dạng cột"""
+        if not db_service.is_connected():
+            return None
+
+        cell = self.cell_key(lat, lon)
+        limit = min(limit or settings.HISTORY_QUERY_MAX_POINTS, settings.HISTORY_QUERY_MAX_POINTS)
+        collection = db_service.get_database()[self.COLLECTION_NAME]
+        cursor = collection.find(
+            {"meta.cell": cell, "meta.source": source, "ts": {"$gte": start, "$lt": end}},
+            {"_id": 0, "ts": 1, "values": 1}
+        ).sort("ts", 1).limit(limit)
+
+        docs = await cursor.to_list(length=limit)
+        times = [doc["ts"].isoformat() + "Z" for doc in docs]
+        fields = dict.fromkeys(key for doc in docs for key in (doc.get("values") or {}))
+        values: Dict[str, List[Optional[float]]] = {
+            field: [(doc.get("values") or {}).get(field) for doc in docs]
+            for field in fields
+        }
+
+        return HistorySeries(
+            lat=lat,
+            lon=lon,
+            cell=cell,
+            source=source,
+            start=start.isoformat() + "Z",
+            end=end.isoformat() + "Z",
+            count=len(times),
+            times=times,
+            values=values
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": bool(self._task),
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped
+        }
+
+    @staticmethod
+    def cell_key(lat: float, lon: float) -> str:
+        lat_cell, lon_cell = HistoryService.cell(lat, lon)
+        return f"{lat_cell}:{lon_cell}"
+
+    @staticmethod
+    def cell(lat: float, lon: float) -> Tuple[float, float]:
+        size = settings.HISTORY_CELL_DEGREES
+        return round(round(lat / size) * size, 4), round(round(lon / size) * size, 4)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.HISTORY_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"History flush failed: {e}")
+
+    async def _ensure_collection(self):
+        database = db_service.get_database()
+        try:
+            if self.COLLECTION_NAME in await database.list_collection_names():
+                return
+            await database.create_collection(
+                self.COLLECTION_NAME,
+                timeseries={"timeField": "ts", "metaField": "meta", "granularity": "minutes"},
+                expireAfterSeconds=int(timedelta(days=settings.HISTORY_RETENTION_DAYS).total_seconds())
+            )
+            logger.info(f"Created time-series collection '{self.COLLECTION_NAME}'")
+        except Exception as e:
+            # MongoDB < 5.0 không có time-series -> collection thường + index
+            logger.warning(f"Time-series collection unavailable, using regular collection: {e}")
+            try:
+                await database[self.COLLECTION_NAME].create_index([("meta.cell", 1), ("meta.source", 1), ("ts", 1)])
+            except Exception as index_error:
+                logger.error(f"Error creating history index: {index_error}")
+
+
+# Global instance
+history_service = HistoryService()
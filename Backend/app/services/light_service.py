@@ -1,100 +1,119 @@
-import httpx
+import logging
 from typing import Optional
-from datetime import datetime, timedelta
-import math
-from app.models import LightData
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import numpy as np
+from app.models import LightData, LightSeries
+from app.services import solar
+
+logger = logging.getLogger(__name__)
 
 class LightService:
+    """
+    Thông tin ánh sáng tính từ vị trí mặt trời (thuật toán NOAA, app/services/solar.py)
+
+    - Sunrise/sunset/độ dài ngày theo tọa độ và ngày thực tế
+    - Intensity/UV là giá trị trời quang (clear-sky), chưa tính mây
+    - Giờ địa phương ước tính theo kinh độ (lon/15), không dùng múi giờ hành chính
+    """
+
+    # Kích thước ô lưới (độ) dùng làm key memo cho series
+    SERIES_CELL_DEGREES = 0.1
+
     def __init__(self):
         pass
-    
+
     async def get_light(self, lat: float, lon: float) -> Optional[LightData]:
         """
-        Lấy thông tin ánh sáng
-        Tính toán sunrise/sunset dựa trên tọa độ
+        Lấy thông tin ánh sáng tại thời điểm hiện tại
+        Sunrise/sunset trả về theo giờ địa phương ước tính (HH:MM:SS)
         """
         try:
-            # Tính sunrise/sunset
-            sunrise, sunset = self._calculate_sun_times(lat, lon)
-            
-            # Tính daylight duration
-            daylight_hours = (sunset - sunrise).total_seconds() / 3600
-            
-            # Ước tính intensity dựa trên thời gian trong ngày
-            intensity = self._estimate_light_intensity(sunrise, sunset)
-            
-            # UV index (có thể lấy từ weather API)
-            uv_index = self._estimate_uv_index(lat)
-            
+            now = datetime.utcnow()
+            offset_hours = self._utc_offset_hours(lon)
+            local_day = (now + timedelta(hours=offset_hours)).date()
+
+            sunrise, sunset, daylight_hours = solar.sun_times(np.datetime64(local_day, "D"), lat, lon)
+            cos_zenith = solar.solar_cos_zenith(np.datetime64(now, "s"), lat, lon)
+            irradiance = solar.clear_sky_irradiance(cos_zenith)
+
             return LightData(
-                intensity=intensity,
-                uv_index=uv_index,
-                sunrise=sunrise.strftime("%H:%M:%S"),
-                sunset=sunset.strftime("%H:%M:%S"),
-                daylight_duration=round(daylight_hours, 2)
+                intensity=round(float(solar.illuminance(irradiance)), 1),
+                uv_index=round(float(solar.clear_sky_uv_index(cos_zenith)), 1),
+                sunrise=self._format_minutes(sunrise + offset_hours * 60, seconds=True),
+                sunset=self._format_minutes(sunset + offset_hours * 60, seconds=True),
+                daylight_duration=round(float(daylight_hours), 2)
             )
-            
+
         except Exception as e:
-            print(f"Light Service error: {e}")
+            logger.warning(f"Light Service error: {e}")
             return None
-    
-    def _calculate_sun_times(self, lat: float, lon: float) -> tuple:
-        """
-        Tính sunrise và sunset (thuật toán đơn giản hóa)
-        Sử dụng công thức gần đúng
-        """
-        now = datetime.now()
-        
-        # Đơn giản hóa: dùng giá trị trung bình cho Việt Nam
-        # Thực tế nên dùng thư viện như ephem hoặc astral
-        if 8 <= lat <= 23:  # Việt Nam
-            sunrise = now.replace(hour=5, minute=45, second=0, microsecond=0)
-            sunset = now.replace(hour=18, minute=15, second=0, microsecond=0)
-        else:
-            # Giá trị mặc định
-            sunrise = now.replace(hour=6, minute=0, second=0, microsecond=0)
-            sunset = now.replace(hour=18, minute=0, second=0, microsecond=0)
-        
-        return sunrise, sunset
-    
-    def _estimate_light_intensity(self, sunrise: datetime, sunset: datetime) -> float:
-        """
-        Ước tính cường độ ánh sáng (lux)
-        Dựa trên thời gian trong ngày
-        """
-        now = datetime.now()
-        
-        # Nếu ban đêm: ~1 lux
-        if now < sunrise or now > sunset:
-            return 1.0
-        
-        # Ban ngày
-        # Noon: ~100,000 lux (trời nắng)
-        # Morning/Evening: ~10,000-50,000 lux
-        
-        # Tính giờ từ sunrise
-        hours_since_sunrise = (now - sunrise).total_seconds() / 3600
-        total_daylight = (sunset - sunrise).total_seconds() / 3600
-        
-        # Intensity theo dạng sin (cao nhất vào giữa trưa)
-        progress = hours_since_sunrise / total_daylight
-        intensity = 100000 * math.sin(progress * math.pi)
-        
-        return round(max(1000, intensity), 1)
-    
-    def _estimate_uv_index(self, lat: float) -> float:
+
+    def get_light_series(self, lat: float, lon: float, start: date,
+                         span: str = "day", step_minutes: int = 60) -> LightSeries:
         """
-        Ước tính UV index
-        Càng gần xích đạo UV càng cao
+        Profile ánh sáng cả ngày (span="day") hoặc cả năm từ ngày start (span="year")
+        Memo theo ô lưới SERIES_CELL_DEGREES + ngày + span + bước thời gian
         """
-        # Miền nhiệt đới (VN): UV index 6-11
-        base_uv = 10 - abs(lat) * 0.2
-        
-        # Điều chỉnh theo giờ
-        now = datetime.now()
-        if 10 <= now.hour <= 14:  # UV cao nhất 10AM-2PM
-            return round(min(11, base_uv), 1)
-        elif 8 <= now.hour <= 16:
-            return round(base_uv * 0.7, 1)
-        else:
-            return 0.0  # Tối không có UV
+        cell = self.SERIES_CELL_DEGREES
+        return _light_series(
+            round(round(lat / cell) * cell, 4),
+            round(round(lon / cell) * cell, 4),
+            start.isoformat(),
+            span,
+            step_minutes
+        )
+
+    @staticmethod
+    def _utc_offset_hours(lon: float) -> int:
+        return int(round(lon / 15.0))
+
+    @staticmethod
+    def _format_minutes(minutes, seconds: bool = False) -> Optional[str]:
+        """Phút trong ngày -> 'HH:MM' (hoặc 'HH:MM:SS'); None nếu NaN (ngày/đêm địa cực)"""
+        minutes = float(minutes)
+        if np.isnan(minutes):
+            return None
+        total_seconds = int(round(minutes * 60)) % 86400
+        hours, rest = divmod(total_seconds, 3600)
+        if seconds:
+            return f"{hours:02d}:{rest // 60:02d}:{rest % 60:02d}"
+        return f"{hours:02d}:{rest // 60:02d}"
+
+
+@lru_cache(maxsize=256)
+def _light_series(lat: float, lon: float, start: str, span: str, step_minutes: int) -> LightSeries:
+    """Tính toàn bộ chuỗi trong một lần gọi NumPy (không loop theo từng mốc thời gian)"""
+    start_day = np.datetime64(start, "D")
+    days_count = 1
+    if span == "year":
+        year = int(start[:4])
+        days_count = (date(year + 1, 1, 1) - date(year, 1, 1)).days
+
+    days = start_day + np.arange(days_count)
+    times = start_day.astype("datetime64[m]") + np.arange(0, days_count * 1440, step_minutes)
+
+    cos_zenith = solar.solar_cos_zenith(times, lat, lon)
+    irradiance = solar.clear_sky_irradiance(cos_zenith)
+    sunrise, sunset, daylight_hours = solar.sun_times(days, lat, lon)
+
+    return LightSeries(
+        lat=lat,
+        lon=lon,
+        span=span,
+        start=f"{start}T00:00:00Z",
+        step_minutes=step_minutes,
+        utc_offset_hours=LightService._utc_offset_hours(lon),
+        sun_elevation=np.round(solar.elevation_from_cos_zenith(cos_zenith), 2).tolist(),
+        irradiance=np.round(irradiance, 1).tolist(),
+        intensity=np.round(solar.illuminance(irradiance), 0).tolist(),
+        uv_index=np.round(solar.clear_sky_uv_index(cos_zenith), 1).tolist(),
+        days=[str(d) for d in days],
+        sunrise=[LightService._format_minutes(m) for m in sunrise],
+        sunset=[LightService._format_minutes(m) for m in sunset],
+        daylight_duration=np.round(daylight_hours, 2).tolist()
+    )
+
+
+# Singleton instance
+light_service = LightService()
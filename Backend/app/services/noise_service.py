@@ -1,13 +1,78 @@
+import logging
 import httpx
 import random
 from typing import Optional, Dict
 import math
 from app.models import NoiseData
+from app.core.config import settings
+from app.core.tracing import span
+from app.core.offload import run_cpu, json_loads
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE_LAT = 111.0
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Tính khoảng cách giữa 2 điểm (km) - Haversine formula"""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+    
+    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+    
+    return EARTH_RADIUS_KM * c
+
+
+def _find_nearest_noise(body: bytes, lat: float, lon: float, radius_km: float) -> Optional[float]:
+    """
+    Decode dump Sensor.Community (vài MB) và tìm sensor tiếng ồn gần nhất trong radius_km
+    Chạy trong executor (app/core/offload.py) nên phải là hàm module-level, chỉ trả về một số
+    """
+    data = json_loads(body)
+    max_delta_lat = radius_km / KM_PER_DEGREE_LAT
+    
+    nearest_noise = None
+    min_distance = float('inf')
+    
+    for sensor in data:
+        location = sensor.get("location") or {}
+        sensor_lat = location.get("latitude")
+        sensor_lon = location.get("longitude")
+        
+        if not sensor_lat or not sensor_lon:
+            continue
+        
+        try:
+            # Sensor.Community trả toạ độ dạng chuỗi
+            sensor_lat = float(sensor_lat)
+            sensor_lon = float(sensor_lon)
+        except (TypeError, ValueError):
+            continue
+        
+        # Loại nhanh sensor chắc chắn ngoài bán kính trước khi tính Haversine
+        if abs(sensor_lat - lat) > max_delta_lat:
+            continue
+        
+        distance = _haversine_km(lat, lon, sensor_lat, sensor_lon)
+        
+        if distance < radius_km and distance < min_distance:
+            # Check nếu có noise data
+            for value in sensor.get("sensordatavalues", []):
+                if value.get("value_type") in ["noise_LAeq", "noise"]:
+                    nearest_noise = float(value.get("value", 0))
+                    min_distance = distance
+                    break
+    
+    return nearest_noise
 
 class NoiseService:
     def __init__(self):
         # Sensor.Community API - crowdsourced noise data
-        self.sensor_community_url = "https://data.sensor.community/airrohr/v1"
+        self.sensor_community_url = settings.SENSOR_COMMUNITY_URL
         
         # Meersens API (có noise data nhưng cần API key trả phí)
         # self.meersens_url = "https://api.meersens.com"
@@ -25,7 +90,8 @@ class NoiseService:
         """
         try:
             # Bước 1: Thử lấy từ Sensor.Community
-            sensor_data = await self._get_sensor_community_data(lat, lon)
+            with span("noise.sensor-community", "Sensor.Community"):
+                sensor_data = await self._get_sensor_community_data(lat, lon)
             
             if sensor_data:
                 return sensor_data
@@ -34,7 +100,7 @@ class NoiseService:
             return await self._estimate_noise_intelligent(lat, lon)
             
         except Exception as e:
-            print(f"Noise Service error: {e}")
+            logger.warning(f"Noise Service error: {e}")
             return self._estimate_noise_simple(lat, lon)
     
     async def _get_sensor_community_data(self, lat: float, lon: float) -> Optional[NoiseData]:
@@ -49,35 +115,15 @@ class NoiseService:
             async with httpx.AsyncClient(timeout=15.0) as client:
                 # API endpoint để lấy sensors nearby
                 response = await client.get(
-                    "https://data.sensor.community/static/v2/data.json",
+                    f"{self.sensor_community_url}/static/v2/data.json",
                     timeout=15.0
                 )
                 
                 if response.status_code == 200:
-                    data = response.json()
-                    
-                    # Tìm sensor có noise data gần nhất
-                    nearest_noise = None
-                    min_distance = float('inf')
-                    
-                    for sensor in data:
-                        sensor_lat = sensor.get("location", {}).get("latitude")
-                        sensor_lon = sensor.get("location", {}).get("longitude")
-                        
-                        if not sensor_lat or not sensor_lon:
-                            continue
-                        
-                        # Tính khoảng cách
-                        distance = self._calculate_distance(lat, lon, sensor_lat, sensor_lon)
-                        
-                        if distance < radius_km and distance < min_distance:
-                            # Check nếu có noise data
-                            sensor_data = sensor.get("sensordatavalues", [])
-                            for value in sensor_data:
-                                if value.get("value_type") in ["noise_LAeq", "noise"]:
-                                    nearest_noise = float(value.get("value", 0))
-                                    min_distance = distance
-                                    break
+                    # Decode + quét toàn bộ sensor ngoài event loop
+                    body = response.content
+                    with span("noise.parse"):
+                        nearest_noise = await run_cpu(_find_nearest_noise, body, lat, lon, radius_km, size=len(body))
                     
                     if nearest_noise:
                         return NoiseData(
@@ -87,7 +133,7 @@ class NoiseService:
                             quality_level=self._get_quality_level(nearest_noise)
                         )
         except Exception as e:
-            print(f"Sensor.Community error: {e}")
+            logger.warning(f"Sensor.Community error: {e}")
         
         return None
     
@@ -97,7 +143,8 @@ class NoiseService:
         """
         try:
             # Lấy thông tin từ OpenStreetMap
-            osm_data = await self._get_osm_urban_data(lat, lon)
+            with span("noise.overpass", "Overpass"):
+                osm_data = await self._get_osm_urban_data(lat, lon)
             
             # Base noise level
             base_noise = 40  # dB
@@ -129,7 +176,7 @@ class NoiseService:
             )
             
         except Exception as e:
-            print(f"Intelligent estimation error: {e}")
+            logger.warning(f"Intelligent estimation error: {e}")
             return self._estimate_noise_simple(lat, lon)
     
     async def _get_osm_urban_data(self, lat: float, lon: float) -> Dict:
@@ -139,7 +186,7 @@ class NoiseService:
         """
         try:
             # Overpass API - query OSM data
-            overpass_url = "https://overpass-api.de/api/interpreter"
+            overpass_url = settings.OVERPASS_URL
             
             # Query đếm số đường và POI trong bán kính 500m
             radius = 500  # meters
@@ -178,24 +225,14 @@ class NoiseService:
                         "poi_density": poi_density
                     }
         except Exception as e:
-            print(f"OSM query error: {e}")
+            logger.warning(f"OSM query error: {e}")
         
         # Default values nếu không lấy được
         return {"road_density": 0.3, "poi_density": 0.2}
     
     def _calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Tính khoảng cách giữa 2 điểm (km) - Haversine formula"""
-        R = 6371  # Earth radius in km
-        
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lon = math.radians(lon2 - lon1)
-        
-        a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        return R * c
+        return _haversine_km(lat1, lon1, lat2, lon2)
     
     def _estimate_noise_simple(self, lat: float, lon: float) -> NoiseData:
         """Simple estimation fallback"""
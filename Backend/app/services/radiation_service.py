@@ -1,13 +1,17 @@
+import logging
 import httpx
 from typing import Optional, List, Dict
-import math
 from app.models import RadiationData
+from app.core.config import settings
+from app.core.offload import decode_json
+
+logger = logging.getLogger(__name__)
 
 class RadiationService:
     def __init__(self):
         # Safecast API - FREE, không cần API key
         # 150+ million radiation measurements, CC0 public domain
-        self.base_url = "https://api.safecast.org"
+        self.base_url = settings.SAFECAST_BASE_URL
         
         # Background radiation database (fallback)
         self.background_levels = {
@@ -43,7 +47,7 @@ class RadiationService:
             return self._estimate_background_radiation(lat, lon)
             
         except Exception as e:
-            print(f"Radiation Service error: {e}")
+            logger.warning(f"Radiation Service error: {e}")
             return self._estimate_background_radiation(lat, lon)
     
     async def _get_safecast_measurements(
@@ -75,13 +79,14 @@ class RadiationService:
                 )
                 
                 if response.status_code == 200:
-                    data = response.json()
+                    # limit=100 -> thường nhỏ, decode luôn trên loop; lớn hơn OFFLOAD_MIN_BYTES thì vào executor
+                    data = await decode_json(response.content)
                     
                     # API trả về array of measurements
                     if isinstance(data, list) and len(data) > 0:
                         return data
         except Exception as e:
-            print(f"Safecast API error: {e}")
+            logger.warning(f"Safecast API error: {e}")
         
         return []
     
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.models import HistoryRollup
+from app.services.database import db_service
+from app.services.history_service import history_service
+
+logger = logging.getLogger(__name__)
+
+# (cell, source, metric, bucket)
+RollupKey = Tuple[str, str, str, datetime]
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _floor_month(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+class RollupService:
+    """
+    Tổng hợp sẵn readings thành các collection hour / day / month
+
+    - Mỗi bucket lưu min, max, mean, count, p95 theo (cell, source, metric)
+    - Task nền chạy mỗi ROLLUP_INTERVAL giây, chỉ tính lại các bucket có reading mới:
+      hour từ readings gốc, day từ hour, month từ day
+    - p95 của day/month là percentile (theo count) của các p95 cấp dưới, là giá trị xấp xỉ
+    """
+
+    COLLECTIONS = {
+        "hour": "readings_hourly",
+        "day": "readings_daily",
+        "month": "readings_monthly",
+    }
+    # Độ dài gần đúng của mỗi bucket, dùng để ước tính số điểm khi chọn resolution
+    BUCKET_SECONDS = {"hour": 3600, "day": 86400, "month": 30 * 86400}
+    RESOLUTIONS = ("hour", "day", "month")  # Từ mịn đến thô
+    STATE_COLLECTION = "rollup_state"
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[datetime] = None
+        self.last_buckets = 0
+
+    async def start(self):
+        """Khởi động task nền (sau khi kết nối MongoDB)"""
+        if self._task or not settings.ROLLUP_ENABLED or not db_service.is_connected():
+            return
+        await self._ensure_indexes()
+        self._task = asyncio.create_task(self._loop())
+        logger.info("Rollup worker started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_once(self) -> int:
+        """Cập nhật rollup cho các reading từ watermark lần trước, trả về số bucket đã ghi"""
+        database = db_service.get_database()
+        state = database[self.STATE_COLLECTION]
+        started = datetime.utcnow()
+
+        doc = await state.find_one({"_id": "readings"})
+        if doc:
+            since = _floor_hour(doc["watermark"])
+        else:
+            since = _floor_hour(started - timedelta(hours=settings.ROLLUP_BACKFILL_HOURS))
+
+        hourly = await self._rollup_raw(since)
+        daily = await self._rollup_from(
+            "hour", "day", _floor_day, _floor_day(since), {key[:3] for key in hourly}
+        )
+        monthly = await self._rollup_from(
+            "day", "month", _floor_month, _floor_month(since), {key[:3] for key in daily}
+        )
+
+        # Reading ghi trễ (buffer của history_service) vẫn rơi vào bucket được tính lại ở lần sau
+        lag = timedelta(seconds=settings.HISTORY_FLUSH_INTERVAL * 2 + 60)
+        await state.replace_one(
+            {"_id": "readings"},
+            {"_id": "readings", "watermark": started - lag, "updated_at": started},
+            upsert=True
+        )
+
+        self.last_run = started
+        self.last_buckets = len(hourly) + len(daily) + len(monthly)
+        return self.last_buckets
+
+    async def query(self, lat: float, lon: float, source: str, metric: str,
+                    start: datetime, end: datetime,
+                    resolution: Optional[str] = None) -> Optional[HistoryRollup]:
+        """
+        Đọc rollup trong [start, end); resolution=None -> tự chọn theo ROLLUP_MAX_POINTS
+
+        resolution quá mịn so với độ dài khoảng (vượt ROLLUP_MAX_POINTS bucket) được nâng lên mức
+        tự chọn; số document đọc luôn bị giới hạn ở ROLLUP_MAX_POINTS
+        """
+        if not db_service.is_connected():
+            return None
+
+        picked = self.pick_resolution(start, end)
+        if resolution is None or self.RESOLUTIONS.index(resolution) < self.RESOLUTIONS.index(picked):
+            resolution = picked
+        cell = history_service.cell_key(lat, lon)
+        floor = {"hour": _floor_hour, "day": _floor_day, "month": _floor_month}[resolution]
+        collection = db_service.get_database()[self.COLLECTIONS[resolution]]
+        cursor = collection.find(
+            {"cell": cell, "source": source, "metric": metric, "bucket": {"$gte": floor(start), "$lt": end}},
+            {"_id": 0, "bucket": 1, "min": 1, "max": 1, "mean": 1, "p95": 1, "count": 1}
+        ).sort("bucket", 1).limit(settings.ROLLUP_MAX_POINTS)
+        docs = await cursor.to_list(length=settings.ROLLUP_MAX_POINTS)
+
+        return HistoryRollup(
+            lat=lat,
+            lon=lon,
+            cell=cell,
+            source=source,
+            metric=metric,
+            resolution=resolution,
+            start=start.isoformat() + "Z",
+            end=end.isoformat() + "Z",
+            times=[doc["bucket"].isoformat() + "Z" for doc in docs],
+            min=[doc.get("min") for doc in docs],
+            max=[doc.get("max") for doc in docs],
+            mean=[doc.get("mean") for doc in docs],
+            p95=[doc.get("p95") for doc in docs],
+            count=[doc.get("count", 0) for doc in docs]
+        )
+
+    def pick_resolution(self, start: datetime, end: datetime) -> str:
+        """Độ phân giải mịn nhất mà số bucket trong khoảng không vượt ROLLUP_MAX_POINTS"""
+        seconds = (end - start).total_seconds()
+        for resolution in ("hour", "day"):
+            if seconds / self.BUCKET_SECONDS[resolution] <= settings.ROLLUP_MAX_POINTS:
+                return resolution
+        return "month"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": bool(self._task),
+            "last_run": self.last_run.isoformat() + "Z" if self.last_run else None,
+            "last_buckets": self.last_buckets
+        }
+
+    async def _rollup_raw(self, since: datetime) -> Dict[RollupKey, Dict[str, Any]]:
+        """Bucket hour từ readings gốc (mọi reading có ts >= since)"""
+        readings = db_service.get_database()[history_service.COLLECTION_NAME]
+        samples: Dict[RollupKey, List[float]] = defaultdict(list)
+        cursor = readings.find({"ts": {"$gte": since}}, {"_id": 0, "ts": 1, "meta": 1, "values": 1})
+        async for doc in cursor:
+            meta = doc.get("meta") or {}
+            bucket = _floor_hour(doc["ts"])
+            for metric, value in (doc.get("values") or {}).items():
+                if isinstance(value, (int, float)):
+                    samples[(meta.get("cell"), meta.get("source"), metric, bucket)].append(value)
+
+        rollups = {}
+        for key, values in samples.items():
+            array = np.asarray(values, dtype=np.float64)
+            rollups[key] = {
+                "min": float(array.min()),
+                "max": float(array.max()),
+                "mean": float(array.mean()),
+                "p95": float(np.percentile(array, 95)),
+                "count": int(array.size),
+            }
+        await self._write("hour", rollups)
+        return rollups
+
+    async def _rollup_from(self, source_resolution: str, target_resolution: str, floor,
+                           since: datetime, series: Iterable[Tuple[str, str, str]]) -> Dict[RollupKey, Dict[str, Any]]:
+        """Bucket cấp trên gộp từ bucket cấp dưới của các series có thay đổi"""
+        series = set(series)
+        if not series:
+            return {}
+
+        collection = db_service.get_database()[self.COLLECTIONS[source_resolution]]
+        cells = list({cell for cell, _, _ in series})
+        children: Dict[RollupKey, List[Dict[str, Any]]] = defaultdict(list)
+        cursor = collection.find({"bucket": {"$gte": since}, "cell": {"$in": cells}}, {"_id": 0})
+        async for doc in cursor:
+            if (doc["cell"], doc["source"], doc["metric"]) not in series:
+                continue
+            children[(doc["cell"], doc["source"], doc["metric"], floor(doc["bucket"]))].append(doc)
+
+        rollups = {key: self._merge(docs) for key, docs in children.items()}
+        await self._write(target_resolution, rollups)
+        return rollups
+
+    @staticmethod
+    def _merge(docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        counts = np.array([doc["count"] for doc in docs], dtype=np.float64)
+        means = np.array([doc["mean"] for doc in docs], dtype=np.float64)
+        p95s = np.array([doc["p95"] for doc in docs], dtype=np.float64)
+
+        # Percentile có trọng số count trên các p95 cấp dưới
+        order = np.argsort(p95s)
+        cumulative = np.cumsum(counts[order])
+        position = np.searchsorted(cumulative, 0.95 * cumulative[-1])
+        return {
+            "min": float(min(doc["min"] for doc in docs)),
+            "max": float(max(doc["max"] for doc in docs)),
+            "mean": float((means * counts).sum() / counts.sum()),
+            "p95": float(p95s[order][min(position, len(order) - 1)]),
+            "count": int(counts.sum()),
+        }
+
+    async def _write(self, resolution: str, rollups: Dict[RollupKey, Dict[str, Any]]):
+        if not rollups:
+            return
+        from pymongo import ReplaceOne  # chỉ cần khi đã kết nối MongoDB (motor cũng import lúc đó)
+        operations = []
+        for (cell, source, metric, bucket), values in rollups.items():
+            doc_id = f"{cell}|{source}|{metric}|{bucket.isoformat()}"
+            operations.append(ReplaceOne(
+                {"_id": doc_id},
+                {"_id": doc_id, "cell": cell, "source": source, "metric": metric, "bucket": bucket, **values},
+                upsert=True
+            ))
+        await db_service.get_database()[self.COLLECTIONS[resolution]].bulk_write(operations, ordered=False)
+
+    async def _ensure_indexes(self):
+        database = db_service.get_database()
+        for name in self.COLLECTIONS.values():
+            try:
+                await database[name].create_index([("cell", 1), ("source", 1), ("metric", 1), ("bucket", 1)])
+            except Exception as e:
+                logger.error(f"Error creating rollup index on {name}: {e}")
+
+    async def _loop(self):
+        while True:
+            try:
+                buckets = await self.run_once()
+                logger.debug(f"Rollup updated {buckets} buckets")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Rollup failed: {e}")
+            await asyncio.sleep(settings.ROLLUP_INTERVAL)
+
+
+# Global instance
+rollup_service = RollupService()
@@ -0,0 +1,214 @@
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timezone
+from app.models.environmental_quality import EnvironmentalQuality
+
+class RuleBasedAssessmentService:
+    """
+    Đánh giá chất lượng môi trường bằng quy tắc WHO/EPA, chạy local (không gọi mạng)
+
+    Cùng ngưỡng với prompt của EnvironmentalAIService:
+    - AQI >100 là không tốt, >200 là nguy hiểm
+    - PM2.5 >35 μg/m³ là vượt chuẩn WHO
+    - pH nước nên trong khoảng 6.5-8.5
+    - Tiếng ồn >55dB ngày, >40dB đêm là có hại
+    """
+
+    SOURCE = "Rule-based Assessment"
+    REASONING_PREFIX = "Đánh giá theo quy tắc WHO/EPA"
+
+    NOISE_LIMIT_DAY = 55.0
+    NOISE_LIMIT_NIGHT = 40.0
+
+    # (ngưỡng AQI, điểm trừ)
+    AQI_PENALTIES = [(300, 70), (200, 55), (150, 40), (100, 25), (50, 10)]
+
+    def assess(self, location_data: Dict[str, Any], env_data: Dict[str, Any]) -> EnvironmentalQuality:
+        """
+        Chấm điểm 0-100 từ dữ liệu đo, trả về cùng model với đánh giá AI
+
+        Cùng input cho cùng kết quả: ngày / đêm (ngưỡng tiếng ồn) tính theo location_data["observed_at"]
+        (thời điểm đo, datetime hoặc ISO 8601 UTC), không có thì dùng ngưỡng ban ngày
+        """
+        location_data = location_data or {}
+        env_data = env_data or {}
+
+        penalties: List[Tuple[str, float]] = []
+        concerns: List[str] = []
+        recommendations: List[str] = []
+        risk = 0  # 0=low, 1=moderate, 2=high, 3=severe
+        has_data = False
+
+        air = env_data.get("air") or {}
+        aqi = self._number(air.get("aqi"))
+        pm25 = self._number(air.get("pm25"))
+        if aqi is not None:
+            has_data = True
+            for threshold, penalty in self.AQI_PENALTIES:
+                if aqi > threshold:
+                    penalties.append((f"AQI {aqi:g}", penalty))
+                    break
+            if aqi > 200:
+                risk = max(risk, 3)
+                concerns.append(f"AQI {aqi:g} ở mức nguy hiểm (>200)")
+                recommendations.append("Tránh ra ngoài, đóng cửa và dùng máy lọc không khí")
+            elif aqi > 150:
+                risk = max(risk, 2)
+                concerns.append(f"AQI {aqi:g} có hại cho sức khỏe")
+                recommendations.append("Hạn chế hoạt động ngoài trời, đeo khẩu trang N95 khi ra đường")
+            elif aqi > 100:
+                risk = max(risk, 1)
+                concerns.append(f"AQI {aqi:g} vượt ngưỡng tốt (>100)")
+                recommendations.append("Người nhạy cảm nên hạn chế hoạt động ngoài trời")
+        if pm25 is not None:
+            has_data = True
+            if pm25 > 75:
+                penalties.append((f"PM2.5 {pm25:g} μg/m³", 25))
+                risk = max(risk, 2)
+            elif pm25 > 35:
+                penalties.append((f"PM2.5 {pm25:g} μg/m³", 15))
+                risk = max(risk, 1)
+            elif pm25 > 15:
+                penalties.append((f"PM2.5 {pm25:g} μg/m³", 5))
+            if pm25 > 35:
+                concerns.append(f"PM2.5 {pm25:g} μg/m³ vượt chuẩn WHO (>35)")
+                recommendations.append("Sử dụng khẩu trang lọc bụi mịn khi ra đường")
+
+        water = env_data.get("water") or {}
+        ph = self._number(water.get("ph"))
+        dissolved_oxygen = self._number(water.get("dissolved_oxygen"))
+        if ph is not None:
+            has_data = True
+            if not 6.5 <= ph <= 8.5:
+                penalties.append((f"pH nước {ph:g}", 10))
+                risk = max(risk, 1)
+                concerns.append(f"pH nước {ph:g} nằm ngoài khoảng an toàn 6.5-8.5")
+                recommendations.append("Không dùng nước nguồn tại chỗ khi chưa qua xử lý")
+        if dissolved_oxygen is not None:
+            has_data = True
+            if dissolved_oxygen < 4:
+                penalties.append((f"DO {dissolved_oxygen:g} mg/L", 10))
+                concerns.append(f"Oxy hòa tan thấp ({dissolved_oxygen:g} mg/L)")
+            elif dissolved_oxygen < 6:
+                penalties.append((f"DO {dissolved_oxygen:g} mg/L", 5))
+
+        noise = env_data.get("noise") or {}
+        noise_level = self._number(noise.get("level", noise.get("level_db")))
+        if noise_level is not None:
+            has_data = True
+            night = self._is_night(location_data.get("lon"), location_data.get("observed_at"))
+            limit = self.NOISE_LIMIT_NIGHT if night else self.NOISE_LIMIT_DAY
+            if noise_level > limit:
+                penalties.append((f"Tiếng ồn {noise_level:g} dB", min(15.0, (noise_level - limit) * 0.75)))
+                risk = max(risk, 1)
+                period = "đêm" if night else "ngày"
+                concerns.append(f"Tiếng ồn {noise_level:g} dB vượt ngưỡng WHO ban {period} ({limit:g} dB)")
+                recommendations.append("Hạn chế tiếp xúc tiếng ồn kéo dài, cân nhắc dùng nút tai hoặc cửa cách âm")
+
+        radiation = env_data.get("radiation") or {}
+        radiation_level = self._number(radiation.get("level"))
+        if radiation_level is not None:
+            has_data = True
+            if radiation_level > 1.0:
+                penalties.append((f"Bức xạ {radiation_level:g} μSv/h", 30))
+                risk = max(risk, 3)
+                concerns.append(f"Bức xạ {radiation_level:g} μSv/h ở mức cao")
+                recommendations.append("Hạn chế thời gian lưu lại khu vực và theo dõi thông báo của cơ quan chức năng")
+            elif radiation_level > 0.5:
+                penalties.append((f"Bức xạ {radiation_level:g} μSv/h", 15))
+                risk = max(risk, 1)
+                concerns.append(f"Bức xạ {radiation_level:g} μSv/h cao hơn nền")
+            elif radiation_level > 0.3:
+                penalties.append((f"Bức xạ {radiation_level:g} μSv/h", 5))
+
+        weather = env_data.get("weather") or {}
+        temperature = self._number(weather.get("temperature"))
+        if temperature is not None:
+            has_data = True
+            if temperature > 35:
+                penalties.append((f"Nhiệt độ {temperature:g}°C", 10))
+                risk = max(risk, 1)
+                concerns.append(f"Nắng nóng ({temperature:g}°C)")
+                recommendations.append("Uống đủ nước, tránh ra ngoài vào buổi trưa")
+            elif temperature < 0:
+                penalties.append((f"Nhiệt độ {temperature:g}°C", 5))
+                recommendations.append("Giữ ấm cơ thể khi ra ngoài")
+
+        soil = env_data.get("soil") or {}
+        soil_ph = self._number(soil.get("ph"))
+        if soil_ph is not None:
+            has_data = True
+            if not 5.5 <= soil_ph <= 8.0:
+                penalties.append((f"pH đất {soil_ph:g}", 3))
+
+        if not has_data:
+            return EnvironmentalQuality(
+                overall_rating="moderate",
+                score=50.0,
+                health_risk="moderate",
+                summary="Không có đủ dữ liệu để đánh giá",
+                recommendations=["Cần thu thập thêm dữ liệu môi trường"],
+                concerns=["Thiếu thông tin môi trường"],
+                ai_reasoning=f"{self.REASONING_PREFIX}: không có dữ liệu đo"
+            )
+
+        score = round(max(0.0, 100.0 - sum(p for _, p in penalties)), 1)
+        rating = self._get_rating(score)
+        health_risk = ["low", "moderate", "high", "severe"][risk]
+
+        city = location_data.get("city") or "khu vực này"
+        if concerns:
+            summary = f"Chất lượng môi trường tại {city} ở mức {rating} ({score:g}/100): {concerns[0]}"
+        else:
+            summary = f"Chất lượng môi trường tại {city} ở mức {rating} ({score:g}/100), các chỉ số trong ngưỡng khuyến nghị"
+            recommendations.append("Điều kiện phù hợp cho hoạt động ngoài trời")
+
+        if penalties:
+            details = ", ".join(f"{name} (-{penalty:g})" for name, penalty in penalties)
+        else:
+            details = "không có chỉ số vượt ngưỡng"
+        reasoning = f"{self.REASONING_PREFIX} (local engine): 100 điểm, trừ {details}"
+
+        return EnvironmentalQuality(
+            overall_rating=rating,
+            score=score,
+            health_risk=health_risk,
+            summary=summary,
+            recommendations=list(dict.fromkeys(recommendations)),
+            concerns=concerns,
+            ai_reasoning=reasoning
+        )
+
+    def _get_rating(self, score: float) -> str:
+        if score >= 85:
+            return "excellent"
+        elif score >= 70:
+            return "good"
+        elif score >= 50:
+            return "moderate"
+        elif score >= 30:
+            return "poor"
+        return "hazardous"
+
+    def is_rule_based(self, assessment: EnvironmentalQuality) -> bool:
+        """Đánh giá do engine này tạo (kể cả khi là dự phòng cho AI)"""
+        return assessment.ai_reasoning.startswith(self.REASONING_PREFIX)
+
+    def _is_night(self, lon: Optional[float], observed_at: Any) -> bool:
+        """Đêm (22h-6h) theo giờ mặt trời địa phương tại thời điểm đo, ước tính từ kinh độ"""
+        if isinstance(observed_at, str):
+            try:
+                observed_at = datetime.fromisoformat(observed_at.replace("Z", "+00:00"))
+            except ValueError:
+                observed_at = None
+        if not isinstance(observed_at, datetime):
+            return False
+        if observed_at.tzinfo is not None:
+            observed_at = observed_at.astimezone(timezone.utc)
+        local_hour = (observed_at.hour + observed_at.minute / 60 + (lon or 0) / 15) % 24
+        return local_hour >= 22 or local_hour < 6
+
+    def _number(self, value: Any) -> Optional[float]:
+        return float(value) if isinstance(value, (int, float)) else None
+
+# Singleton instance
+rule_assessment_service = RuleBasedAssessmentService()
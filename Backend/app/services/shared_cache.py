@@ -0,0 +1,143 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCacheBackend:
+    """LRU + TTL trong bộ nhớ process (mặc định khi chạy một worker)"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+class RedisCacheBackend:
+    """Redis (hoặc server tương thích) dùng chung cho mọi worker / replica"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis.asyncio as aioredis  # chỉ import khi cấu hình SHARED_CACHE_URL
+        self._client = aioredis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(key)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class SharedCache:
+    """
+    Tầng cache nhanh (bytes + TTL) đứng trước MongoDB
+
+    - SHARED_CACHE_URL=redis://... -> dùng chung giữa các worker, hit rate không giảm khi tăng worker
+    - Không cấu hình (hoặc thiếu thư viện redis) -> LRU trong bộ nhớ của process
+    - Lỗi backend không làm hỏng request: get trả None, set bị bỏ qua
+    """
+
+    def __init__(self):
+        self._backend = None
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = self._create_backend()
+        return self._backend
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Shared cache get failed: {e}")
+            return None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        try:
+            await self.backend.set(key, value, ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Shared cache set failed: {e}")
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self.backend.delete(key)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Shared cache delete failed: {e}")
+
+    async def close(self) -> None:
+        if self._backend is not None:
+            await self._backend.close()
+            self._backend = None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / total, 3) if total else None
+        }
+
+    def _create_backend(self):
+        if settings.SHARED_CACHE_URL:
+            try:
+                backend = RedisCacheBackend(settings.SHARED_CACHE_URL)
+            except ImportError:  # redis là optional
+                logger.warning("SHARED_CACHE_URL is set but the redis package is not installed, using in-memory cache")
+            else:
+                logger.info("Using Redis shared cache")
+                return backend
+        return MemoryCacheBackend(settings.SHARED_CACHE_MAX_ENTRIES)
+
+
+# Global instance
+shared_cache = SharedCache()
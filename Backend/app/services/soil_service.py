@@ -1,16 +1,20 @@
+import logging
 import httpx
 from typing import Optional, Dict
 from app.models import SoilData
 from app.core.config import settings
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
 
 class SoilService:
     def __init__(self):
         # Agromonitoring API (same company as OpenWeather)
-        self.agro_base_url = "http://api.agromonitoring.com/agro/1.0"
+        self.agro_base_url = settings.AGROMONITORING_BASE_URL
         self.agro_api_key = settings.OPENWEATHER_API_KEY  # Dùng chung với OpenWeather
         
         # SoilGrids API (ISRIC) - FREE, không cần key
-        self.soilgrids_url = "https://rest.isric.org/soilgrids/v2.0"
+        self.soilgrids_url = settings.SOILGRIDS_BASE_URL
     
     async def get_soil(self, lat: float, lon: float) -> Optional[SoilData]:
         """
@@ -23,16 +27,18 @@ class SoilService:
         """
         try:
             # Lấy real-time soil data từ Agromonitoring
-            agro_data = await self._get_agromonitoring_data(lat, lon)
+            with span("soil.agromonitoring", "Agromonitoring"):
+                agro_data = await self._get_agromonitoring_data(lat, lon)
             
             # Lấy soil properties từ SoilGrids
-            soilgrids_data = await self._get_soilgrids_data(lat, lon)
+            with span("soil.soilgrids", "SoilGrids"):
+                soilgrids_data = await self._get_soilgrids_data(lat, lon)
             
             # Combine data
             return self._combine_soil_data(agro_data, soilgrids_data)
             
         except Exception as e:
-            print(f"Soil Service error: {e}")
+            logger.warning(f"Soil Service error: {e}")
             return self._simulate_soil_data(lat, lon)
     
     async def _get_agromonitoring_data(self, lat: float, lon: float) -> Optional[Dict]:
@@ -84,7 +90,7 @@ class SoilService:
                             "moisture": round(moisture_percent, 1)
                         }
         except Exception as e:
-            print(f"Agromonitoring error: {e}")
+            logger.warning(f"Agromonitoring error: {e}")
         
         return None
     
@@ -142,7 +148,7 @@ class SoilService:
                             "conductivity": round(conductivity, 2) if conductivity else None
                         }
         except Exception as e:
-            print(f"SoilGrids error: {e}")
+            logger.warning(f"SoilGrids error: {e}")
         
         return None
     
@@ -0,0 +1,141 @@
+"""
+Tính vị trí mặt trời theo thuật toán NOAA, vector hoá bằng NumPy
+
+Mọi hàm nhận mảng (hoặc scalar) và broadcast theo quy tắc NumPy, ví dụ:
+    times (T,) và lat/lon (P, 1) -> kết quả (P, T) trong một lần tính
+Thời gian là UTC, dạng numpy datetime64.
+"""
+import numpy as np
+
+# Zenith tại lúc mặt trời mọc/lặn: 90° + khúc xạ khí quyển + bán kính đĩa mặt trời
+SUNRISE_ZENITH = 90.833
+
+# Hệ số quy đổi bức xạ -> độ rọi ánh sáng ban ngày (lm/W)
+DAYLIGHT_EFFICACY = 110.0
+
+
+def _julian_century(times: np.ndarray) -> np.ndarray:
+    seconds = times.astype("datetime64[s]").astype(np.float64)
+    julian_day = seconds / 86400.0 + 2440587.5
+    return (julian_day - 2451545.0) / 36525.0
+
+
+def _declination_and_eq_time(jc: np.ndarray):
+    """Độ xích vĩ mặt trời (độ) và phương trình thời gian (phút)"""
+    mean_long = np.mod(280.46646 + jc * (36000.76983 + jc * 0.0003032), 360.0)
+    mean_anom = 357.52911 + jc * (35999.05029 - 0.0001537 * jc)
+    eccent = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+
+    mean_anom_rad = np.radians(mean_anom)
+    eq_center = (
+        np.sin(mean_anom_rad) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+        + np.sin(2 * mean_anom_rad) * (0.019993 - 0.000101 * jc)
+        + np.sin(3 * mean_anom_rad) * 0.000289
+    )
+    omega = np.radians(125.04 - 1934.136 * jc)
+    apparent_long = mean_long + eq_center - 0.00569 - 0.00478 * np.sin(omega)
+
+    mean_obliq = 23.0 + (26.0 + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60.0) / 60.0
+    obliq = np.radians(mean_obliq + 0.00256 * np.cos(omega))
+
+    declination = np.degrees(np.arcsin(np.sin(obliq) * np.sin(np.radians(apparent_long))))
+
+    y = np.tan(obliq / 2) ** 2
+    mean_long_rad = np.radians(mean_long)
+    eq_time = 4 * np.degrees(
+        y * np.sin(2 * mean_long_rad)
+        - 2 * eccent * np.sin(mean_anom_rad)
+        + 4 * eccent * y * np.sin(mean_anom_rad) * np.cos(2 * mean_long_rad)
+        - 0.5 * y * y * np.sin(4 * mean_long_rad)
+        - 1.25 * eccent * eccent * np.sin(2 * mean_anom_rad)
+    )
+    return declination, eq_time
+
+
+def solar_cos_zenith(times, lat, lon) -> np.ndarray:
+    """
+    cos(góc thiên đỉnh) mặt trời
+
+    Tách phần phụ thuộc thời gian (T,) và phần phụ thuộc vị trí (P,) bằng
+    cos(a + b) = cos a·cos b - sin a·sin b, nên lưới (P, T) chỉ còn phép nhân/cộng
+    """
+    times = np.asarray(times, dtype="datetime64[s]")
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(lon, dtype=np.float64))
+
+    declination, eq_time = _declination_and_eq_time(_julian_century(times))
+    minutes_utc = (times - times.astype("datetime64[D]")).astype(np.float64) / 60.0
+
+    # Góc giờ tại kinh độ 0 (radian); góc giờ tại vị trí = time_angle + lon
+    time_angle = np.radians((minutes_utc + eq_time) / 4.0 - 180.0)
+    decl_rad = np.radians(declination)
+    sin_decl = np.sin(decl_rad)
+    cos_decl_cos_t = np.cos(decl_rad) * np.cos(time_angle)
+    cos_decl_sin_t = np.cos(decl_rad) * np.sin(time_angle)
+
+    cos_lat = np.cos(lat_rad)
+    return (
+        np.sin(lat_rad) * sin_decl
+        + (cos_lat * np.cos(lon_rad)) * cos_decl_cos_t
+        - (cos_lat * np.sin(lon_rad)) * cos_decl_sin_t
+    )
+
+
+def solar_elevation(times, lat, lon) -> np.ndarray:
+    """Góc cao mặt trời (độ, chưa hiệu chỉnh khúc xạ)"""
+    return elevation_from_cos_zenith(solar_cos_zenith(times, lat, lon))
+
+
+def elevation_from_cos_zenith(cos_zenith) -> np.ndarray:
+    return np.degrees(np.arcsin(np.clip(cos_zenith, -1.0, 1.0)))
+
+
+def sun_times(dates, lat, lon):
+    """
+    Giờ mặt trời mọc/lặn (phút tính từ 00:00 UTC của ngày) và số giờ ban ngày
+
+    Returns:
+        (sunrise_min, sunset_min, daylight_hours)
+        sunrise/sunset là NaN khi ngày/đêm địa cực; daylight_hours = 24 hoặc 0
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+
+    # Tính tại giữa trưa UTC của ngày (sai số < 1 phút)
+    declination, eq_time = _declination_and_eq_time(
+        _julian_century(dates.astype("datetime64[s]") + np.timedelta64(12, "h"))
+    )
+    lat_rad = np.radians(lat)
+    decl_rad = np.radians(declination)
+
+    cos_hour_angle = (
+        np.cos(np.radians(SUNRISE_ZENITH)) / (np.cos(lat_rad) * np.cos(decl_rad))
+        - np.tan(lat_rad) * np.tan(decl_rad)
+    )
+    polar = np.abs(cos_hour_angle) > 1.0
+    hour_angle = np.degrees(np.arccos(np.clip(cos_hour_angle, -1.0, 1.0)))
+
+    solar_noon = 720.0 - 4.0 * lon - eq_time
+    sunrise = np.where(polar, np.nan, solar_noon - 4.0 * hour_angle)
+    sunset = np.where(polar, np.nan, solar_noon + 4.0 * hour_angle)
+    daylight_hours = np.where(polar, np.where(cos_hour_angle < -1.0, 24.0, 0.0), 8.0 * hour_angle / 60.0)
+    return sunrise, sunset, daylight_hours
+
+
+def clear_sky_irradiance(cos_zenith) -> np.ndarray:
+    """Bức xạ toàn phần trời quang (W/m², mô hình Haurwitz) từ cos(góc thiên đỉnh)"""
+    cos_zenith = np.asarray(cos_zenith, dtype=np.float64)
+    day = cos_zenith > 0.01
+    safe = np.where(day, cos_zenith, 1.0)
+    return np.where(day, 1098.0 * safe * np.exp(-0.057 / safe), 0.0)
+
+
+def clear_sky_uv_index(cos_zenith) -> np.ndarray:
+    """UV index trời quang ước tính từ cos(góc thiên đỉnh)"""
+    return 12.5 * np.clip(np.asarray(cos_zenith, dtype=np.float64), 0.0, None) ** 2.42
+
+
+def illuminance(irradiance) -> np.ndarray:
+    """Độ rọi (lux) từ bức xạ; ban đêm ~1 lux"""
+    return np.maximum(np.asarray(irradiance, dtype=np.float64) * DAYLIGHT_EFFICACY, 1.0)
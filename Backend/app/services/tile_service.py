@@ -0,0 +1,302 @@
+import json
+import logging
+import math
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.offload import run_cpu
+from app.services.cache_service import cache_service
+from app.services.database import db_service
+from app.services.heat_index import HEAT_RISK_THRESHOLDS
+
+logger = logging.getLogger(__name__)
+
+
+class TileService:
+    """
+    Render tile bản đồ (XYZ, Web Mercator) cho các layer môi trường
+
+    - Nội suy IDW từ các điểm đã đo: điểm ghi nhận trong process + entry cache MongoDB còn hạn
+    - Lưới nội suy GRID_SIZE x GRID_SIZE, PNG phóng to lên TILE_SIZE (block nearest)
+    - Pixel xa điểm đo hơn radius_km của layer thì để trống (trong suốt / null)
+    - Tile đã render được cache trong bộ nhớ với TTL riêng theo layer
+    """
+
+    TILE_SIZE = 256
+    GRID_SIZE = 64
+    IDW_POWER = 2.0
+    STATION_CHUNK = 256
+    ALPHA = 170
+
+    # field: (nhóm dữ liệu, tên trường) trong EnvironmentResponse
+    # thresholds/colors: thang màu theo bậc (len(colors) = len(thresholds) + 1)
+    LAYERS: Dict[str, Dict[str, Any]] = {
+        "aqi": {
+            "field": ("air", "aqi"),
+            "ttl": 15 * 60,
+            "radius_km": 30.0,
+            "thresholds": [50, 100, 150, 200, 300],
+            "colors": [(0, 228, 0), (255, 255, 0), (255, 126, 0), (255, 0, 0), (143, 63, 151), (126, 0, 35)],
+        },
+        "heat": {
+            "field": ("heat", "heat_index"),
+            "ttl": 30 * 60,
+            "radius_km": 50.0,
+            "thresholds": HEAT_RISK_THRESHOLDS.tolist(),
+            "colors": [(116, 173, 209), (255, 255, 191), (253, 174, 97), (244, 109, 67), (165, 0, 38)],
+        },
+        "noise": {
+            "field": ("noise", "level"),
+            "ttl": 30 * 60,
+            "radius_km": 5.0,
+            "thresholds": [45, 55, 65, 75],
+            "colors": [(26, 152, 80), (166, 217, 106), (254, 224, 139), (244, 109, 67), (165, 0, 38)],
+        },
+        "radiation": {
+            "field": ("radiation", "level"),
+            "ttl": 6 * 3600,
+            "radius_km": 50.0,
+            "thresholds": [0.2, 0.3, 0.5, 1.0],
+            "colors": [(26, 152, 80), (166, 217, 106), (254, 224, 139), (244, 109, 67), (165, 0, 38)],
+        },
+    }
+
+    FORMATS = {"png": "image/png", "json": "application/json"}
+
+    def __init__(self):
+        # (layer, lat, lon) làm tròn ~100m -> (lat, lon, value)
+        self._stations: "OrderedDict[Tuple[str, float, float], Tuple[float, float, float]]" = OrderedDict()
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._tiles: "OrderedDict[Tuple, Tuple[bytes, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, lat: float, lon: float, data: Dict[str, Any]) -> None:
+        """Ghi nhận giá trị đo của một response (dict theo EnvironmentResponse) làm điểm nội suy"""
+        for layer, config in self.LAYERS.items():
+            value = self._extract(data, config["field"])
+            if value is None:
+                continue
+            key = (layer, round(lat, 3), round(lon, 3))
+            self._stations[key] = (lat, lon, value)
+            self._stations.move_to_end(key)
+            self._arrays.pop(layer, None)
+
+        while len(self._stations) > settings.TILE_MAX_STATIONS:
+            (layer, _, _), _ = self._stations.popitem(last=False)
+            self._arrays.pop(layer, None)
+
+    async def get_tile(self, layer: str, z: int, x: int, y: int, fmt: str) -> Tuple[bytes, bool]:
+        """
+        Lấy tile (bytes) theo layer/z/x/y và định dạng png | json
+
+        Returns:
+            (content, cache_hit)
+        """
+        key = (layer, z, x, y, fmt)
+        if settings.TILE_CACHE_ENABLED:
+            entry = self._tiles.get(key)
+            if entry:
+                content, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._tiles.move_to_end(key)
+                    self.hits += 1
+                    return content, True
+                del self._tiles[key]
+        self.misses += 1
+
+        bounds = self.tile_bounds(z, x, y)
+        stations = await self._collect_stations(layer, bounds)
+        # Nội suy + encode tốn CPU -> chạy ngoài event loop (CPU_EXECUTOR)
+        content = await run_cpu(_render_tile, layer, z, x, y, stations, fmt)
+
+        if settings.TILE_CACHE_ENABLED:
+            self._tiles[key] = (content, time.monotonic() + self.LAYERS[layer]["ttl"])
+            while len(self._tiles) > settings.TILE_CACHE_MAX_ENTRIES:
+                self._tiles.popitem(last=False)
+        return content, False
+
+    def render_content(self, layer: str, z: int, x: int, y: int, stations: np.ndarray, fmt: str) -> bytes:
+        """Nội suy + encode tile (chỉ dùng thuộc tính của class, chạy được trong thread / process khác)"""
+        grid = self.render_grid(layer, z, x, y, stations)
+        if fmt == "png":
+            return self._encode_png(self._colorize(layer, grid))
+        return json.dumps({
+            "layer": layer,
+            "z": z,
+            "x": x,
+            "y": y,
+            "size": self.GRID_SIZE,
+            "stations": len(stations),
+            "values": [[None if math.isnan(v) else round(v, 2) for v in row] for row in grid.tolist()]
+        }).encode()
+
+    def render_grid(self, layer: str, z: int, x: int, y: int, stations: np.ndarray) -> np.ndarray:
+        """
+        Nội suy IDW lên lưới GRID_SIZE x GRID_SIZE của tile (NaN = không có dữ liệu)
+
+        stations: mảng (N, 3) gồm lat, lon, value
+        """
+        size = self.GRID_SIZE
+        grid = np.full((size, size), np.nan)
+        if stations.size == 0:
+            return grid
+
+        lats, lons = self._pixel_coordinates(z, x, y, size)
+        lat_grid = lats[:, None, None]
+        lon_grid = lons[None, :, None]
+        lon_scale = 111.32 * np.cos(np.radians(lat_grid))
+
+        weight_sum = np.zeros((size, size))
+        value_sum = np.zeros((size, size))
+        nearest = np.full((size, size), np.inf)
+
+        # Chia điểm đo thành từng khối để mảng (size, size, chunk) không quá lớn
+        for start in range(0, len(stations), self.STATION_CHUNK):
+            chunk = stations[start:start + self.STATION_CHUNK]
+            # Khoảng cách xấp xỉ equirectangular (km), đủ chính xác trong bán kính vài chục km
+            dy = (lat_grid - chunk[:, 0]) * 110.57
+            dx = (lon_grid - chunk[:, 1]) * lon_scale
+            distance = np.sqrt(dx * dx + dy * dy)
+
+            weights = 1.0 / np.maximum(distance, 0.05) ** self.IDW_POWER
+            weight_sum += weights.sum(axis=2)
+            value_sum += (weights * chunk[:, 2]).sum(axis=2)
+            np.minimum(nearest, distance.min(axis=2), out=nearest)
+
+        covered = nearest <= self.LAYERS[layer]["radius_km"]
+        grid[covered] = value_sum[covered] / weight_sum[covered]
+        return grid
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": settings.TILE_CACHE_ENABLED,
+            "entries": len(self._tiles),
+            "stations": len(self._stations),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None
+        }
+
+    @staticmethod
+    def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+        """(min_lat, max_lat, min_lon, max_lon) của tile"""
+        n = 2 ** z
+        min_lon = x / n * 360.0 - 180.0
+        max_lon = (x + 1) / n * 360.0 - 180.0
+        max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+        min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+        return min_lat, max_lat, min_lon, max_lon
+
+    @staticmethod
+    def _pixel_coordinates(z: int, x: int, y: int, size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Lat theo hàng, lon theo cột tại tâm mỗi pixel (Web Mercator tách được theo trục)"""
+        n = 2 ** z
+        offsets = (np.arange(size) + 0.5) / size
+        lons = (x + offsets) / n * 360.0 - 180.0
+        lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+        return lats, lons
+
+    async def _collect_stations(self, layer: str, bounds: Tuple[float, float, float, float]) -> np.ndarray:
+        """Các điểm đo trong tile (nới thêm radius_km), gộp bộ nhớ + cache MongoDB"""
+        margin = self.LAYERS[layer]["radius_km"] / 110.0
+        min_lat, max_lat, min_lon, max_lon = bounds
+        min_lat, max_lat = min_lat - margin, max_lat + margin
+        lon_margin = margin / max(math.cos(math.radians(min(abs(min_lat), abs(max_lat), 85.0))), 0.01)
+        min_lon, max_lon = min_lon - lon_margin, max_lon + lon_margin
+
+        points = self._layer_array(layer)
+        if points.size:
+            inside = (
+                (points[:, 0] >= min_lat) & (points[:, 0] <= max_lat)
+                & (points[:, 1] >= min_lon) & (points[:, 1] <= max_lon)
+            )
+            points = points[inside]
+
+        cached = await self._load_cached_points(layer, (min_lat, max_lat, min_lon, max_lon))
+        if cached:
+            points = np.vstack([points.reshape(-1, 3), np.array(cached, dtype=np.float64)])
+        return points.reshape(-1, 3)
+
+    def _layer_array(self, layer: str) -> np.ndarray:
+        if layer not in self._arrays:
+            rows = [v for (name, _, _), v in self._stations.items() if name == layer]
+            self._arrays[layer] = np.array(rows, dtype=np.float64).reshape(-1, 3)
+        return self._arrays[layer]
+
+    async def _load_cached_points(self, layer: str, bbox: Tuple[float, float, float, float]) -> List[Tuple[float, float, float]]:
+        """Đọc điểm đo từ cache MongoDB (environment_data còn hạn) trong bbox"""
+        if not db_service.is_connected():
+            return []
+
+        group, field = self.LAYERS[layer]["field"]
+        path = f"data.{group}.{field}"
+        min_lat, max_lat, min_lon, max_lon = bbox
+        try:
+            collection = db_service.get_database()[cache_service.COLLECTION_NAME]
+            cursor = collection.find(
+                {
+                    "lat": {"$gte": min_lat, "$lte": max_lat},
+                    "lon": {"$gte": min_lon, "$lte": max_lon},
+                    "expires_at": {"$gt": datetime.utcnow()},
+                    path: {"$type": "number"}
+                },
+                {"lat": 1, "lon": 1, path: 1}
+            ).limit(settings.TILE_MAX_STATIONS)
+            points = []
+            async for doc in cursor:
+                points.append((doc["lat"], doc["lon"], float(doc["data"][group][field])))
+            return points
+        except Exception as e:
+            logger.error(f"Error loading tile stations from cache: {e}")
+            return []
+
+    def _colorize(self, layer: str, grid: np.ndarray) -> np.ndarray:
+        """Lưới giá trị -> ảnh RGBA TILE_SIZE x TILE_SIZE theo thang màu của layer"""
+        config = self.LAYERS[layer]
+        palette = np.array([(*color, self.ALPHA) for color in config["colors"]] + [(0, 0, 0, 0)], dtype=np.uint8)
+
+        index = np.digitize(np.nan_to_num(grid, nan=0.0), config["thresholds"])
+        index[np.isnan(grid)] = len(palette) - 1
+        scale = self.TILE_SIZE // self.GRID_SIZE
+        index = np.repeat(np.repeat(index, scale, axis=0), scale, axis=1)
+        return palette[index]
+
+    @staticmethod
+    def _encode_png(rgba: np.ndarray) -> bytes:
+        """Encode ảnh RGBA (H, W, 4) uint8 thành PNG (không cần Pillow)"""
+        height, width = rgba.shape[:2]
+        raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)  # byte đầu mỗi dòng: filter = 0
+        raw[:, 1:] = rgba.reshape(height, width * 4)
+
+        def chunk(kind: bytes, payload: bytes) -> bytes:
+            return struct.pack(">I", len(payload)) + kind + payload + struct.pack(">I", zlib.crc32(kind + payload) & 0xFFFFFFFF)
+
+        header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+        return (
+            b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+            + chunk(b"IEND", b"")
+        )
+
+    @staticmethod
+    def _extract(data: Dict[str, Any], field: Tuple[str, str]) -> Optional[float]:
+        group = data.get(field[0]) or {}
+        value = group.get(field[1])
+        return float(value) if isinstance(value, (int, float)) else None
+
+
+# Global instance
+tile_service = TileService()
+
+
+def _render_tile(layer: str, z: int, x: int, y: int, stations: np.ndarray, fmt: str) -> bytes:
+    """Hàm module-level cho run_cpu (CPU_EXECUTOR=process pickle được theo tên)"""
+    return tile_service.render_content(layer, z, x, y, stations, fmt)
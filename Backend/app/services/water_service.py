@@ -1,13 +1,19 @@
+import logging
 import httpx
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
 from app.models import WaterQualityData
+from app.core.config import settings
+from app.core.tracing import span
+from app.core.offload import run_cpu, decode_json, json_loads
+
+logger = logging.getLogger(__name__)
 
 class WaterQualityService:
     def __init__(self):
         # Water Quality Portal - FREE, không cần API key
         # Dữ liệu từ USGS, EPA, và 400+ agencies
-        self.base_url = "https://www.waterqualitydata.us/data" 
+        self.base_url = settings.WQP_BASE_URL
         
     async def get_water_quality(self, lat: float, lon: float) -> Optional[WaterQualityData]:
         """
@@ -21,27 +27,29 @@ class WaterQualityService:
         """
         try:
             # Bước 1: Tìm stations gần vị trí
-            stations = await self._find_nearby_stations(lat, lon, radius_km=50)
+            with span("water.stations", "WQP stations 50km"):
+                stations = await self._find_nearby_stations(lat, lon, radius_km=50)
             
             if not stations:
                 # Fallback: Mở rộng bán kính lên 100km
-                stations = await self._find_nearby_stations(lat, lon, radius_km=100)
+                with span("water.stations", "WQP stations 100km"):
+                    stations = await self._find_nearby_stations(lat, lon, radius_km=100)
             
             if not stations:
                 # Không có station nào, dùng data giả
                 return self._simulate_water_quality(lat, lon)
             
-            # Bước 2: Lấy measurements gần nhất từ stations
-            measurements = await self._fetch_recent_measurements(stations[:5])  # Top 5 stations
+            # Bước 2 + 3: Lấy measurements gần nhất từ stations, parse và aggregate (ngoài event loop)
+            with span("water.results", "WQP results"):
+                water_data = await self._fetch_recent_measurements(stations[:5])  # Top 5 stations
             
-            if not measurements:
+            if not water_data:
                 return self._simulate_water_quality(lat, lon)
             
-            # Bước 3: Parse và aggregate data
-            return self._parse_measurements(measurements)
+            return water_data
             
         except Exception as e:
-            print(f"Water Quality Service error: {e}")
+            logger.warning(f"Water Quality Service error: {e}")
             # Fallback to simulation
             return self._simulate_water_quality(lat, lon)
     
@@ -76,7 +84,7 @@ class WaterQualityService:
                 )
                 
                 if response.status_code == 200:
-                    data = response.json()
+                    data = await decode_json(response.content)
                     # Trả về list các stations
                     if isinstance(data, list):
                         return data
@@ -84,15 +92,16 @@ class WaterQualityService:
                         return data["features"]
                     
         except Exception as e:
-            print(f"Error finding stations: {e}")
+            logger.warning(f"Error finding stations: {e}")
         
         return []
     
-    async def _fetch_recent_measurements(self, stations: List[Dict]) -> List[Dict]:
+    async def _fetch_recent_measurements(self, stations: List[Dict]) -> Optional[WaterQualityData]:
         """
-        Lấy measurements từ các stations (30 ngày gần nhất)
+        Lấy measurements từ các stations (30 ngày gần nhất) và tính trung bình
         
         API Endpoint: /Result/search
+        Payload có thể hàng nghìn bản ghi -> decode + parse trong executor (app/core/offload.py)
         """
         try:
             # Lấy station IDs
@@ -106,7 +115,7 @@ class WaterQualityService:
                         station_ids.append(station_id)
             
             if not station_ids:
-                return []
+                return None
             
             # Lấy data 30 ngày gần nhất
             end_date = datetime.now()
@@ -126,16 +135,14 @@ class WaterQualityService:
                 )
                 
                 if response.status_code == 200:
-                    data = response.json()
-                    if isinstance(data, list):
-                        return data
-                    elif isinstance(data, dict) and "results" in data:
-                        return data["results"]
+                    body = response.content
+                    with span("water.parse"):
+                        return await run_cpu(_parse_results_payload, body, size=len(body))
                     
         except Exception as e:
-            print(f"Error fetching measurements: {e}")
+            logger.warning(f"Error fetching measurements: {e}")
         
-        return []
+        return None
     
     def _parse_measurements(self, measurements: List[Dict]) -> WaterQualityData:
         """
@@ -220,4 +227,14 @@ class WaterQualityService:
             conductivity=round(random.uniform(400, 600), 1),
             temperature=round(random.uniform(18, 25), 1),
             quality_level="Simulated"
-        )
\ No newline at end of file
+        )
+
+
+def _parse_results_payload(body: bytes) -> Optional[WaterQualityData]:
+    """Decode kết quả WQP và tính trung bình (chạy trong executor nên là hàm module-level)"""
+    data = json_loads(body)
+    if isinstance(data, dict):
+        data = data.get("results")
+    if not isinstance(data, list) or not data:
+        return None
+    return WaterQualityService()._parse_measurements(data)
@@ -1,12 +1,26 @@
+import logging
+import asyncio
+import time
 import httpx
-from typing import Optional
-from app.models import WeatherData
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.models import WeatherData, WeatherForecast
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Cache dự báo theo ô lưới, dùng chung cho mọi instance WeatherService
+# (cell_lat, cell_lon) -> (arrays, expires_at monotonic)
+_forecast_cache: "OrderedDict[Tuple[float, float], Tuple[Dict[str, np.ndarray], float]]" = OrderedDict()
+# Request đang chạy cho từng ô -> các request trùng ô chờ chung một lần gọi API
+_forecast_inflight: Dict[Tuple[float, float], asyncio.Task] = {}
+
 class WeatherService:
     def __init__(self):
         self.api_key = settings.OPENWEATHER_API_KEY
-        self.base_url = "https://api.openweathermap.org/data/2.5"
+        self.base_url = settings.OPENWEATHER_BASE_URL
     
     async def get_weather(self, lat: float, lon: float) -> Optional[WeatherData]:
         """Lấy thông tin thời tiết từ OpenWeather API"""
@@ -40,6 +54,158 @@ class WeatherService:
                         description=data.get("weather", [{}])[0].get("description")
                     )
         except Exception as e:
-            print(f"Weather API error: {e}")
+            logger.warning(f"Weather API error: {e}")
+        
+        return None
+    
+    async def get_forecast(self, lat: float, lon: float, step_hours: int = 3,
+                           hours: int = 120) -> Optional[WeatherForecast]:
+        """
+        Dự báo thời tiết dạng cột cho `hours` giờ tới
+        
+        step_hours=3: giữ nguyên các mốc 3 giờ của OpenWeather
+        step_hours=1: nội suy tuyến tính thành từng giờ
+        """
+        forecast = await self.get_forecast_arrays(lat, lon)
+        if not forecast:
+            return None
+        
+        try:
+            times = forecast["times"]
+            now = np.datetime64(datetime.utcnow().replace(minute=0, second=0, microsecond=0), "s")
+            end = now + np.timedelta64(hours * 3600, "s")
+            
+            if step_hours == 1:
+                target = now + np.arange(hours) * np.timedelta64(3600, "s")
+                target = target[(target >= times[0] - np.timedelta64(3 * 3600, "s")) & (target <= times[-1])]
+                series = self._interpolate_hourly(forecast, target)
+            else:
+                keep = (times > now - np.timedelta64(3 * 3600, "s")) & (times < end)
+                target = times[keep]
+                series = {key: values[keep] for key, values in forecast.items()}
+            
+            return WeatherForecast(
+                lat=lat,
+                lon=lon,
+                step_hours=step_hours,
+                times=[f"{t}Z" for t in target],
+                temperature=self._to_list(series["temperature"], 1),
+                feels_like=self._to_list(series["feels_like"], 1),
+                humidity=self._to_list(series["humidity"], 0),
+                pressure=self._to_list(series["pressure"], 0),
+                wind_speed=self._to_list(series["wind_speed"], 1),
+                wind_direction=self._to_list(series["wind_direction"], 0),
+                clouds=self._to_list(series["clouds"], 0),
+                precipitation_probability=self._to_list(series["precipitation_probability"], 2),
+                rain=self._to_list(series["rain"], 2),
+                description=series["description"].tolist()
+            )
+        except Exception as e:
+            logger.warning(f"Weather forecast error: {e}")
+            return None
+    
+    async def get_forecast_arrays(self, lat: float, lon: float) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Dự báo 5 ngày / 3 giờ từ OpenWeather (/forecast), cache theo ô lưới FORECAST_CELL_DEGREES
+        
+        Returns:
+            Dict các mảng song song: times (datetime64[s], UTC), temperature, feels_like, humidity,
+            pressure, wind_speed, wind_direction, clouds, precipitation_probability, rain, description
+        """
+        if not self.api_key:
+            return None
+        
+        cell = self._forecast_cell(lat, lon)
+        entry = _forecast_cache.get(cell)
+        if entry and entry[1] > time.monotonic():
+            _forecast_cache.move_to_end(cell)
+            return entry[0]
         
-        return None
\ No newline at end of file
+        task = _forecast_inflight.get(cell)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_forecast(*cell))
+            _forecast_inflight[cell] = task
+            task.add_done_callback(lambda _: _forecast_inflight.pop(cell, None))
+        forecast = await asyncio.shield(task)
+        
+        if forecast:
+            _forecast_cache[cell] = (forecast, time.monotonic() + settings.FORECAST_CACHE_TTL)
+            _forecast_cache.move_to_end(cell)
+            while len(_forecast_cache) > settings.FORECAST_CACHE_MAX_ENTRIES:
+                _forecast_cache.popitem(last=False)
+        return forecast
+    
+    async def _fetch_forecast(self, lat: float, lon: float) -> Optional[Dict[str, np.ndarray]]:
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.get(
+                    f"{self.base_url}/forecast",
+                    params={
+                        "lat": lat,
+                        "lon": lon,
+                        "appid": self.api_key,
+                        "units": "metric"
+                    },
+                    timeout=10.0
+                )
+                
+                if response.status_code == 200:
+                    entries = response.json().get("list", [])
+                    if entries:
+                        return self._forecast_columns(entries)
+        except Exception as e:
+            logger.warning(f"Weather forecast API error: {e}")
+        
+        return None
+    
+    @staticmethod
+    def _forecast_columns(entries: List[Dict]) -> Dict[str, np.ndarray]:
+        """Danh sách mốc dự báo của OpenWeather -> các mảng song song theo biến"""
+        def column(group: str, field: str, default=np.nan) -> np.ndarray:
+            values = [(e.get(group) or {}).get(field, default) for e in entries]
+            return np.array([default if v is None else v for v in values], dtype=np.float64)
+        
+        return {
+            "times": np.array([e.get("dt", 0) for e in entries], dtype="datetime64[s]"),
+            "temperature": column("main", "temp"),
+            "feels_like": column("main", "feels_like"),
+            "humidity": column("main", "humidity"),
+            "pressure": column("main", "pressure"),
+            "wind_speed": column("wind", "speed"),
+            "wind_direction": column("wind", "deg"),
+            "clouds": column("clouds", "all", 0),
+            "precipitation_probability": np.array([e.get("pop", 0) or 0 for e in entries], dtype=np.float64),
+            "rain": column("rain", "3h", 0),
+            "description": np.array([(e.get("weather") or [{}])[0].get("description") for e in entries], dtype=object),
+        }
+    
+    @staticmethod
+    def _interpolate_hourly(forecast: Dict[str, np.ndarray], target: np.ndarray) -> Dict[str, np.ndarray]:
+        """Nội suy các mốc 3 giờ về từng giờ (hướng gió nội suy theo vector, mô tả lấy theo mốc gần trước)"""
+        source = forecast["times"].astype(np.float64)
+        x = target.astype(np.float64)
+        series = {
+            key: np.interp(x, source, forecast[key])
+            for key in ("temperature", "feels_like", "humidity", "pressure", "wind_speed",
+                        "clouds", "precipitation_probability")
+        }
+        
+        direction = np.radians(forecast["wind_direction"])
+        u = np.interp(x, source, np.sin(direction))
+        v = np.interp(x, source, np.cos(direction))
+        series["wind_direction"] = np.mod(np.degrees(np.arctan2(u, v)), 360.0)
+        
+        # Mốc 3 giờ chứa từng giờ (rain chia đều cho 3 giờ)
+        slot = np.clip(np.searchsorted(source, x, side="right") - 1, 0, len(source) - 1)
+        series["rain"] = forecast["rain"][slot] / 3.0
+        series["description"] = forecast["description"][slot]
+        return series
+    
+    @staticmethod
+    def _forecast_cell(lat: float, lon: float) -> Tuple[float, float]:
+        cell = settings.FORECAST_CELL_DEGREES
+        return round(round(lat / cell) * cell, 4), round(round(lon / cell) * cell, 4)
+    
+    @staticmethod
+    def _to_list(values: np.ndarray, digits: int) -> List[Optional[float]]:
+        return [None if np.isnan(v) else v for v in np.round(values, digits).tolist()]
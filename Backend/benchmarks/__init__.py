@@ -0,0 +1 @@
+"""Benchmark offline: stub upstream, load test /environment, micro-benchmark, import profile"""
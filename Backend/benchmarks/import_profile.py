@@ -0,0 +1,148 @@
+"""
+Đo thời gian import app.main (cold start của một process API)
+
+    python benchmarks/import_profile.py                 # in báo cáo
+    python benchmarks/import_profile.py --output benchmarks/import_profile.md
+    python benchmarks/import_profile.py --max-ms 800     # exit 1 nếu vượt mục tiêu (dùng trong CI)
+
+Mỗi lần chạy là một process mới với `python -X importtime`, lấy median của nhiều lần chạy.
+Đồng thời kiểm tra các thư viện nặng (LangChain, OpenAI, ...) không bị import lúc khởi động.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Chỉ được import ở lần dùng đầu tiên, không phải lúc khởi động
+LAZY_MODULES = ["langchain_openai", "langchain_core", "openai", "tiktoken", "aiohttp", "redis", "motor", "pymongo"]
+
+# Giới hạn chống hồi quy cho CI, không phải mục tiêu "dưới một giây với dư địa":
+# đo được ~850-950 ms trên máy 1 vCPU (xem NOTES)
+DEFAULT_TARGET_MS = 1000
+
+NOTES = [
+    "Mức hiện tại vẫn sát 1 giây, chưa đạt \"dưới một giây với dư địa\". Phần còn lại gần như là sàn:",
+    "- `fastapi` + `pydantic` + `starlette` (~350 ms, phần lớn là `fastapi.openapi.models`): cần để khai báo route",
+    "- `numpy` (~95 ms): dùng ngay trong mỗi request /environment (weather, light, heat, tile), "
+    "hoãn import chỉ dời chi phí sang request đầu tiên",
+    "- `httpx` kéo theo `click` / `pygments` / `rich` (~50 ms) khi môi trường có cài extra CLI của httpx; "
+    "image production không cài thì không có",
+    "- `motor` / `pymongo` đã được hoãn tới lúc kết nối MongoDB (~100 ms)",
+]
+
+
+def run_importtime(module: str) -> Tuple[List[Tuple[str, int, int, int]], List[str]]:
+    """Import module trong process mới, trả về [(tên, self_us, cumulative_us, độ sâu)] và danh sách module đã load"""
+    code = f"import sys, {module}; print('\\n'.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries, result.stdout.split()
+
+
+def profile(module: str, runs: int) -> Dict[str, object]:
+    totals = []
+    by_package: Dict[str, List[int]] = defaultdict(list)
+    by_self: Dict[str, List[int]] = defaultdict(list)
+    loaded: List[str] = []
+
+    for _ in range(runs):
+        entries, loaded = run_importtime(module)
+        totals.append(next(cumulative for name, _, cumulative, _ in entries if name == module))
+        package_time: Dict[str, int] = defaultdict(int)
+        for name, self_us, _, _ in entries:
+            # Gộp self time theo package gốc (fastapi.routing -> fastapi)
+            package_time[name.split(".")[0]] += self_us
+            by_self[name].append(self_us)
+        for package, value in package_time.items():
+            by_package[package].append(value)
+
+    return {
+        "total_ms": statistics.median(totals) / 1000,
+        "runs_ms": [value / 1000 for value in totals],
+        "packages": sorted(
+            ((name, statistics.median(values) / 1000) for name, values in by_package.items()),
+            key=lambda item: item[1], reverse=True
+        ),
+        "modules": sorted(
+            ((name, statistics.median(values) / 1000) for name, values in by_self.items()),
+            key=lambda item: item[1], reverse=True
+        ),
+        "lazy_loaded": [name for name in LAZY_MODULES if name in loaded],
+    }
+
+
+def render(module: str, result: Dict[str, object], target_ms: float, top: int) -> str:
+    total = result["total_ms"]
+    lines = [
+        f"# Import profile: `{module}`",
+        "",
+        f"- Python {sys.version.split()[0]}, median của {len(result['runs_ms'])} lần chạy "
+        f"({', '.join(f'{value:.0f}' for value in result['runs_ms'])} ms)",
+        f"- **Tổng: {total:.0f} ms** (giới hạn CI < {target_ms:.0f} ms: {'OK' if total < target_ms else 'VƯỢT'})",
+        f"- Thư viện nặng bị import lúc khởi động: "
+        f"{', '.join(result['lazy_loaded']) if result['lazy_loaded'] else 'không có'}",
+        "",
+        "## Theo package (self time cộng dồn)",
+        "",
+        "| Package | ms | % |",
+        "|---|---:|---:|",
+    ]
+    for name, value in result["packages"][:top]:
+        lines.append(f"| `{name}` | {value:.1f} | {value / total * 100:.1f} |")
+    lines += [
+        "",
+        "## Module chậm nhất (self time)",
+        "",
+        "| Module | ms |",
+        "|---|---:|",
+    ]
+    for name, value in result["modules"][:top]:
+        lines.append(f"| `{name}` | {value:.1f} |")
+    lines += [
+        "",
+        "Lazy-loaded khi dùng lần đầu: " + ", ".join(f"`{name}`" for name in LAZY_MODULES),
+        "",
+        "## Ghi chú",
+        "",
+        *NOTES,
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile của API process")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=DEFAULT_TARGET_MS, help="Giới hạn thời gian import (CI)")
+    parser.add_argument("--output", help="Ghi báo cáo markdown ra file")
+    args = parser.parse_args()
+
+    result = profile(args.module, args.runs)
+    report = render(args.module, result, args.max_ms, args.top)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+
+    if result["total_ms"] >= args.max_ms or result["lazy_loaded"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Micro-benchmark các hàm thuần (không I/O) trên đường xử lý request
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --json micro_after.json --compare micro_before.json
+
+- WaterQualityService._parse_measurements   (kết quả WQP, 100 / 3000 / 30000 bản ghi)
+- RadiationService._parse_measurements      (Safecast, 100 / 10000 bản ghi)
+- HeatService._calculate_heat_index         (một cặp nhiệt độ / độ ẩm)
+- NoiseService._calculate_distance          (một cặp toạ độ, và quét toàn bộ danh sách sensor)
+- noise_service._find_nearest_noise         (decode + quét dump Sensor.Community 12000 sensor, phần chạy trong executor)
+- water_service._parse_results_payload      (decode + parse 3000 kết quả WQP)
+- json.loads / offload.json_loads           (dump Sensor.Community)
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Optional
+from app.services.water_service import WaterQualityService
+from app.services.radiation_service import RadiationService
+from app.services.heat_service import HeatService
+from app.services.noise_service import NoiseService, _find_nearest_noise
+from app.services.water_service import _parse_results_payload
+from app.core.offload import json_loads
+
+
+def measure(func: Callable[[], Any], min_time: float = 0.2, repeat: int = 5) -> Dict[str, float]:
+    """Thời gian mỗi lần gọi (µs): tự chọn số vòng lặp sao cho mỗi lần đo >= min_time giây"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or loops >= 10_000_000:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - started) / loops)
+    return {
+        "loops": loops,
+        "best_us": round(min(samples) * 1e6, 3),
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+    }
+
+
+def water_measurements(count: int, rng: random.Random) -> List[Dict]:
+    names = ["pH", "Dissolved oxygen (DO)", "Turbidity", "Specific conductance", "Temperature, water", "Nitrate"]
+    return [
+        {"CharacteristicName": names[i % len(names)], "ResultMeasureValue": f"{rng.uniform(0.5, 500):.2f}"}
+        for i in range(count)
+    ]
+
+
+def radiation_measurements(count: int, rng: random.Random) -> List[Dict]:
+    return [{"value": round(rng.uniform(0.05, 0.4), 3), "unit": "usv"} for _ in range(count)]
+
+
+def sensors(count: int, rng: random.Random) -> List[Dict]:
+    return [
+        {"location": {"latitude": rng.uniform(-60, 70), "longitude": rng.uniform(-180, 180)}}
+        for _ in range(count)
+    ]
+
+
+def build_cases(seed: int = 42) -> Dict[str, Callable[[], Any]]:
+    rng = random.Random(seed)
+    water = WaterQualityService()
+    radiation = RadiationService()
+    heat = HeatService()
+    noise = NoiseService()
+
+    cases: Dict[str, Callable[[], Any]] = {}
+    for count in (100, 3000, 30000):
+        data = water_measurements(count, rng)
+        cases[f"water._parse_measurements[{count}]"] = lambda data=data: water._parse_measurements(data)
+    for count in (100, 10000):
+        data = radiation_measurements(count, rng)
+        cases[f"radiation._parse_measurements[{count}]"] = lambda data=data: radiation._parse_measurements(data)
+
+    cases["heat._calculate_heat_index[hot]"] = lambda: heat._calculate_heat_index(34.0, 75.0)
+    cases["heat._calculate_heat_index[mild]"] = lambda: heat._calculate_heat_index(22.0, 40.0)
+
+    cases["noise._calculate_distance"] = lambda: noise._calculate_distance(21.0285, 105.8542, 10.8231, 106.6297)
+    scan = sensors(12000, rng)
+
+    def distance_scan():
+        # Vòng lặp tìm sensor gần nhất trong _get_sensor_community_data
+        for sensor in scan:
+            location = sensor["location"]
+            noise._calculate_distance(21.0285, 105.8542, location["latitude"], location["longitude"])
+
+    cases["noise._calculate_distance[scan 12000]"] = distance_scan
+    
+    # Body thật như upstream trả về: Sensor.Community để toạ độ dạng chuỗi
+    dump = json.dumps([
+        {"location": {"latitude": str(sensor["location"]["latitude"]), "longitude": str(sensor["location"]["longitude"])},
+         "sensordatavalues": [{"value_type": "noise_LAeq", "value": "55.1"}]}
+        for sensor in scan
+    ]).encode()
+    cases["noise._find_nearest_noise[12000]"] = lambda: _find_nearest_noise(dump, 21.0285, 105.8542, 5)
+    cases["json.loads[sensor dump]"] = lambda: json.loads(dump)
+    cases["offload.json_loads[sensor dump]"] = lambda: json_loads(dump)
+    results = json.dumps(water_measurements(3000, rng)).encode()
+    cases["water._parse_results_payload[3000]"] = lambda: _parse_results_payload(results)
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark các hàm thuần")
+    parser.add_argument("--filter", help="Chỉ chạy case có chứa chuỗi này")
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Lưu kết quả ra file JSON")
+    parser.add_argument("--compare", help="File JSON của lần chạy trước để so sánh")
+    args = parser.parse_args()
+
+    baseline: Optional[Dict[str, Any]] = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results: Dict[str, Dict[str, float]] = {}
+    print(f"{'case':<42}{'best µs':>14}{'median µs':>14}{'vs base':>10}")
+    for name, func in build_cases().items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(func, args.min_time, args.repeat)
+        base = (baseline or {}).get(name)
+        delta = f"{(results[name]['best_us'] - base['best_us']) / base['best_us'] * 100:+.0f}%" if base else ""
+        print(f"{name:<42}{results[name]['best_us']:>14}{results[name]['median_us']:>14}{delta:>10}", flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Benchmark /api/v1/environment với upstream giả lập (không cần mạng)
+
+    python -m benchmarks.run                                  # mặc định: cold, warm, include
+    python -m benchmarks.run --requests 400 --concurrency 32 --json after.json --compare before.json
+    python -m benchmarks.run --latency-scale 0 --profile openai:latency_ms=4000,slow_rate=0.05
+    python -m benchmarks.run --replay recordings/prod-2024-06-01 --latency-scale 2
+
+- Khởi động stub server (benchmarks/stubs.py) và một process API (uvicorn) trỏ sang stub
+  (--replay: không dùng stub, API phát lại archive HTTP đã ghi, xem app/core/http_recorder.py)
+- cold:    mỗi request một toạ độ mới (cache miss, gọi đủ upstream + LLM)
+- warm:    một nhóm toạ độ nhỏ, đã gọi trước một lần (cache hit từ shared cache: LRU trong process hoặc Redis,
+           không cần MongoDB)
+- include: toạ độ mới với include=weather,air (không cache, không AI)
+- Kết quả: throughput, p50/p95/p99, số lỗi (503 khi quá tải), số response rút gọn (X-Degraded);
+  --json để lưu, --compare để so với lần chạy trước
+- Quá tải: --concurrency lớn hơn ENVIRONMENT_MAX_CONCURRENCY + ENVIRONMENT_MAX_QUEUE, VD
+  --concurrency 64 --env ENVIRONMENT_MAX_CONCURRENCY=8 --env ENVIRONMENT_MAX_QUEUE=8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from benchmarks.stubs import (
+    DEFAULT_PROFILES, StubPayloads, StubServer, create_stub_app, parse_profile, scale_latency, upstream_env
+)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGION = (20.5, 105.3, 21.5, 106.3)  # Hà Nội và lân cận (south, west, north, east)
+SCENARIOS = ("cold", "warm", "include")
+WARM_LOCATIONS = 10
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class ApiProcess:
+    """Process uvicorn chạy app.main với upstream trỏ sang stub"""
+
+    def __init__(self, port: int, env: Dict[str, str], workers: int = 1, log_path: Optional[str] = None):
+        self.port = port
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.env = {**os.environ, **env}
+        self.workers = workers
+        self.log_path = log_path
+        self.startup_seconds: Optional[float] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._log = None
+
+    def start(self, timeout: float = 60.0) -> "ApiProcess":
+        self._log = open(self.log_path, "w") if self.log_path else subprocess.DEVNULL
+        started = time.perf_counter()
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--workers", str(self.workers), "--log-level", "warning", "--no-access-log"],
+            cwd=BACKEND_DIR, env=self.env, stdout=self._log, stderr=subprocess.STDOUT
+        )
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"API process exited with code {self._process.returncode}")
+            try:
+                if httpx.get(f"{self.base_url}/", timeout=1.0).status_code == 200:
+                    self.startup_seconds = time.perf_counter() - started
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.05)
+        self.stop()
+        raise RuntimeError("API process did not become ready")
+
+    def stop(self):
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        if self._log not in (None, subprocess.DEVNULL):
+            self._log.close()
+
+
+def random_locations(count: int, rng: random.Random) -> List[Tuple[float, float]]:
+    south, west, north, east = REGION
+    seen = set()
+    while len(seen) < count:
+        seen.add((round(rng.uniform(south, north), 4), round(rng.uniform(west, east), 4)))
+    return list(seen)
+
+
+async def drive(base_url: str, requests: List[Dict[str, Any]], concurrency: int,
+                timeout: float) -> Dict[str, Any]:
+    """Gửi requests với tối đa concurrency request đồng thời, đo latency từng request"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    degraded: Dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for params in requests:
+        queue.put_nowait(params)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def worker():
+            while True:
+                try:
+                    params = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                try:
+                    response = await client.get("/api/v1/environment", params=params)
+                    status = str(response.status_code)
+                    mode = response.headers.get("x-degraded")
+                    if mode:
+                        degraded[mode] = degraded.get(mode, 0) + 1
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = statuses.get("200", 0) + statuses.get("304", 0)
+    return {
+        "requests": len(latencies),
+        "errors": len(latencies) - ok,
+        "statuses": statuses,
+        "degraded": degraded,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0,
+    }
+
+
+def build_requests(scenario: str, count: int, rng: random.Random) -> Tuple[List[Dict], List[Dict]]:
+    """(requests để làm nóng trước, requests được đo)"""
+    if scenario == "cold":
+        return [], [{"lat": lat, "lon": lon} for lat, lon in random_locations(count, rng)]
+    if scenario == "warm":
+        locations = [{"lat": lat, "lon": lon} for lat, lon in random_locations(WARM_LOCATIONS, rng)]
+        return locations, [locations[i % len(locations)] for i in range(count)]
+    if scenario == "include":
+        return [], [{"lat": lat, "lon": lon, "include": "weather,air"} for lat, lon in random_locations(count, rng)]
+    raise ValueError(f"Unknown scenario '{scenario}'")
+
+
+def print_results(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    print(f"\nAPI ready in {results['startup_seconds']:.2f}s "
+          f"(concurrency={results['concurrency']}, latency_scale={results['latency_scale']})")
+    header = f"{'scenario':<10}{'req':>6}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, row in results["scenarios"].items():
+        print(f"{name:<10}{row['requests']:>6}{row['errors']:>6}{row['throughput_rps']:>9}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+        if row.get("degraded") or set(row["statuses"]) - {"200"}:
+            print(f"{'':<10}statuses={row['statuses']} degraded={row.get('degraded', {})}")
+        base = (baseline or {}).get("scenarios", {}).get(name)
+        if base:
+            def delta(key):
+                return f"{(row[key] - base[key]) / base[key] * 100:+.0f}%" if base[key] else "n/a"
+            print(f"{'  vs base':<10}{'':>12}{delta('throughput_rps'):>9}{delta('p50_ms'):>10}"
+                  f"{delta('p95_ms'):>10}{delta('p99_ms'):>10}{delta('max_ms'):>10}")
+    if "upstream_calls" in results:
+        print(f"Upstream calls: {results['upstream_calls']}")
+    if "replay" in results:
+        print(f"Replay: {results['replay']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /api/v1/environment với upstream giả lập")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Số request đo cho mỗi scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--workers", type=int, default=1, help="Số worker uvicorn của API")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Nhân mọi latency upstream (0 = không trễ)")
+    parser.add_argument("--replay", help="Thư mục archive HTTP_RECORD_DIR để phát lại thay cho stub")
+    parser.add_argument("--profile", action="append", default=[],
+                        help="upstream:key=value,... (VD wqp:latency_ms=3000,error_rate=0.2; '*' = tất cả)")
+    parser.add_argument("--sensor-count", type=int, default=12000, help="Số sensor trong payload Sensor.Community")
+    parser.add_argument("--wqp-results", type=int, default=3000, help="Số kết quả trong payload WQP")
+    parser.add_argument("--mongo-url", help="MongoDB cho cache (mặc định: không dùng)")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE thêm cho process API")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log", help="Ghi stdout/stderr của API ra file")
+    parser.add_argument("--json", help="Lưu kết quả ra file JSON")
+    parser.add_argument("--compare", help="File JSON của lần chạy trước để so sánh")
+    args = parser.parse_args()
+
+    profiles = dict(DEFAULT_PROFILES)
+    scale_latency(profiles, args.latency_scale)
+    for spec in args.profile:
+        parse_profile(spec, profiles)
+
+    stubs = None
+    if args.replay:
+        # URL upstream giữ mặc định (giống lúc ghi), chỉ cần key giả để service gọi upstream
+        env = {key: value for key, value in upstream_env("").items() if key.endswith("_KEY")}
+        env.update(
+            HTTP_RECORD_MODE="replay",
+            HTTP_RECORD_DIR=os.path.abspath(args.replay),
+            HTTP_REPLAY_LATENCY_SCALE=str(args.latency_scale)
+        )
+    else:
+        stub_app = create_stub_app(profiles, StubPayloads(REGION, args.sensor_count, args.wqp_results))
+        stubs = StubServer(stub_app, port=free_port()).start()
+        env = upstream_env(stubs.base_url)
+    env["MONGO_URL"] = args.mongo_url or ""
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    api = ApiProcess(free_port(), env, workers=args.workers, log_path=args.log)
+
+    rng = random.Random(args.seed)
+    results: Dict[str, Any] = {
+        "concurrency": args.concurrency,
+        "latency_scale": args.latency_scale,
+        "workers": args.workers,
+        "scenarios": {},
+    }
+    try:
+        api.start()
+        results["startup_seconds"] = round(api.startup_seconds, 3)
+        for scenario in filter(None, args.scenarios.split(",")):
+            warmup, measured = build_requests(scenario, args.requests, rng)
+            if warmup:
+                asyncio.run(drive(api.base_url, warmup, 1, args.timeout))
+            print(f"Running {scenario} ({len(measured)} requests)...", flush=True)
+            results["scenarios"][scenario] = asyncio.run(
+                drive(api.base_url, measured, args.concurrency, args.timeout)
+            )
+        if stubs:
+            results["upstream_calls"] = dict(stub_app.state.counts)
+        else:
+            results["replay"] = httpx.get(f"{api.base_url}/api/v1/cache/status").json().get("http_recording")
+    finally:
+        api.stop()
+        if stubs:
+            stubs.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
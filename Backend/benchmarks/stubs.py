@@ -0,0 +1,441 @@
+"""
+Stub server cục bộ giả lập các upstream API (không cần mạng)
+
+Mỗi upstream nằm dưới một prefix riêng trên cùng một server:
+
+    /openweather       OpenWeather (weather, forecast)
+    /agromonitoring    Agromonitoring (soil)
+    /waqi              WAQI (feed/geo)
+    /wqp               Water Quality Portal (Station/search, Result/search)
+    /sensor-community  Sensor.Community (static/v2/data.json, payload lớn)
+    /overpass          Overpass API (interpreter)
+    /soilgrids         SoilGrids (properties/query)
+    /safecast          Safecast (measurements.json)
+    /nominatim         Nominatim (reverse, search)
+    /openai            OpenAI (v1/chat/completions, kể cả stream)
+
+Mỗi upstream có UpstreamProfile riêng (latency, jitter, tỉ lệ lỗi, tỉ lệ chậm) để tái hiện
+upstream chậm / lỗi. Dữ liệu trả về phụ thuộc toạ độ (deterministic) để cache không hit giả.
+
+    python -m benchmarks.stubs --port 9100 --profile openai:latency_ms=3000,error_rate=0.1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, fields, replace
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+
+
+@dataclass
+class UpstreamProfile:
+    latency_ms: float = 50  # Độ trễ trung bình mỗi request
+    jitter_ms: float = 20  # +/- ngẫu nhiên quanh latency_ms
+    error_rate: float = 0.0  # Tỉ lệ request trả error_status
+    error_status: int = 503
+    slow_rate: float = 0.0  # Tỉ lệ request chậm bất thường (tail latency)
+    slow_ms: float = 5000
+
+    def delay(self, rng: random.Random) -> float:
+        if self.slow_rate and rng.random() < self.slow_rate:
+            return self.slow_ms / 1000
+        return max(0.0, self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+
+# Độ trễ gần với API thật (đo từ khu vực châu Á)
+DEFAULT_PROFILES: Dict[str, UpstreamProfile] = {
+    "openweather": UpstreamProfile(latency_ms=120, jitter_ms=40),
+    "agromonitoring": UpstreamProfile(latency_ms=250, jitter_ms=80),
+    "waqi": UpstreamProfile(latency_ms=180, jitter_ms=60),
+    "wqp": UpstreamProfile(latency_ms=900, jitter_ms=300),
+    "sensor-community": UpstreamProfile(latency_ms=1200, jitter_ms=400),
+    "overpass": UpstreamProfile(latency_ms=700, jitter_ms=250),
+    "soilgrids": UpstreamProfile(latency_ms=600, jitter_ms=200),
+    "safecast": UpstreamProfile(latency_ms=450, jitter_ms=150),
+    "nominatim": UpstreamProfile(latency_ms=300, jitter_ms=100),
+    "openai": UpstreamProfile(latency_ms=1500, jitter_ms=500),
+}
+
+
+def parse_profile(spec: str, profiles: Dict[str, UpstreamProfile]) -> None:
+    """'openai:latency_ms=3000,error_rate=0.1' -> cập nhật profiles["openai"] ('*' = mọi upstream)"""
+    name, _, options = spec.partition(":")
+    names = list(profiles) if name == "*" else [name]
+    types = {f.name: f.type for f in fields(UpstreamProfile)}
+    for target in names:
+        if target not in profiles:
+            raise ValueError(f"Unknown upstream '{target}', expected one of {sorted(profiles)}")
+        values = {}
+        for option in filter(None, options.split(",")):
+            key, _, value = option.partition("=")
+            if key not in types:
+                raise ValueError(f"Unknown profile option '{key}'")
+            values[key] = int(value) if types[key] in (int, "int") else float(value)
+        profiles[target] = replace(profiles[target], **values)
+
+
+def scale_latency(profiles: Dict[str, UpstreamProfile], factor: float) -> None:
+    for name, profile in profiles.items():
+        profiles[name] = replace(
+            profile,
+            latency_ms=profile.latency_ms * factor,
+            jitter_ms=profile.jitter_ms * factor,
+            slow_ms=profile.slow_ms * factor
+        )
+
+
+def _rng(*parts: Any) -> random.Random:
+    """Random theo toạ độ: cùng vị trí -> cùng dữ liệu, vị trí khác -> dữ liệu khác"""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+    return random.Random(int.from_bytes(digest, "big"))
+
+
+def _coord(value: Optional[str], default: float = 0.0) -> float:
+    try:
+        return round(float(value), 4)
+    except (TypeError, ValueError):
+        return default
+
+
+class StubPayloads:
+    """Payload lớn / cố định được tạo (và serialize) một lần"""
+
+    def __init__(self, region=(20.5, 105.3, 21.5, 106.3), sensor_count: int = 12000,
+                 wqp_results: int = 3000, seed: int = 42):
+        self.region = region
+        rng = random.Random(seed)
+        south, west, north, east = region
+
+        # Sensor.Community: danh sách toàn cầu, vài phần trăm sensor có noise nằm trong vùng benchmark
+        sensors = []
+        for i in range(sensor_count):
+            in_region = rng.random() < 0.05
+            lat = rng.uniform(south, north) if in_region else rng.uniform(-60, 70)
+            lon = rng.uniform(west, east) if in_region else rng.uniform(-180, 180)
+            values = [
+                {"id": i * 10 + 1, "value": f"{rng.uniform(2, 80):.2f}", "value_type": "P1"},
+                {"id": i * 10 + 2, "value": f"{rng.uniform(1, 50):.2f}", "value_type": "P2"},
+            ]
+            if in_region and rng.random() < 0.5:
+                values.append({"id": i * 10 + 3, "value": f"{rng.uniform(45, 80):.1f}", "value_type": "noise_LAeq"})
+            sensors.append({
+                "id": 1000000 + i,
+                "timestamp": "2024-06-01 10:00:00",
+                "location": {
+                    "id": 50000 + i, "latitude": f"{lat:.3f}", "longitude": f"{lon:.3f}",
+                    "altitude": f"{rng.uniform(0, 400):.1f}", "country": "VN" if in_region else "DE",
+                    "exact_location": 0, "indoor": 0
+                },
+                "sensor": {"id": 70000 + i, "pin": "1", "sensor_type": {"id": 14, "name": "SDS011", "manufacturer": "Nova Fitness"}},
+                "sensordatavalues": values,
+            })
+        # Giống API thật: latitude/longitude là chuỗi
+        self.sensor_community = json.dumps(sensors).encode()
+
+        # WQP: kết quả đo của các trạm (multi-MB với wqp_results lớn)
+        characteristics = [
+            ("pH", 6.0, 8.8), ("Dissolved oxygen (DO)", 4.0, 10.0), ("Turbidity", 0.5, 40.0),
+            ("Specific conductance", 100, 900), ("Temperature, water", 15, 32),
+        ]
+        results = []
+        for i in range(wqp_results):
+            name, low, high = characteristics[i % len(characteristics)]
+            results.append({
+                "OrganizationIdentifier": "BENCH",
+                "MonitoringLocationIdentifier": f"BENCH-{i % 25:04d}",
+                "ActivityStartDate": "2024-05-20",
+                "CharacteristicName": name,
+                "ResultMeasureValue": f"{rng.uniform(low, high):.2f}",
+                "ResultMeasure/MeasureUnitCode": "std units",
+                "ResultStatusIdentifier": "Accepted",
+            })
+        self.wqp_results = json.dumps(results).encode()
+
+    def wqp_stations(self, lat: float, lon: float) -> bytes:
+        rng = _rng("wqp", lat, lon)
+        return json.dumps([
+            {
+                "MonitoringLocationIdentifier": f"BENCH-{rng.randrange(25):04d}",
+                "MonitoringLocationName": f"Station {i}",
+                "LatitudeMeasure": lat + rng.uniform(-0.3, 0.3),
+                "LongitudeMeasure": lon + rng.uniform(-0.3, 0.3),
+            }
+            for i in range(rng.randint(3, 12))
+        ]).encode()
+
+
+def openweather_current(lat: float, lon: float) -> Dict[str, Any]:
+    rng = _rng("weather", lat, lon)
+    temp = rng.uniform(18, 38)
+    return {
+        "coord": {"lon": lon, "lat": lat},
+        "weather": [{"id": 803, "main": "Clouds", "description": rng.choice(["broken clouds", "light rain", "clear sky"])}],
+        "main": {"temp": round(temp, 2), "feels_like": round(temp + rng.uniform(-2, 5), 2),
+                 "humidity": rng.randint(40, 95), "pressure": rng.randint(995, 1020)},
+        "visibility": 10000,
+        "wind": {"speed": round(rng.uniform(0, 9), 2), "deg": rng.randint(0, 359)},
+        "clouds": {"all": rng.randint(0, 100)},
+        "dt": int(time.time()),
+        "name": "Bench",
+    }
+
+
+def openweather_forecast(lat: float, lon: float) -> Dict[str, Any]:
+    rng = _rng("forecast", lat, lon)
+    start = int(time.time()) // 10800 * 10800
+    entries = []
+    for i in range(40):
+        temp = rng.uniform(20, 36)
+        entries.append({
+            "dt": start + i * 10800,
+            "main": {"temp": round(temp, 2), "feels_like": round(temp + 1, 2),
+                     "humidity": rng.randint(45, 95), "pressure": rng.randint(995, 1020)},
+            "wind": {"speed": round(rng.uniform(0, 9), 2), "deg": rng.randint(0, 359)},
+            "clouds": {"all": rng.randint(0, 100)},
+            "pop": round(rng.random(), 2),
+            "rain": {"3h": round(rng.uniform(0, 3), 2)},
+            "weather": [{"description": "scattered clouds"}],
+        })
+    return {"cod": "200", "cnt": len(entries), "list": entries}
+
+
+def waqi_feed(lat: float, lon: float) -> Dict[str, Any]:
+    rng = _rng("waqi", lat, lon)
+    return {"status": "ok", "data": {
+        "aqi": rng.randint(20, 220),
+        "city": {"geo": [lat, lon], "name": "Bench station"},
+        "iaqi": {key: {"v": round(rng.uniform(1, 120), 1)} for key in ("pm25", "pm10", "o3", "no2", "so2", "co")},
+    }}
+
+
+def assessment_content(seed: str) -> str:
+    rng = _rng("openai", seed)
+    score = rng.randint(20, 95)
+    rating = "good" if score >= 70 else "moderate" if score >= 50 else "poor"
+    return json.dumps({
+        "overall_rating": rating,
+        "score": score,
+        "health_risk": "low" if score >= 70 else "moderate" if score >= 50 else "high",
+        "summary": "Chất lượng môi trường được tổng hợp từ dữ liệu đo (stub benchmark).",
+        "recommendations": ["Hạn chế hoạt động ngoài trời giờ cao điểm", "Đeo khẩu trang khi bụi mịn cao"],
+        "concerns": ["Bụi mịn PM2.5"],
+        "ai_reasoning": "Stub response",
+    }, ensure_ascii=False)
+
+
+def create_stub_app(profiles: Optional[Dict[str, UpstreamProfile]] = None,
+                    payloads: Optional[StubPayloads] = None) -> FastAPI:
+    profiles = profiles if profiles is not None else dict(DEFAULT_PROFILES)
+    payloads = payloads or StubPayloads()
+    app = FastAPI(title="Upstream stubs")
+    app.state.profiles = profiles
+    app.state.counts = {name: 0 for name in profiles}
+    rng = random.Random(7)
+
+    def json_response(data: Any) -> Response:
+        body = data if isinstance(data, bytes) else json.dumps(data).encode()
+        return Response(content=body, media_type="application/json")
+
+    @app.middleware("http")
+    async def apply_profile(request: Request, call_next):
+        upstream = request.url.path.strip("/").split("/", 1)[0]
+        profile = profiles.get(upstream)
+        if profile:
+            app.state.counts[upstream] += 1
+            await asyncio.sleep(profile.delay(rng))
+            if profile.error_rate and rng.random() < profile.error_rate:
+                return Response(status_code=profile.error_status, content=b'{"error":"stub failure"}',
+                                media_type="application/json")
+        return await call_next(request)
+
+    @app.get("/_stats")
+    async def stats():
+        return app.state.counts
+
+    @app.get("/openweather/weather")
+    async def weather(lat: str = "0", lon: str = "0"):
+        return json_response(openweather_current(_coord(lat), _coord(lon)))
+
+    @app.get("/openweather/forecast")
+    async def forecast(lat: str = "0", lon: str = "0"):
+        return json_response(openweather_forecast(_coord(lat), _coord(lon)))
+
+    @app.get("/agromonitoring/soil")
+    async def agro_soil(lat: str = "0", lon: str = "0"):
+        rng_point = _rng("agro", _coord(lat), _coord(lon))
+        return json_response({"dt": int(time.time()), "t10": round(rng_point.uniform(290, 305), 2),
+                              "moisture": round(rng_point.uniform(0.1, 0.45), 3), "t0": 301.2})
+
+    @app.get("/waqi/feed/{location}/")
+    async def waqi(location: str):
+        lat, _, lon = location.removeprefix("geo:").partition(";")
+        return json_response(waqi_feed(_coord(lat), _coord(lon)))
+
+    @app.get("/wqp/Station/search")
+    async def wqp_stations(bBox: str = "0,0,0,0"):
+        west, south, east, north = (float(v) for v in bBox.split(","))
+        return json_response(payloads.wqp_stations(round((south + north) / 2, 4), round((west + east) / 2, 4)))
+
+    @app.get("/wqp/Result/search")
+    async def wqp_results():
+        return json_response(payloads.wqp_results)
+
+    @app.get("/sensor-community/static/v2/data.json")
+    async def sensor_community():
+        return json_response(payloads.sensor_community)
+
+    @app.post("/overpass")
+    async def overpass(request: Request):
+        form = parse_qs((await request.body()).decode())
+        rng_point = _rng("overpass", form.get("data", [""])[0])
+        elements = [{"type": "way", "id": i} for i in range(rng_point.randint(5, 60))]
+        elements += [{"type": "node", "id": 10000 + i} for i in range(rng_point.randint(5, 120))]
+        return json_response({"version": 0.6, "elements": elements})
+
+    @app.get("/soilgrids/properties/query")
+    async def soilgrids(lat: str = "0", lon: str = "0"):
+        rng_point = _rng("soilgrids", _coord(lat), _coord(lon))
+        layers = [
+            {"name": "phh2o", "depths": [{"label": "0-5cm", "values": {"mean": rng_point.randint(45, 80)}}]},
+            {"name": "soc", "depths": [{"label": "0-5cm", "values": {"mean": rng_point.randint(50, 400)}}]},
+            {"name": "clay", "depths": [{"label": "0-5cm", "values": {"mean": rng_point.randint(100, 500)}}]},
+        ]
+        return json_response({"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                              "properties": {"layers": layers}})
+
+    @app.get("/safecast/measurements.json")
+    async def safecast(latitude: str = "0", longitude: str = "0", limit: int = 100):
+        lat, lon = _coord(latitude), _coord(longitude)
+        rng_point = _rng("safecast", lat, lon)
+        return json_response([
+            {"id": i, "value": round(rng_point.uniform(0.05, 0.3), 3), "unit": "usv",
+             "latitude": lat + rng_point.uniform(-0.2, 0.2), "longitude": lon + rng_point.uniform(-0.2, 0.2),
+             "captured_at": "2024-05-30T08:00:00Z"}
+            for i in range(limit)
+        ])
+
+    @app.get("/nominatim/reverse")
+    async def nominatim_reverse(lat: str = "0", lon: str = "0"):
+        rng_point = _rng("nominatim", _coord(lat), _coord(lon))
+        city = rng_point.choice(["Hanoi", "Bac Ninh", "Hung Yen", "Ha Dong"])
+        return json_response({
+            "display_name": f"{city}, Vietnam",
+            "address": {"city": city, "state": city, "country": "Vietnam", "country_code": "vn"},
+        })
+
+    @app.get("/nominatim/search")
+    async def nominatim_search(q: str = ""):
+        rng_point = _rng("search", q)
+        south, west, north, east = payloads.region
+        return json_response([{"lat": str(round(rng_point.uniform(south, north), 4)),
+                               "lon": str(round(rng_point.uniform(west, east), 4)), "display_name": q}])
+
+    @app.post("/openai/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        prompt = json.dumps(body.get("messages", []), ensure_ascii=False)
+        content = assessment_content(prompt)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                 "total_tokens": (len(prompt) + len(content)) // 4}
+        base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": body.get("model", "gpt-4o-mini")}
+
+        if body.get("stream"):
+            async def chunks():
+                for i in range(0, len(content), 24):
+                    delta = {"content": content[i:i + 24]} if i else {"role": "assistant", "content": content[:24]}
+                    chunk = {**base, "object": "chat.completion.chunk",
+                             "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(0.01)
+                done = {**base, "object": "chat.completion.chunk",
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+                yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n"
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        return json_response({
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    return app
+
+
+def upstream_env(base_url: str) -> Dict[str, str]:
+    """Biến môi trường trỏ mọi upstream của app sang stub server"""
+    return {
+        "OPENWEATHER_BASE_URL": f"{base_url}/openweather",
+        "AGROMONITORING_BASE_URL": f"{base_url}/agromonitoring",
+        "WAQI_BASE_URL": f"{base_url}/waqi",
+        "WQP_BASE_URL": f"{base_url}/wqp",
+        "SENSOR_COMMUNITY_URL": f"{base_url}/sensor-community",
+        "OVERPASS_URL": f"{base_url}/overpass",
+        "SOILGRIDS_BASE_URL": f"{base_url}/soilgrids",
+        "SAFECAST_BASE_URL": f"{base_url}/safecast",
+        "NOMINATIM_BASE_URL": f"{base_url}/nominatim",
+        "OPENAI_BASE_URL": f"{base_url}/openai/v1",
+        "OPENWEATHER_API_KEY": "bench",
+        "WAQI_API_KEY": "bench",
+        "OPENAI_API_KEY": "sk-bench-0000000000",
+    }
+
+
+class StubServer:
+    """Chạy stub app bằng uvicorn trong một thread nền"""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 9100):
+        import uvicorn
+        self.app = app
+        self.base_url = f"http://{host}:{port}"
+        self._server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning",
+                                                     access_log=False, lifespan="off"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def start(self, timeout: float = 10.0) -> "StubServer":
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"Stub server did not start on {self.base_url}")
+            time.sleep(0.05)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub server cho các upstream API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--profile", action="append", default=[],
+                        help="upstream:key=value,... (VD openai:latency_ms=3000,error_rate=0.1; '*' = tất cả)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Nhân mọi latency (0 = không trễ)")
+    parser.add_argument("--sensor-count", type=int, default=12000)
+    parser.add_argument("--wqp-results", type=int, default=3000)
+    args = parser.parse_args()
+
+    profiles = dict(DEFAULT_PROFILES)
+    scale_latency(profiles, args.latency_scale)
+    for spec in args.profile:
+        parse_profile(spec, profiles)
+
+    import uvicorn
+    app = create_stub_app(profiles, StubPayloads(sensor_count=args.sensor_count, wqp_results=args.wqp_results))
+    base_url = f"http://{args.host}:{args.port}"
+    print("Point the API at the stubs with:")
+    for key, value in upstream_env(base_url).items():
+        print(f"  export {key}={value}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+Cấu hình gunicorn cho chế độ nhiều worker
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Mỗi worker là một process uvicorn riêng; nên cấu hình SHARED_CACHE_URL
+để các worker dùng chung cache thay vì mỗi process giữ cache riêng.
+"""
+import multiprocessing
+from app.core.config import settings
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = settings.WORKERS or multiprocessing.cpu_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# LLM call có thể chậm -> timeout rộng hơn mặc định 30s
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
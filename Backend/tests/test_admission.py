@@ -0,0 +1,211 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionController
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_free_slot_is_taken_without_queueing():
+    async def scenario():
+        controller = AdmissionController("test", max_concurrency=2, max_queue=0, queue_timeout=1)
+        assert await controller.acquire()
+        assert await controller.acquire()
+        assert controller.active == 2
+        stats = controller.stats()
+        assert stats["admitted"] == 2
+        assert stats["queued"] == 0
+        controller.release(0.1)
+        controller.release(0.1)
+        assert controller.active == 0
+
+    run(scenario())
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario():
+        controller = AdmissionController("test", max_concurrency=1, max_queue=1, queue_timeout=1)
+        assert await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert controller.waiting == 1
+
+        assert not await controller.acquire()
+
+        controller.release(0.1)
+        assert await waiter
+        stats = controller.stats()
+        assert stats["admitted"] == 2
+        assert stats["queued"] == 1
+        assert stats["rejected_queue_full"] == 1
+        assert stats["rejected_timeout"] == 0
+        assert controller.waiting == 0
+
+    run(scenario())
+
+
+def test_queue_timeout_rejects_and_frees_the_queue_place():
+    async def scenario():
+        controller = AdmissionController("test", max_concurrency=1, max_queue=1, queue_timeout=0.01)
+        assert await controller.acquire()
+        assert not await controller.acquire()
+        assert controller.waiting == 0
+        assert controller.stats()["rejected_timeout"] == 1
+
+        # Slot không bị mất sau timeout: trả slot rồi lấy lại ngay
+        controller.release(0.1)
+        assert await asyncio.wait_for(controller.acquire(), 0.1)
+        assert controller.active == 1
+
+    run(scenario())
+
+
+def test_waiters_are_admitted_in_order():
+    async def scenario():
+        controller = AdmissionController("test", max_concurrency=1, max_queue=3, queue_timeout=1)
+        order = []
+
+        async def request(i):
+            async with controller.slot() as admitted:
+                assert admitted
+                order.append(i)
+                await asyncio.sleep(0.001)
+
+        await asyncio.gather(*(request(i) for i in range(4)))
+        assert order == [0, 1, 2, 3]
+        stats = controller.stats()
+        assert stats["admitted"] == 4
+        assert stats["queued"] == 3
+        assert controller.active == 0
+        assert controller.waiting == 0
+
+    run(scenario())
+
+
+def test_concurrency_limit_holds_under_load():
+    async def scenario():
+        controller = AdmissionController("test", max_concurrency=3, max_queue=5, queue_timeout=1)
+        running = 0
+        peak = 0
+        results = []
+
+        async def request():
+            nonlocal running, peak
+            async with controller.slot() as admitted:
+                results.append(admitted)
+                if not admitted:
+                    return
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.005)
+                running -= 1
+
+        await asyncio.gather(*(request() for _ in range(20)))
+        stats = controller.stats()
+        assert peak == 3
+        # 3 chạy ngay + 5 trong queue, phần còn lại bị từ chối
+        assert results.count(True) == stats["admitted"] == 8
+        assert results.count(False) == stats["rejected_queue_full"] == 12
+        assert controller.active == 0
+        assert controller.waiting == 0
+
+    run(scenario())
+
+
+def test_newcomer_does_not_overtake_a_woken_waiter():
+    async def scenario():
+        controller = AdmissionController("test", max_concurrency=1, max_queue=2, queue_timeout=1)
+        assert await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+
+        # Trả slot rồi có request mới tới trước khi waiter kịp chạy
+        controller.release(0.1)
+        newcomer = asyncio.create_task(controller.acquire())
+        assert await waiter
+        assert not newcomer.done()
+        assert controller.active == 1
+
+        controller.release(0.1)
+        assert await newcomer
+        assert controller.stats()["queued"] == 2
+
+    run(scenario())
+
+
+def test_release_racing_the_queue_timeout_keeps_accounting_consistent():
+    async def scenario():
+        for _ in range(20):
+            controller = AdmissionController("test", max_concurrency=1, max_queue=1, queue_timeout=0.005)
+            assert await controller.acquire()
+            asyncio.get_running_loop().call_later(0.005, controller.release, 0.1)
+            admitted = await controller.acquire()
+
+            stats = controller.stats()
+            assert stats["admitted"] == 1 + admitted
+            assert stats["rejected_timeout"] == (not admitted)
+            assert controller.waiting == 0
+            assert controller.active == (1 if admitted else 0)
+            # Slot không bị mất dù waiter bị huỷ đúng lúc được đánh thức
+            if admitted:
+                controller.release(0.1)
+            assert await asyncio.wait_for(controller.acquire(), 0.1)
+
+    run(scenario())
+
+
+def test_slot_is_released_when_the_request_fails():
+    async def scenario():
+        controller = AdmissionController("test", max_concurrency=1, max_queue=0, queue_timeout=0)
+        with pytest.raises(RuntimeError):
+            async with controller.slot() as admitted:
+                assert admitted
+                raise RuntimeError("upstream lỗi")
+        assert controller.active == 0
+        async with controller.slot() as admitted:
+            assert admitted
+
+    run(scenario())
+
+
+def test_rejected_slot_does_not_release():
+    async def scenario():
+        controller = AdmissionController("test", max_concurrency=1, max_queue=0, queue_timeout=0)
+        assert await controller.acquire()
+        async with controller.slot() as admitted:
+            assert not admitted
+        assert controller.active == 1
+
+    run(scenario())
+
+
+def test_disabled_controller_admits_everything():
+    async def scenario():
+        controller = AdmissionController("test", max_concurrency=0, max_queue=0, queue_timeout=0)
+        for _ in range(10):
+            assert await controller.acquire()
+        controller.release(1.0)
+        assert controller.stats()["admitted"] == 0
+        assert controller.retry_after() == 1
+
+    run(scenario())
+
+
+def test_retry_after_follows_backlog_and_processing_time():
+    async def scenario():
+        controller = AdmissionController("test", max_concurrency=2, max_queue=4, queue_timeout=1)
+        assert controller.retry_after() == 1
+        for _ in range(50):
+            assert await controller.acquire()
+            controller.release(4.0)
+        # avg ~4s, 2 đang chạy + 2 đang chờ = 2 lượt -> ~8s
+        assert await controller.acquire()
+        assert await controller.acquire()
+        controller.waiting = 2
+        assert 7 <= controller.retry_after() <= 8
+        controller.waiting = 0
+
+    run(scenario())
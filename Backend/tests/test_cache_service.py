@@ -0,0 +1,144 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.services.cache_service import CacheService
+from app.services.database import DatabaseService
+from app.services.shared_cache import shared_cache
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+LAT, LON = 21.03, 105.85
+ASSESSMENT = {"overall_rating": "good", "score": 80.0}
+SOURCE = "OpenAI GPT-4"
+
+
+def response_data(job_id):
+    return {
+        "location": {"city": "Hanoi"},
+        "sources": ["OpenWeatherMap"],
+        "environmental_quality": None,
+        "assessment_job": {"job_id": job_id, "status": "pending", "url": f"/api/v1/environment/jobs/{job_id}"},
+    }
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    monkeypatch.setattr(DatabaseService, "database", mongomock_motor.AsyncMongoMockClient().get_database("test"))
+    return DatabaseService.database[CacheService.COLLECTION_NAME]
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(DatabaseService, "database", None)
+    monkeypatch.setattr(CacheService, "_pending", {})
+    monkeypatch.setattr(CacheService, "_writer_task", None)
+    monkeypatch.setattr(CacheService, "_write_queue", None)
+    monkeypatch.setattr(settings, "CACHE_WRITE_FLUSH_INTERVAL", 0.01)
+    shared_cache._backend = None
+    yield
+    shared_cache._backend = None
+
+
+def start_fake_writer():
+    """Write-behind đang chạy nhưng không tự flush: test tự gọi _insert_batch"""
+    CacheService._write_queue = asyncio.Queue()
+    CacheService._writer_task = object()
+
+
+def assert_attached(doc):
+    data = json.loads(doc["payload"])
+    assert data["environmental_quality"] == ASSESSMENT
+    assert data["assessment_job"] is None
+    assert data["sources"] == ["OpenWeatherMap", SOURCE]
+
+
+def test_attach_replaces_queued_document(mongo):
+    async def scenario():
+        start_fake_writer()
+        await CacheService.enqueue_save("Hanoi", "VN", LAT, LON, response_data("job-1"))
+        (queued,) = CacheService._pending.values()
+
+        assert await CacheService.attach_assessment("Hanoi", "VN", LAT, LON, "job-1", ASSESSMENT, SOURCE, retries=0)
+
+        # Bản cũ không bị sửa tại chỗ (batch có thể đang giữ nó), bản trong _pending là bản mới
+        assert queued["data"]["environmental_quality"] is None
+        entry = await CacheService.get_cached_entry("Hanoi", "VN", LAT, LON)
+        assert entry["_id"] == queued["_id"]
+        assert entry["etag"] != queued["etag"]
+        assert_attached(entry)
+
+        # Writer flush document lấy từ queue (bản cũ) -> Mongo nhận bản mới nhất
+        assert await CacheService._insert_batch([queued])
+        assert CacheService._pending == {}
+        assert_attached(await mongo.find_one({"_id": queued["_id"]}))
+
+    asyncio.run(scenario())
+
+
+def test_attach_retries_until_an_in_flight_batch_is_stored(mongo):
+    async def scenario():
+        start_fake_writer()
+        await CacheService.enqueue_save("Hanoi", "VN", LAT, LON, response_data("job-2"))
+        (queued,) = CacheService._pending.values()
+        in_flight = dict(queued)  # Batch đã copy trước khi job xong
+
+        async def slow_insert():
+            await asyncio.sleep(0.015)
+            await mongo.insert_one(in_flight)
+            CacheService._pending.pop(queued["_id"], None)
+
+        insert = asyncio.create_task(slow_insert())
+        assert await CacheService.attach_assessment("Hanoi", "VN", LAT, LON, "job-2", ASSESSMENT, SOURCE, retries=3)
+        await insert
+
+        stored = await mongo.find_one({"_id": queued["_id"]})
+        assert_attached(stored)
+        assert stored["data"]["environmental_quality"] == ASSESSMENT
+
+    asyncio.run(scenario())
+
+
+def test_attach_to_stored_document(mongo):
+    async def scenario():
+        await CacheService.save_data("Hanoi", "VN", LAT, LON, response_data("job-3"))
+        assert await CacheService.attach_assessment("Hanoi", "VN", LAT, LON, "job-3", ASSESSMENT, SOURCE, retries=0)
+
+        stored = await mongo.find_one({})
+        assert_attached(stored)
+        # Bản trong shared cache cũng được cập nhật, cùng ETag với Mongo
+        entry = await CacheService.get_cached_entry("Hanoi", "VN", LAT, LON)
+        assert entry["etag"] == stored["etag"]
+        assert entry["data"]["assessment_job"] is None
+
+    asyncio.run(scenario())
+
+
+def test_other_job_is_not_attached(mongo):
+    async def scenario():
+        start_fake_writer()
+        await CacheService.enqueue_save("Hanoi", "VN", LAT, LON, response_data("job-4"))
+        assert not await CacheService.attach_assessment("Hanoi", "VN", LAT, LON, "job-x", ASSESSMENT, SOURCE, retries=0)
+
+        (queued,) = CacheService._pending.values()
+        assert queued["data"]["assessment_job"]["job_id"] == "job-4"
+        entry = await CacheService.get_cached_entry("Hanoi", "VN", LAT, LON)
+        assert entry["data"]["assessment_job"]["job_id"] == "job-4"
+
+    asyncio.run(scenario())
+
+
+def test_attach_without_mongo_uses_shared_cache():
+    async def scenario():
+        assert await CacheService.save_data("Hanoi", "VN", LAT, LON, response_data("job-5"))
+        entry = await CacheService.get_cached_entry("Hanoi", "VN", LAT, LON)
+        assert entry["data"]["assessment_job"]["job_id"] == "job-5"
+
+        assert await CacheService.attach_assessment("Hanoi", "VN", LAT, LON, "job-5", ASSESSMENT, SOURCE)
+        entry = await CacheService.get_cached_entry("Hanoi", "VN", LAT, LON)
+        assert_attached(entry)
+        assert entry["data"]["assessment_job"] is None
+
+    asyncio.run(scenario())
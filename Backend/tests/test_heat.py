@@ -0,0 +1,103 @@
+import asyncio
+import json
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.services import heat_index as heat_kernel
+from app.services.heat_service import HeatService
+
+
+def fahrenheit_to_celsius(value):
+    return (value - 32.0) * 5.0 / 9.0
+
+
+@pytest.mark.parametrize("temp_f, humidity, expected_f", [
+    # Bảng heat index của NWS
+    (90, 70, 106),
+    (96, 50, 108),
+    (100, 40, 109),
+    (84, 90, 98),
+])
+def test_heat_index_matches_nws_table(temp_f, humidity, expected_f):
+    result = heat_kernel.heat_index(fahrenheit_to_celsius(temp_f), humidity)
+    assert result * 9.0 / 5.0 + 32.0 == pytest.approx(expected_f, abs=1.0)
+
+
+def test_heat_index_below_80f_uses_simple_formula():
+    assert heat_kernel.heat_index(20.0, 50.0) == pytest.approx(19.4, abs=0.1)
+
+
+def test_heat_index_broadcasts_over_locations_and_times():
+    temperature = np.array([[25.0, 30.0, 35.0], [28.0, 33.0, 38.0]])
+    humidity = np.array([[60.0], [80.0]])
+    grid = heat_kernel.heat_index(temperature, humidity)
+    assert grid.shape == (2, 3)
+    assert grid[1, 2] == pytest.approx(float(heat_kernel.heat_index(38.0, 80.0)))
+
+
+def test_surface_temperature():
+    result = heat_kernel.surface_temperature(30.0, np.array([0.0, 1000.0, 1000.0]), np.array([0.0, 0.0, 100.0]))
+    assert result.tolist() == pytest.approx([28.0, 42.0, 33.0])
+
+
+def test_heat_risk_levels():
+    levels = heat_kernel.heat_risk_level([20.0, 30.0, 35.0, 45.0, 60.0])
+    assert [heat_kernel.HEAT_RISK_LEVELS[i] for i in levels] == [
+        "none", "caution", "extreme_caution", "danger", "extreme_danger",
+    ]
+
+
+class StubWeatherService:
+    def __init__(self, forecast):
+        self.forecast = forecast
+
+    async def get_forecast_arrays(self, lat, lon):
+        return self.forecast
+
+
+def make_forecast(temperature, humidity, clouds):
+    start = np.datetime64(datetime.utcnow().replace(minute=0, second=0, microsecond=0), "s")
+    return {
+        "times": start + np.arange(len(temperature)) * np.timedelta64(3 * 3600, "s"),
+        "temperature": np.array(temperature, dtype=np.float64),
+        "humidity": np.array(humidity, dtype=np.float64),
+        "clouds": np.array(clouds, dtype=np.float64),
+    }
+
+
+def heat_forecast(forecast, hours=24):
+    service = HeatService()
+    service.weather_service = StubWeatherService(forecast)
+    return asyncio.run(service.get_heat_forecast(21.03, 105.85, hours=hours))
+
+
+def test_heat_forecast_is_hourly():
+    result = heat_forecast(make_forecast([30, 33, 36, 33, 30, 28, 27, 27, 28, 30], [70] * 10, [20] * 10))
+    assert len(result.times) == 24
+    assert result.temperature[:4] == [30.0, 31.0, 32.0, 33.0]
+    assert result.peak_heat_index == max(result.heat_index)
+    assert result.peak_time == result.times[6]
+
+
+def test_heat_forecast_skips_missing_values():
+    nan = float("nan")
+    temperature = [30, 33, nan, 33, 30, 28, 27, 27, 28, 30]
+    humidity = [70, nan, 70, 70, 70, 70, 70, 70, 70, 70]
+    result = heat_forecast(make_forecast(temperature, humidity, [nan] * 10))
+
+    # Giờ 6 (slot thiếu) nội suy giữa 33 (giờ 3) và 33 (giờ 9)
+    assert result.temperature[6] == 33.0
+    assert result.humidity == [70.0] * 24
+    # Response encode được (JSONResponse không cho phép NaN)
+    json.dumps(result.dict(), allow_nan=False)
+
+
+def test_heat_forecast_without_humidity_uses_default():
+    result = heat_forecast(make_forecast([30] * 10, [float("nan")] * 10, [0] * 10))
+    assert result.humidity == [50.0] * 24
+
+
+def test_heat_forecast_without_temperature():
+    assert heat_forecast(make_forecast([float("nan")] * 10, [70] * 10, [0] * 10)) is None
@@ -0,0 +1,111 @@
+import gzip
+import json
+
+import pytest
+from starlette.requests import Request
+
+from app.core import http_cache
+from app.core.http_cache import cached_json_response, choose_encoding, make_etag
+
+SMALL = b'{"ok":true}'
+LARGE = json.dumps({"values": list(range(500))}).encode()
+
+
+def make_request(**headers):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def test_plain_response_headers():
+    response = cached_json_response(make_request(), SMALL, max_age=120, age=30)
+    assert response.status_code == 200
+    assert response.body == SMALL
+    assert response.headers["etag"] == make_etag(SMALL)
+    assert response.headers["cache-control"] == "public, max-age=120"
+    assert response.headers["age"] == "30"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert "content-encoding" not in response.headers
+
+
+def test_small_payload_is_not_compressed():
+    response = cached_json_response(make_request(accept_encoding="gzip, br"), SMALL)
+    assert "content-encoding" not in response.headers
+    assert response.body == SMALL
+
+
+def test_gzip_response():
+    response = cached_json_response(make_request(accept_encoding="gzip"), LARGE)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == make_etag(LARGE)[:-1] + '-gzip"'
+    assert gzip.decompress(response.body) == LARGE
+
+
+def test_compressed_body_is_reused():
+    etag = make_etag(LARGE)
+    first = http_cache.compress(LARGE, "gzip", etag)
+    assert http_cache.compress(LARGE, "gzip", etag) is first
+
+
+@pytest.mark.skipif(http_cache.brotli is None, reason="brotli không được cài")
+def test_brotli_is_preferred():
+    response = cached_json_response(make_request(accept_encoding="gzip, deflate, br"), LARGE)
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["etag"].endswith('-br"')
+    assert http_cache.brotli.decompress(response.body) == LARGE
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("br;q=0, gzip", "gzip"),
+    ("deflate, gzip;q=abc", None),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(make_request(accept_encoding=header)) == expected
+
+
+def test_choose_encoding_without_brotli(monkeypatch):
+    monkeypatch.setattr(http_cache, "brotli", None)
+    assert choose_encoding(make_request(accept_encoding="br, gzip")) == "gzip"
+    assert choose_encoding(make_request(accept_encoding="br")) is None
+
+
+@pytest.mark.parametrize("if_none_match", [
+    make_etag(SMALL),
+    "W/" + make_etag(SMALL),
+    '"other", ' + make_etag(SMALL),
+    "*",
+])
+def test_not_modified(if_none_match):
+    response = cached_json_response(make_request(if_none_match=if_none_match), SMALL, max_age=60)
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == make_etag(SMALL)
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+
+def test_not_modified_with_encoded_etag():
+    encoded_etag = make_etag(LARGE)[:-1] + '-gzip"'
+    response = cached_json_response(make_request(accept_encoding="gzip", if_none_match=encoded_etag), LARGE)
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == encoded_etag
+    assert "content-encoding" not in response.headers
+
+
+def test_changed_payload_is_sent_again():
+    response = cached_json_response(make_request(if_none_match=make_etag(b"{}")), SMALL)
+    assert response.status_code == 200
+    assert response.body == SMALL
+
+
+def test_explicit_etag_is_used():
+    response = cached_json_response(make_request(if_none_match='"abc"'), SMALL, etag='"abc"')
+    assert response.status_code == 304
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from app.models.environmental_quality import EnvironmentalQuality
+from app.services.environmental_ai_service import EnvironmentalAIService
+from app.services.rule_assessment_service import rule_assessment_service
+
+HANOI = {"city": "Hanoi", "lat": 21.03, "lon": 105.85}
+
+
+def test_clean_air_scores_excellent():
+    result = rule_assessment_service.assess(HANOI, {"air": {"aqi": 20, "pm25": 5}})
+    assert result.score == 100
+    assert result.overall_rating == "excellent"
+    assert result.health_risk == "low"
+    assert result.concerns == []
+
+
+def test_penalties_and_risk_follow_who_thresholds():
+    result = rule_assessment_service.assess(HANOI, {
+        "air": {"aqi": 180, "pm25": 80},
+        "water": {"ph": 9.2},
+    })
+    # AQI >150 (-40), PM2.5 >75 (-25), pH ngoài 6.5-8.5 (-10)
+    assert result.score == 25
+    assert result.overall_rating == "hazardous"
+    assert result.health_risk == "high"
+    assert len(result.concerns) == 3
+
+
+def test_no_data():
+    result = rule_assessment_service.assess(HANOI, {})
+    assert result.score == 50
+    assert rule_assessment_service.is_rule_based(result)
+
+
+def test_same_input_same_result():
+    location = {**HANOI, "observed_at": "2024-06-01T15:00:00Z"}
+    env = {"air": {"aqi": 120}, "noise": {"level": 50}}
+    first = rule_assessment_service.assess(location, env)
+    second = rule_assessment_service.assess(dict(location), env)
+    assert first == second
+
+
+def test_noise_limit_depends_on_observation_time():
+    env = {"noise": {"level": 50}}
+    # Hà Nội UTC+7 (theo kinh độ): 05:00 UTC = 12h trưa, 17:00 UTC = 0h đêm
+    day = rule_assessment_service.assess({**HANOI, "observed_at": "2024-06-01T05:00:00Z"}, env)
+    night = rule_assessment_service.assess({**HANOI, "observed_at": "2024-06-01T17:00:00Z"}, env)
+    assert day.score == 100
+    assert night.score < 100
+    assert "ban đêm" in night.concerns[0]
+
+
+def test_observation_time_accepts_datetime_and_offsets():
+    assert rule_assessment_service._is_night(105.85, datetime(2024, 6, 1, 17, 0))
+    # Cùng thời điểm 17:00 UTC viết theo giờ Việt Nam
+    assert rule_assessment_service._is_night(105.85, "2024-06-02T00:00:00+07:00")
+    assert not rule_assessment_service._is_night(105.85, "2024-06-01T12:00:00+07:00")
+
+
+def test_missing_or_invalid_observation_time_uses_day_limit():
+    assert not rule_assessment_service._is_night(105.85, None)
+    assert not rule_assessment_service._is_night(105.85, "không phải thời gian")
+    result = rule_assessment_service.assess(HANOI, {"noise": {"level": 50}})
+    assert result.score == 100
+
+
+def test_assessment_source():
+    rule_based = rule_assessment_service.assess(HANOI, {"air": {"aqi": 20}})
+    assert EnvironmentalAIService.assessment_source(rule_based) == rule_assessment_service.SOURCE
+
+    from_llm = EnvironmentalQuality(
+        overall_rating="good",
+        score=80,
+        health_risk="low",
+        summary="Tốt",
+        recommendations=[],
+        concerns=[],
+        ai_reasoning="AQI thấp, PM2.5 trong ngưỡng WHO",
+    )
+    assert not rule_assessment_service.is_rule_based(from_llm)
+    assert EnvironmentalAIService.assessment_source(from_llm) == EnvironmentalAIService.SOURCE
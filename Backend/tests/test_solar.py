@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from app.services import solar
+
+LONDON = (51.5074, -0.1278)
+
+
+def test_sun_times_london_summer_solstice():
+    sunrise, sunset, daylight = solar.sun_times(np.datetime64("2024-06-21"), *LONDON)
+    # Giờ UTC theo bảng NOAA: mọc 03:43, lặn 20:21
+    assert sunrise == pytest.approx(3 * 60 + 43, abs=2)
+    assert sunset == pytest.approx(20 * 60 + 21, abs=2)
+    assert daylight == pytest.approx(16.64, abs=0.05)
+
+
+def test_polar_day_and_night():
+    _, _, summer = solar.sun_times(np.datetime64("2024-06-21"), 80.0, 0.0)
+    sunrise, sunset, winter = solar.sun_times(np.datetime64("2024-12-21"), 80.0, 0.0)
+    assert summer == 24.0
+    assert winter == 0.0
+    assert np.isnan(sunrise) and np.isnan(sunset)
+
+
+def test_equinox_noon_at_equator():
+    # Xuân phân, trưa mặt trời tại kinh độ 0 (~12:07 UTC): mặt trời gần thiên đỉnh
+    assert solar.solar_elevation(np.datetime64("2024-03-20T12:07:00"), 0.0, 0.0) == pytest.approx(90.0, abs=0.5)
+    assert solar.solar_elevation(np.datetime64("2024-03-20T00:07:00"), 0.0, 0.0) == pytest.approx(-90.0, abs=2.5)
+
+
+def test_grid_matches_point_by_point():
+    times = np.datetime64("2024-06-01T00:00:00") + np.arange(24) * np.timedelta64(1, "h")
+    lats = np.array([[-33.87], [21.03], [64.15]])
+    lons = np.array([[151.21], [105.85], [-21.94]])
+
+    grid = solar.solar_cos_zenith(times, lats, lons)
+    assert grid.shape == (3, 24)
+    for p in range(3):
+        for t in (0, 7, 13):
+            assert grid[p, t] == pytest.approx(float(solar.solar_cos_zenith(times[t], lats[p, 0], lons[p, 0])))
+
+
+def test_irradiance_uv_and_illuminance():
+    cos_zenith = np.array([-0.5, 0.0, 0.5, 1.0])
+    irradiance = solar.clear_sky_irradiance(cos_zenith)
+    assert irradiance[0] == irradiance[1] == 0.0
+    assert 0 < irradiance[2] < irradiance[3] < 1098.0
+
+    uv = solar.clear_sky_uv_index(cos_zenith)
+    assert uv[0] == 0.0
+    assert uv[3] == pytest.approx(12.5)
+
+    lux = solar.illuminance(irradiance)
+    assert lux[0] == 1.0
+    assert lux[3] == pytest.approx(irradiance[3] * solar.DAYLIGHT_EFFICACY)
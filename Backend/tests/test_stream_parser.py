@@ -0,0 +1,77 @@
+import json
+import random
+
+from app.services.environmental_ai_service import AssessmentStreamParser
+
+ASSESSMENT = {
+    "overall_rating": "moderate",
+    "score": 62,
+    "health_risk": "moderate",
+    "summary": "Không khí \"trung bình\", PM2.5 cao\nvào giờ cao điểm 😷",
+    "recommendations": ["Đeo khẩu trang", "Đóng cửa sổ \\ buổi tối", "Theo dõi AQI"],
+    "concerns": ["PM2.5 vượt chuẩn WHO"],
+    "ai_reasoning": "AQI 120",
+}
+
+
+def feed_in_chunks(text, sizes):
+    parser = AssessmentStreamParser()
+    events = []
+    pos = 0
+    for size in sizes:
+        events.extend(parser.feed(text[pos:pos + size]))
+        pos += size
+    events.extend(parser.feed(text[pos:]))
+    return events
+
+
+def collect(events):
+    summary = "".join(value for kind, value in events if kind == "summary")
+    recommendations = [value for kind, value in events if kind == "recommendation"]
+    concerns = [value for kind, value in events if kind == "concern"]
+    return summary, recommendations, concerns
+
+
+def test_whole_document_in_one_chunk():
+    events = feed_in_chunks(json.dumps(ASSESSMENT, ensure_ascii=False), [])
+    assert collect(events) == (ASSESSMENT["summary"], ASSESSMENT["recommendations"], ASSESSMENT["concerns"])
+
+
+def test_any_chunking_gives_the_same_events():
+    # Escape (\", \n, \\) bị cắt giữa chừng; khoảng trắng quanh ":" để key bị cắt ở nhiều chỗ
+    text = json.dumps(ASSESSMENT, ensure_ascii=False, indent=2).replace('"summary":', '"summary"  \n :')
+    rng = random.Random(0)
+    for _ in range(200):
+        sizes = [rng.randint(1, 7) for _ in range(len(text))]
+        summary, recommendations, concerns = collect(feed_in_chunks(text, sizes))
+        assert summary == ASSESSMENT["summary"]
+        assert recommendations == ASSESSMENT["recommendations"]
+        assert concerns == ASSESSMENT["concerns"]
+
+
+def test_partial_escape_is_not_emitted_early():
+    text = json.dumps({"summary": "aéb"})  # "a\u00e9b"
+    events = feed_in_chunks(text, [len('{"summary": "a\\u00')])
+    assert [value for _, value in events] == ["a", "éb"]
+
+
+def test_item_is_emitted_once_it_is_complete():
+    parser = AssessmentStreamParser()
+    assert parser.feed('{"recommendations": ["Đi') == []
+    assert parser.feed(' bộ", "Mở') == [("recommendation", "Đi bộ")]
+    assert parser.feed(' cửa"], "concerns": []}') == [("recommendation", "Mở cửa")]
+    assert parser.feed("") == []
+
+
+def test_keys_inside_string_values_after_the_field_are_ignored():
+    parser = AssessmentStreamParser()
+    events = parser.feed('{"summary": "ok", "recommendations": ["x"], "ai_reasoning": "\\"summary\\": \\"y\\""}')
+    assert events == [("summary", "ok"), ("recommendation", "x")]
+
+
+def test_buffer_keeps_the_full_text():
+    text = json.dumps(ASSESSMENT)
+    parser = AssessmentStreamParser()
+    for start in range(0, len(text), 5):
+        parser.feed(text[start:start + 5])
+    assert json.loads(parser.buffer) == ASSESSMENT